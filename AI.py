@@ -1,53 +1,35 @@
 # ----- AI Client -----
-from ollama import Client
-from pydantic import BaseModel, Field
-from typing import Literal, Optional, List
+from ollama import AsyncClient, Client
+from typing import Optional, List
 import json
+import time
+import hashlib
+import intents
+from plan_cache import PlanCache
+from plan_stream import PlanStreamParser
+from plan_types import ActionDecision, ActionPlan
 
 class Config:
-    FRONT_SAFE_THRESHOLD = 0.05
-    TURN_90_DURATION = 2.0
+    FRONT_SAFE_THRESHOLD = 15.0  # cm, like the Pi's readings (and the firmware's EMERGENCY_STOP_CM)
+    SAFETY_WINDOW = 1.0  # Seconds of sensor history the safety check takes the median/approach rate over
+    SAFETY_HORIZON = 0.5  # Seconds ahead the safety check projects the front distance when approaching
     MODEL_NAME = "qwen2.5vl"
     TEMPERATURE = 0.5   # lowered for consistency (less randomness)
+    FAST_PATH = True  # Parse simple known commands locally instead of asking the LLM
+    KEEP_ALIVE = "30m"  # How long Ollama keeps the model in memory between requests
+    PLAN_CACHE_SIZE = 128  # LLM plans kept in memory (0 disables the cache)
+    PLAN_CACHE_TTL = 3600.0  # Seconds before a cached plan is asked for again
+    PLAN_CACHE_BUCKET = 25.0  # Distance bucket width (same unit as the Pi's readings)
+    PLAN_CACHE_PATH = None  # e.g. "plan_cache.json" to keep plans across restarts
 
 
-class ActionDecision(BaseModel):
-    """Defines a single robot movement step."""
-    action: Literal['forward', 'backward', 'left', 'right', 'stop'] = Field(
-        description="The movement command. Use 'left' or 'right' for turns."
-    )
-    duration: Optional[float] = Field(
-        default=None,
-        description="Duration in seconds. Use for turns or time-based movements."
-    )
-    distance: Optional[float] = Field(
-        default=None,
-        description="Distance in meters for forward/backward motions."
-    )
-    notes: Optional[str] = Field(
-        default=None,
-        description="Brief description of the action."
-    )
-
-
-class ActionPlan(BaseModel):
-    """Top-level structure containing the plan list."""
-    plan: List[ActionDecision] = Field(
-        description="A sequence of robot actions. The final action MUST be 'stop'."
-    )
+# --- Built ONCE at import. The system prompt must stay byte-identical between
+# requests so Ollama can reuse the KV cache for this prefix; everything that
+# changes per request goes in the user message after it. ---
+PLAN_SCHEMA = ActionPlan.model_json_schema()
 
-
-class AIPlanner:
-    def __init__(self, model_name=Config.MODEL_NAME, temperature=Config.TEMPERATURE):
-        self.client = Client()
-        self.model_name = model_name
-        self.temperature = temperature
-
-    def generate_plan(self, speech_command: str, distances: dict):
-        schema = ActionPlan.model_json_schema()
-
-        # --- SYSTEM PROMPT (identical logic to first program) ---
-        system_prompt = f"""
+# --- SYSTEM PROMPT (identical logic to first program) ---
+SYSTEM_PROMPT = f"""
 You are an Autonomous Director of Robot Choreography. Your job is to translate ANY user command into a precise, logical sequence of robot actions.
 Your final output MUST STRICTLY conform to the provided JSON schema.
 
@@ -56,34 +38,239 @@ EXECUTION RULES:
 2. The "plan" array must include step-by-step robot actions.
 3. The LAST action in the plan MUST always be 'stop'.
 4. When drawing geometric shapes (square, triangle, etc.), use consistent turns (e.g., always 'right' for a clockwise square).
-5. Use realistic numeric values: forward distances in meters, turns via 'duration' seconds for 90° angles.
+5. Use realistic numeric values: forward distances in meters ('distance'), turns as 'angle' in degrees (e.g. 90).
 6. IN GEOMETRY(Square,triangle,hexagon ,etc) :Avoid creativity or randomness — focus on consistent logic .
 
 7- use creativity for abstract commands like dance etc
 
 JSON SCHEMA:
-{json.dumps(schema, indent=2)}
+{json.dumps(PLAN_SCHEMA, indent=2)}
 """
 
+
+class AIPlanner:
+    def __init__(self, model_name=Config.MODEL_NAME, temperature=Config.TEMPERATURE, fast_path=Config.FAST_PATH):
+        self.client = Client()
+        self.async_client = None  # Created on first use inside the async pipeline's loop
+        self.model_name = model_name
+        self.temperature = temperature
+        self.fast_path = fast_path
+        self.last_timings = None
+        self.timing_totals = {"requests": 0, "prompt_tokens": 0, "prompt_eval_s": 0.0,
+                              "output_tokens": 0, "eval_s": 0.0}
+        self.plan_cache = None
+        if Config.PLAN_CACHE_SIZE > 0:
+            self.plan_cache = PlanCache(
+                capacity=Config.PLAN_CACHE_SIZE, ttl=Config.PLAN_CACHE_TTL,
+                bucket_size=Config.PLAN_CACHE_BUCKET, path=Config.PLAN_CACHE_PATH,
+                fingerprint=self.prompt_fingerprint()
+            )
+
+    def prompt_fingerprint(self) -> str:
+        """Identifies everything that shapes the LLM's plans; cached plans are only valid for one fingerprint."""
+        source = json.dumps([self.model_name, self.temperature, SYSTEM_PROMPT, PLAN_SCHEMA], sort_keys=True)
+        return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+    def invalidate_plan_cache(self):
+        """Call after changing the model, temperature or prompt."""
+        if self.plan_cache:
+            self.plan_cache.invalidate(self.prompt_fingerprint())
+
+    def warm_up(self):
+        """
+        Makes Ollama load the model into memory now (tiny chat, one output token)
+        so the first real command doesn't pay for it. Sending the real system
+        prompt also leaves its prefix in the KV cache. Returns the elapsed seconds.
+        """
+        start = time.perf_counter()
+        self.client.chat(
+            model=self.model_name,
+            messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": "hi"}],
+            keep_alive=Config.KEEP_ALIVE,
+            options={"num_predict": 1}
+        )
+        elapsed = time.perf_counter() - start
+        print(f"🔥 Ollama model '{self.model_name}' loaded and warm in {elapsed:.2f}s")
+        return elapsed
+
+    def local_plan(self, speech_command: str, distances: dict) -> Optional[List[ActionDecision]]:
+        """Plan without the LLM: fast path first, then the plan cache. None if neither knows the command."""
+        # --- FAST PATH: known commands skip the LLM entirely ---
+        steps = intents.parse_command(speech_command) if self.fast_path else None
+        if steps is not None:
+            print(f"⚡ Fast path matched '{speech_command}' ({len(steps)} steps, no LLM call)")
+            return steps
+
+        # --- PLAN CACHE: same command in a similar situation -> same plan ---
+        cache_command = intents.normalize_command(speech_command)
+        cached = self.plan_cache.get(cache_command, distances) if self.plan_cache else None
+        if cached is not None:
+            print(f"📦 Plan cache hit for '{cache_command}' ({len(cached)} steps)")
+            return [ActionDecision(**step) for step in cached]
+        return None
+
+    def cache_plan(self, speech_command: str, distances: dict, steps: List[ActionDecision]):
+        if self.plan_cache:
+            self.plan_cache.put(intents.normalize_command(speech_command), distances,
+                                [d.model_dump(exclude_none=True) for d in steps])
+
+    def generate_plan(self, speech_command: str, distances: dict, history=None):
+        steps = self.local_plan(speech_command, distances)
+        if steps is None:
+            plan, valid = self.llm_plan(speech_command, distances)
+            steps = plan.plan
+            if valid:
+                self.cache_plan(speech_command, distances, steps)
+
+        # Cached or not, the safety layer always sees the current distances
+        return self.apply_safety(steps, distances, history)
+
+    def generate_plan_stream(self, speech_command: str, distances: dict, publish_step, history=None,
+                             publish_plan=None) -> list:
+        """
+        Like generate_plan, but publishes each step as soon as its JSON object
+        closes in the streamed LLM output, so the robot starts moving while the
+        rest of the plan is still being generated.
+
+        publish_step(step_dict) receives safety-checked steps in order; it may
+        raise to abandon the stream (e.g. the command was superseded).
+        A plan that is complete up front (safety stop, fast path, plan cache)
+        goes to publish_plan(steps) in one call instead, so the robot gets it
+        whole; without publish_plan its steps go to publish_step too.
+        history (a SensorStore) lets the safety layer use recent readings.
+        Returns the full list of published steps.
+        """
+        published = []
+
+        def publish(steps):
+            for step in self.apply_safety(steps, distances, history):
+                publish_step(step)
+                published.append(step)
+
+        def publish_whole(steps):
+            if publish_plan is None:
+                publish(steps)
+                return
+            plan = self.apply_safety(steps, distances, history)
+            publish_plan(plan)
+            published.extend(plan)
+
+        # Safety first: if the robot is too close, no need to ask anything
+        if self.front_clearance(distances, history) < Config.FRONT_SAFE_THRESHOLD:
+            publish_whole([])
+            return published
+
+        steps = self.local_plan(speech_command, distances)
+        if steps is not None:
+            publish_whole(steps)
+            return published
+
+        parser = PlanStreamParser()
+        valid_steps = []
+        start = time.perf_counter()
+        stream = self.client.chat(
+            model=self.model_name,
+            messages=self.build_messages(speech_command, distances),
+            format=PLAN_SCHEMA,
+            keep_alive=Config.KEEP_ALIVE,
+            options={"temperature": self.temperature},
+            stream=True
+        )
+        for chunk in stream:
+            for raw_step in parser.feed(chunk["message"]["content"]):
+                try:
+                    step = ActionDecision(**raw_step)
+                except Exception as e:
+                    print(f"⚠️ Skipping invalid streamed step {raw_step}: {e}")
+                    parser.skipped += 1
+                    continue
+                if not valid_steps:
+                    print(f"🚀 First step ready after {time.perf_counter() - start:.2f}s")
+                valid_steps.append(step)
+                publish([step])
+            if chunk.get("done"):
+                self.record_timings(chunk)
+
+        # The plan MUST end with 'stop', even if the stream was cut short
+        if not valid_steps or valid_steps[-1].action != "stop":
+            publish([ActionDecision(action="stop", notes="Stop appended after streamed plan")])
+        if valid_steps and valid_steps[-1].action == "stop" and not parser.skipped:
+            self.cache_plan(speech_command, distances, valid_steps)
+        return published
+
+    def build_messages(self, speech_command: str, distances: dict) -> list:
+        """Static system prompt first (cacheable prefix), per-request data last."""
         # --- USER PROMPT (match first program phrasing) ---
         user_prompt = f"""
 Command: "{speech_command}"
 Ultrasonic readings: {json.dumps(distances)}
 Generate the complete JSON response that contains the top-level 'plan' array now.
 """
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
 
+    def record_timings(self, response):
+        """
+        Logs Ollama's prompt-eval vs eval timings. When the system prompt prefix
+        is reused from the KV cache, prompt_eval_count drops to roughly the
+        size of the user message.
+        """
+        ns = 1e-9
+        timings = {
+            "prompt_tokens": response.get("prompt_eval_count") or 0,
+            "prompt_eval_s": (response.get("prompt_eval_duration") or 0) * ns,
+            "output_tokens": response.get("eval_count") or 0,
+            "eval_s": (response.get("eval_duration") or 0) * ns,
+            "load_s": (response.get("load_duration") or 0) * ns,
+            "total_s": (response.get("total_duration") or 0) * ns,
+        }
+        self.last_timings = timings
+        self.timing_totals["requests"] += 1
+        for key in ("prompt_tokens", "prompt_eval_s", "output_tokens", "eval_s"):
+            self.timing_totals[key] += timings[key]
+        print(f"⏱️ Ollama: prompt {timings['prompt_tokens']} tok in {timings['prompt_eval_s']:.2f}s | "
+              f"output {timings['output_tokens']} tok in {timings['eval_s']:.2f}s | "
+              f"load {timings['load_s']:.2f}s | total {timings['total_s']:.2f}s")
+        return timings
+
+    def llm_plan(self, speech_command: str, distances: dict):
+        """
+        Asks the LLM for a plan. Never raises on bad output: falls back to a single stop.
+        Returns (plan, valid); valid is False for the fallback plan.
+        """
         # --- LLM CALL ---
         response = self.client.chat(
             model=self.model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            format="json",
+            messages=self.build_messages(speech_command, distances),
+            format=PLAN_SCHEMA,  # Structured output: Ollama constrains decoding to the schema
+            keep_alive=Config.KEEP_ALIVE,
+            options={"temperature": self.temperature}
+        )
+        self.record_timings(response)
+        return self.parse_response(response['message']['content'])
+
+    async def allm_plan(self, speech_command: str, distances: dict):
+        """
+        Async twin of llm_plan using ollama.AsyncClient. Cancelling the awaiting
+        task closes the HTTP request, which makes Ollama stop generating.
+        Must be awaited from the same event loop every time.
+        """
+        if self.async_client is None:
+            self.async_client = AsyncClient()  # Bound to the loop that first uses it
+        response = await self.async_client.chat(
+            model=self.model_name,
+            messages=self.build_messages(speech_command, distances),
+            format=PLAN_SCHEMA,
+            keep_alive=Config.KEEP_ALIVE,
             options={"temperature": self.temperature}
         )
+        self.record_timings(response)
+        return self.parse_response(response['message']['content'])
 
-        raw_text = response['message']['content']
+    def parse_response(self, raw_text: str):
+        """Returns (plan, valid); a single fallback stop with valid=False if the output is unusable."""
         print("\n🧠 Raw AI response:", raw_text)
 
         # --- JSON PARSING ---
@@ -97,12 +284,34 @@ Generate the complete JSON response that contains the top-level 'plan' array now
             plan = ActionPlan(plan=[
                 ActionDecision(action="stop", notes=f"Fallback due to invalid AI output: {e}")
             ])
+            return plan, False
 
-        # --- SAFETY LAYER (identical to first program) ---
+        return plan, True
+
+    @staticmethod
+    def front_clearance(distances: dict, history=None) -> float:
+        """
+        Front distance the safety check compares with FRONT_SAFE_THRESHOLD.
+        With a sensor history it is the lower of the given reading and the
+        median over SAFETY_WINDOW projected SAFETY_HORIZON ahead at the
+        current rate of approach, so a robot closing in fast stops early.
+        """
         front_distance = distances.get("front", 100.0)
+        if history is not None and "front" in history:
+            projected = history.projected("front", Config.SAFETY_WINDOW, Config.SAFETY_HORIZON)
+            if projected is not None:
+                front_distance = min(front_distance, projected)
+        return front_distance
+
+    def apply_safety(self, steps: List[ActionDecision], distances: dict, history=None) -> list:
+        """
+        SAFETY LAYER (identical to first program). Runs on every plan, whatever
+        produced it, with the current distances. Returns plain dicts for the Pi.
+        """
+        front_distance = self.front_clearance(distances, history)
         final_plan = []
         DEFAULT_DISTANCE = 0.5
-        DEFAULT_DURATION = 1.0
+        DEFAULT_ANGLE = 90.0
 
         if front_distance < Config.FRONT_SAFE_THRESHOLD:
             final_plan.append(ActionDecision(
@@ -110,13 +319,13 @@ Generate the complete JSON response that contains the top-level 'plan' array now
                 notes="CRITICAL SAFETY OVERRIDE: Front distance too close."
             ).model_dump(exclude_none=True))
         else:
-            for d in plan.plan:
+            for d in steps:
                 step = d.model_dump(exclude_none=True)
                 if step["action"] in ["forward", "backward", "left", "right"]:
-                    if "distance" not in step and "duration" not in step:
+                    if "distance" not in step and "duration" not in step and "angle" not in step:
                         if step["action"] in ["left", "right"]:
-                            step["duration"] = DEFAULT_DURATION
-                            step["notes"] = step.get("notes", "") + " [DURATION DEFAULT INJECTED for turn]"
+                            step["angle"] = DEFAULT_ANGLE
+                            step["notes"] = step.get("notes", "") + " [ANGLE DEFAULT INJECTED for turn]"
                         else:
                             step["distance"] = DEFAULT_DISTANCE
                             step["notes"] = step.get("notes", "") + " [DISTANCE DEFAULT INJECTED]"
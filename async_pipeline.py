@@ -0,0 +1,144 @@
+# async_pipeline.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import intents
+
+
+class AsyncCommandPipeline:
+    """
+    asyncio command pipeline: transcription -> planning -> publish, with
+    per-stage deadlines and supersede-on-new-command.
+
+    - Once a newer command's transcript is known, it cancels the older one's
+      planning, including its Ollama request. Transcription itself is never
+      cancelled, so empty audio or a late "stop" can't be lost.
+    - "stop" takes a priority lane: it is published the moment its transcript
+      is known and cancels any planning still in flight. take_partial_stop()
+      says whether the streaming transcriber already sent it mid-utterance.
+    - Plans are published with replace semantics, so a stale plan the Pi
+      hasn't fetched yet is swapped out instead of piling up.
+
+    With several robots, route(command) -> (robot_id, command) picks the
+    target; supersede only applies between commands for the same robot.
+
+    Runs its own event loop on a background thread; submit() is thread-safe
+    and is what the STT callback calls.
+    """
+
+    def __init__(self, stt_instance, planner, get_distances, publish_plan,
+                 transcribe_timeout=10.0, plan_timeout=30.0, route=None, get_history=None, take_partial_stop=None):
+        self.stt = stt_instance
+        self.planner = planner
+        self.get_distances = get_distances  # (robot_id) -> dict of current distances
+        self.publish_plan = publish_plan  # (plan, preempt, robot_id) -> None
+        self.route = route or (lambda command: (None, command))
+        self.get_history = get_history or (lambda robot_id: None)  # (robot_id) -> SensorStore for the safety layer
+        self.take_partial_stop = take_partial_stop or (lambda: False)  # () -> stop already sent; clears the flag
+        self.transcribe_timeout = transcribe_timeout
+        self.plan_timeout = plan_timeout
+
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="whisper")
+        self._next_seq = 0  # Arrival order of commands
+        self._newest_transcribed = {}  # robot_id -> seq of its newest command whose transcript is known
+        self._planning = {}  # robot_id -> task currently waiting on the planner
+        self.stats = {"commands": 0, "superseded": 0, "timeouts": 0, "priority_stops": 0, "published": 0}
+
+    def start(self):
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        print("⚙️ Async command pipeline started.")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, audio_array, transcript=None):
+        """Thread-safe entry point (called from the STT callback)."""
+        self.loop.call_soon_threadsafe(self._on_command, audio_array, transcript, time.perf_counter())
+
+    def _on_command(self, audio_array, transcript, received_at):
+        self.stats["commands"] += 1
+        seq = self._next_seq
+        self._next_seq += 1
+        self.loop.create_task(self._handle(seq, audio_array, transcript, received_at))
+
+    def _supersede_planning(self, robot_id):
+        targets = list(self._planning) if robot_id == intents.ALL_ROBOTS else [robot_id]
+        for target in targets:
+            task = self._planning.get(target)
+            if task is not None and not task.done():
+                task.cancel()
+                self.stats["superseded"] += 1
+                print("⏭️ Newer command heard, cancelling the plan in flight.")
+
+    async def _transcribe(self, audio_array):
+        # Whisper is blocking C++ code: run it on the executor with a deadline.
+        # A timed-out/cancelled transcription finishes in the background and is discarded.
+        return await asyncio.wait_for(
+            self.loop.run_in_executor(self.executor, self.stt.model_transcribe, audio_array),
+            self.transcribe_timeout
+        )
+
+    async def _handle(self, seq, audio_array, transcript, received_at):
+        try:
+            if transcript is None:
+                transcript = await self._transcribe(audio_array)
+            command = transcript.strip().lower().rstrip(".")
+            stop_already_sent = self.take_partial_stop()
+            if not command:
+                print("🎙️ Heard empty audio, ignoring.")
+                return
+            robot_id, command = self.route(command)
+
+            distances = self.get_distances(robot_id)
+
+            # --- Priority lane: stop goes out immediately, whatever else is going on ---
+            if intents.is_stop_command(command):
+                self._newest_transcribed[robot_id] = max(self._newest_transcribed.get(robot_id, -1), seq)
+                self._supersede_planning(robot_id)
+                if stop_already_sent:
+                    print("🛑 Stop was already sent from the partial transcript.")
+                    return
+                self.stats["priority_stops"] += 1
+                self._publish(self.planner.apply_safety(intents.stop_plan(), distances), robot_id, received_at)
+                return
+            if robot_id == intents.ALL_ROBOTS:
+                print(f"⚠️ Only 'stop' can go to all robots, ignoring '{command}'.")
+                return
+
+            if seq < self._newest_transcribed.get(robot_id, -1):
+                print(f"⏭️ Dropping '{command}': a newer command was already heard.")
+                self.stats["superseded"] += 1
+                return
+            self._newest_transcribed[robot_id] = seq
+            self._supersede_planning(robot_id)
+            self._planning[robot_id] = asyncio.current_task()
+
+            steps = self.planner.local_plan(command, distances)
+            if steps is None:
+                plan, valid = await asyncio.wait_for(self.planner.allm_plan(command, distances), self.plan_timeout)
+                steps = plan.plan
+                if valid:
+                    self.planner.cache_plan(command, distances, steps)
+            # Re-read distances: the robot may have moved while we were planning
+            self._publish(self.planner.apply_safety(steps, self.get_distances(robot_id), self.get_history(robot_id)),
+                          robot_id, received_at)
+
+        except asyncio.CancelledError:
+            print("⏹️ Command superseded; in-flight work cancelled.")
+            raise
+        except asyncio.TimeoutError:
+            # Nothing is published: the robot keeps doing what it was doing
+            self.stats["timeouts"] += 1
+            print(f"⌛ Command missed its deadline after {time.perf_counter() - received_at:.1f}s, dropped.")
+        except Exception as e:
+            print(f"❌ Async pipeline error: {e}")
+
+    def _publish(self, plan, robot_id, received_at):
+        # preempt=True: replace whatever stale plan is still waiting for the Pi
+        self.publish_plan(plan, True, robot_id)
+        self.stats["published"] += 1
+        print(f"🤖 Plan published {time.perf_counter() - received_at:.2f}s after the command was recorded "
+              f"({len(plan)} steps)")
@@ -0,0 +1,157 @@
+# audio_buffer.py
+import threading
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity int16 ring buffer for recorded audio.
+    Written from the real-time audio thread, so write() never allocates.
+    When full, the oldest samples are overwritten and counted as overrun.
+    """
+
+    def __init__(self, max_seconds, sample_rate):
+        self.capacity = int(max_seconds * sample_rate)
+        self.sample_rate = sample_rate
+        self._data = np.zeros(self.capacity, dtype=np.int16)
+        self._write_pos = 0  # Next index to write
+        self._size = 0  # Number of valid samples
+        self.overrun_samples = 0  # Samples lost since the last clear()
+        self.total_overruns = 0  # Samples lost over the buffer's lifetime
+
+    def clear(self):
+        self._write_pos = 0
+        self._size = 0
+        self.overrun_samples = 0
+
+    def write(self, samples):
+        """Copy a 1-D block of samples into the buffer (no Python-level per-sample work)."""
+        n = len(samples)
+        if n >= self.capacity:
+            # Block alone fills the buffer: keep only its newest samples
+            lost = self._size + n - self.capacity
+            self._data[:] = samples[n - self.capacity:]
+            self._write_pos = 0
+            self._size = self.capacity
+            self.overrun_samples += lost
+            self.total_overruns += lost
+            return
+
+        end = self._write_pos + n
+        if end <= self.capacity:
+            self._data[self._write_pos:end] = samples
+        else:
+            first = self.capacity - self._write_pos
+            self._data[self._write_pos:] = samples[:first]
+            self._data[:n - first] = samples[first:]
+        self._write_pos = end % self.capacity
+
+        lost = max(0, self._size + n - self.capacity)
+        self._size = min(self.capacity, self._size + n)
+        self.overrun_samples += lost
+        self.total_overruns += lost
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def fill_level(self):
+        """Fraction of capacity in use (0.0 - 1.0)."""
+        return self._size / self.capacity
+
+    @property
+    def duration(self):
+        """Seconds of audio currently held."""
+        return self._size / self.sample_rate
+
+    @property
+    def wrapped(self):
+        return self.overrun_samples > 0
+
+    def view(self):
+        """
+        Zero-copy view of the samples in order, or None if the buffer has wrapped
+        (wrapped data is not contiguous - use copy() instead).
+        The view is only valid until the next write()/clear().
+        """
+        if self.wrapped:
+            return None
+        return self._data[:self._size]
+
+    def copy(self):
+        """One contiguous copy of the samples in chronological order."""
+        if not self.wrapped:
+            return self._data[:self._size].copy()
+        start = self._write_pos
+        return np.concatenate((self._data[start:], self._data[:start]))
+
+    def stats(self):
+        return {
+            "samples": self._size,
+            "capacity": self.capacity,
+            "fill_level": round(self.fill_level, 3),
+            "overrun_samples": self.overrun_samples,
+            "total_overruns": self.total_overruns,
+        }
+
+
+class FrameQueue:
+    """
+    Bounded single-producer/single-consumer queue of fixed-size audio frames.
+
+    The producer (PortAudio callback) only advances the write counter and the
+    consumer (detector thread) only advances the read counter, so frames move
+    without a lock. put() never waits for the consumer; it only touches the
+    wakeup Event (whose set() briefly takes its internal lock) when the
+    consumer found the queue empty and cleared it, not on every frame. Frames
+    are stored in one preallocated 2-D array. When the queue is full, the new
+    frame is dropped and counted.
+    """
+
+    def __init__(self, capacity, frame_length):
+        self.capacity = capacity
+        self.frame_length = frame_length
+        self._frames = np.zeros((capacity, frame_length), dtype=np.int16)
+        self._out = np.zeros(frame_length, dtype=np.int16)  # Consumer-owned copy
+        self._read = 0  # Only written by the consumer
+        self._write = 0  # Only written by the producer
+        self._ready = threading.Event()
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, frame) -> bool:
+        """Producer side. frame: (frame_length,) or (frame_length, 1) int16."""
+        write = self._write
+        depth = write - self._read
+        if depth >= self.capacity:
+            self.dropped += 1
+            return False
+        self._frames[write % self.capacity] = frame.reshape(-1)
+        self._write = write + 1
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        # is_set() is a plain read; get() re-checks the counters after clearing, so skipping is safe
+        if not self._ready.is_set():
+            self._ready.set()
+        return True
+
+    def get(self, timeout=None):
+        """
+        Consumer side. Returns the oldest frame (valid until the next get()),
+        or None if nothing arrived within timeout.
+        """
+        if self._read == self._write:
+            self._ready.clear()
+            # Re-check after clearing so a put() in between is not missed
+            if self._read == self._write and not self._ready.wait(timeout):
+                return None
+            if self._read == self._write:
+                return None
+        read = self._read
+        self._out[:] = self._frames[read % self.capacity]
+        self._read = read + 1
+        return self._out
+
+    @property
+    def depth(self):
+        return self._write - self._read
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# bench_wake_word.py
+"""
+Microbenchmark for the wake-word hot path in STT.audio_callback.
+
+Compares the old conversion (indata.tobytes() + struct.unpack_from("h" * n))
+with WakeWordFrontEnd, per 512-sample frame, against the 32 ms frame budget.
+
+    python bench_wake_word.py            # Porcupine stand-in (conversion cost only)
+    python bench_wake_word.py --real     # real Porcupine with STT's access key
+"""
+import argparse
+import ctypes
+import struct
+import time
+import numpy as np
+from wake_word import WakeWordFrontEnd
+
+FRAME_LENGTH = 512
+SAMPLE_RATE = 16000
+FRAME_BUDGET_MS = FRAME_LENGTH / SAMPLE_RATE * 1000
+
+
+class FakePorcupine:
+    """Does the same ctypes conversion as pvporcupine.Porcupine.process, without inference."""
+    frame_length = FRAME_LENGTH
+
+    def process(self, pcm):
+        if len(pcm) != self.frame_length:
+            raise ValueError("Invalid frame length")
+        (ctypes.c_short * len(pcm))(*pcm)
+        return -1
+
+
+def legacy_process(porcupine, indata):
+    pcm = struct.unpack_from("h" * porcupine.frame_length, indata.tobytes())
+    return porcupine.process(pcm)
+
+
+def measure(fn, frames):
+    times = np.empty(len(frames))
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        fn(frame)
+        times[i] = time.perf_counter() - t0
+    return times * 1000
+
+
+def report(name, times_ms):
+    p50, p99 = np.percentile(times_ms, [50, 99])
+    print(f"{name:<12} mean {times_ms.mean() * 1000:8.1f} µs | p50 {p50 * 1000:8.1f} µs | "
+          f"p99 {p99 * 1000:8.1f} µs | max {times_ms.max():6.3f} ms | "
+          f"{times_ms.mean() / FRAME_BUDGET_MS * 100:5.2f}% of {FRAME_BUDGET_MS:.0f} ms budget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000, help="Frames per run")
+    parser.add_argument("--real", action="store_true", help="Use real Porcupine (needs pvporcupine + Wake_Word.ppn)")
+    args = parser.parse_args()
+
+    if args.real:
+        import pvporcupine
+        from stt import STT
+        porcupine = pvporcupine.create(access_key=STT.ACCESS_KEY, keyword_paths=[STT.WAKE_WORD_PATH])
+    else:
+        porcupine = FakePorcupine()
+
+    rng = np.random.default_rng(0)
+    # Same shape/dtype sounddevice hands to the callback: (frames, channels) int16
+    frames = [rng.integers(-3000, 3000, size=(porcupine.frame_length, 1), dtype=np.int16)
+              for _ in range(args.frames)]
+    front_end = WakeWordFrontEnd(porcupine)
+
+    # Warm up both paths once
+    legacy_process(porcupine, frames[0])
+    front_end.process(frames[0])
+
+    print(f"⏱️ {args.frames} frames of {porcupine.frame_length} samples "
+          f"({'real Porcupine' if args.real else 'Porcupine stand-in'})")
+    legacy = measure(lambda f: legacy_process(porcupine, f), frames)
+    new = measure(front_end.process, frames)
+    report("before", legacy)
+    report("after", new)
+    print(f"🚀 Speed-up: {legacy.mean() / new.mean():.2f}x")
+
+    if args.real:
+        porcupine.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# bench_whisper_profiles.py
+"""
+Real-time factor and word error rate for each Whisper decoding profile.
+
+Expects a directory of labeled WAVs: every clip.wav has a clip.txt next to
+it with the reference transcript (or pass --labels with file,transcript rows).
+Each clip is decoded in one pass; the streaming transcriber decodes with the
+same profile options, except that its partial passes are greedy and keep
+word timestamps.
+
+    python bench_whisper_profiles.py data/labeled_commands
+    python bench_whisper_profiles.py data/labeled_commands --profiles latency balanced
+"""
+import argparse
+import csv
+import os
+import re
+import time
+import numpy as np
+from faster_whisper import decode_audio
+from stt import DECODING_PROFILES, STT, load_whisper_model, transcribe_options
+
+
+def normalize_text(text):
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level Levenshtein distance."""
+    ref, hyp = normalize_text(reference), normalize_text(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def load_dataset(directory, labels_path):
+    labels = {}
+    if labels_path:
+        with open(labels_path) as f:
+            for row in csv.reader(f):
+                if row and not row[0].startswith("#"):
+                    labels[os.path.basename(row[0])] = row[1]
+
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".wav"):
+            continue
+        sidecar = os.path.join(directory, name[:-4] + ".txt")
+        if name in labels:
+            reference = labels[name]
+        elif os.path.exists(sidecar):
+            with open(sidecar) as f:
+                reference = f.read().strip()
+        else:
+            print(f"⚠️ Skipping {name}: no reference transcript")
+            continue
+        audio = decode_audio(os.path.join(directory, name), sampling_rate=STT.SAMPLE_RATE)
+        clips.append((name, audio, reference))
+    return clips
+
+
+def bench_profile(name, clips):
+    profile = DECODING_PROFILES[name]
+    start = time.perf_counter()
+    model = load_whisper_model(profile)
+    load_time = time.perf_counter() - start
+    options = transcribe_options(profile)
+
+    # Warm-up so the first clip isn't charged for buffer allocation
+    segments, info = model.transcribe(STT.normalize_audio(clips[0][1]), **options)
+    list(segments)
+
+    decode_time = audio_time = 0.0
+    errors = words = 0
+    for clip_name, audio, reference in clips:
+        start = time.perf_counter()
+        segments, info = model.transcribe(STT.normalize_audio(audio), **options)
+        hypothesis = " ".join(segment.text for segment in segments)
+        decode_time += time.perf_counter() - start
+        audio_time += len(audio) / STT.SAMPLE_RATE
+        e, n = word_errors(reference, hypothesis)
+        errors += e
+        words += n
+        if e:
+            print(f"   [{name}] {clip_name}: '{hypothesis.strip()}' (ref '{reference}')")
+
+    return {
+        "profile": name,
+        "model": profile["model_size"],
+        "load_s": load_time,
+        "rtf": decode_time / audio_time,
+        "avg_latency_s": decode_time / len(clips),
+        "wer": errors / max(words, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--labels", help="CSV of file,transcript (instead of .txt sidecars)")
+    parser.add_argument("--profiles", nargs="+", default=list(DECODING_PROFILES), choices=list(DECODING_PROFILES))
+    args = parser.parse_args()
+
+    clips = load_dataset(args.directory, args.labels)
+    if not clips:
+        print("❌ No labeled WAVs found.")
+        return
+    total_audio = sum(len(audio) for _, audio, _ in clips) / STT.SAMPLE_RATE
+    print(f"🎧 {len(clips)} clips, {total_audio:.1f}s of audio")
+
+    results = []
+    for name in args.profiles:
+        print(f"🔄 Profile '{name}'...")
+        results.append(bench_profile(name, clips))
+
+    print(f"\n{'profile':<10} {'model':<10} {'load':>7} {'RTF':>7} {'latency':>9} {'WER':>7}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['model']:<10} {r['load_s']:6.1f}s {r['rtf']:7.3f} "
+              f"{r['avg_latency_s']:8.2f}s {r['wer'] * 100:6.1f}%")
+    fastest = min(results, key=lambda r: r["rtf"])
+    print(f"\n🚀 Fastest: '{fastest['profile']}' "
+          f"({np.max([r['rtf'] for r in results]) / fastest['rtf']:.1f}x faster than the slowest)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# endpointer.py
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class Endpointer(ABC):
+    """
+    Decides when a spoken command has ended.
+    process() is called once per recorded frame and returns True at the endpoint.
+    Subclasses implement is_speech() and should_end().
+    """
+
+    def __init__(self, sample_rate, max_duration):
+        self.sample_rate = sample_rate
+        self.max_duration = max_duration  # Hard cap so recording always ends
+        self.reset()
+
+    def reset(self):
+        """Called when the wake word starts a new command."""
+        self.duration = 0.0  # Seconds recorded so far
+        self.trailing_silence = 0.0  # Seconds since speech was last detected
+        self.speech_seconds = 0.0
+        self.end_reason = None
+
+    def track_noise(self, frame):
+        """Called for frames heard while NOT recording. Default: nothing to learn."""
+
+    @abstractmethod
+    def is_speech(self, frame) -> bool:
+        """True if the frame contains speech."""
+
+    @abstractmethod
+    def should_end(self) -> bool:
+        """True once the command is over (checked after every frame)."""
+
+    def process(self, frame) -> bool:
+        frame_seconds = len(frame) / self.sample_rate
+        self.duration += frame_seconds
+        if self.is_speech(frame):
+            self.speech_seconds += frame_seconds
+            self.trailing_silence = 0.0
+        else:
+            self.trailing_silence += frame_seconds
+
+        if self.duration >= self.max_duration:
+            self.end_reason = "max_duration"
+        elif self.should_end():
+            self.end_reason = self.end_reason or "silence"
+        return self.end_reason is not None
+
+
+class AmplitudeEndpointer(Endpointer):
+    """The original rule: peak amplitude below a fixed threshold for a fixed time."""
+
+    def __init__(self, sample_rate, max_duration, threshold=800, silence_duration=2.0):
+        self.threshold = threshold
+        self.silence_duration = silence_duration
+        super().__init__(sample_rate, max_duration)
+
+    def is_speech(self, frame) -> bool:
+        return np.max(np.abs(frame.astype(np.int32))) >= self.threshold
+
+    def should_end(self) -> bool:
+        return self.trailing_silence >= self.silence_duration
+
+
+class VADEndpointer(Endpointer):
+    """
+    Energy + spectral voice activity detection with an adaptive noise floor.
+
+    A frame is speech when its energy is speech_margin_db above the tracked
+    noise floor AND most of that energy sits in the voice band AND the
+    spectrum is not flat (broadband noise such as fans is flat). The command
+    ends hangover seconds after the last speech frame.
+    """
+
+    VOICE_BAND_HZ = (80.0, 3800.0)  # From low male pitch up; most of a voice's energy is below 250 Hz
+
+    def __init__(self, sample_rate, max_duration, hangover=0.6, speech_margin_db=9.0,
+                 min_voice_band_ratio=0.5, max_flatness=0.45, no_speech_timeout=4.0,
+                 min_speech=0.15, initial_floor_db=-60.0, floor_rise=0.02, floor_fall=0.3):
+        self.hangover = hangover
+        self.speech_margin_db = speech_margin_db
+        self.min_voice_band_ratio = min_voice_band_ratio
+        self.max_flatness = max_flatness
+        self.no_speech_timeout = no_speech_timeout  # Give up if the user never speaks
+        self.min_speech = min_speech  # Ignore clicks shorter than this
+        self.floor_rise = floor_rise  # Slow: speech must not drag the floor up
+        self.floor_fall = floor_fall  # Fast: follow the room when it gets quieter
+        self.noise_floor_db = initial_floor_db
+        self._band_mask = None
+        super().__init__(sample_rate, max_duration)
+
+    def _features(self, frame):
+        """(energy_db, voice_band_ratio, spectral_flatness) for one frame, all vectorized."""
+        x = frame.astype(np.float32) * (1.0 / 32768.0)
+        x -= x.mean()  # Mic DC offset: not sound, and it would sit in the lowest FFT bin
+        energy_db = 10.0 * np.log10(np.mean(x * x) + 1e-10)
+
+        power = np.abs(np.fft.rfft(x)) ** 2 + 1e-12
+        if self._band_mask is None or len(self._band_mask) != len(power):
+            freqs = np.fft.rfftfreq(len(x), 1.0 / self.sample_rate)
+            self._band_mask = (freqs >= self.VOICE_BAND_HZ[0]) & (freqs <= self.VOICE_BAND_HZ[1])
+        total = power.sum()
+        band_ratio = power[self._band_mask].sum() / total
+        flatness = np.exp(np.mean(np.log(power))) / (total / len(power))
+        return energy_db, band_ratio, flatness
+
+    def _update_floor(self, energy_db):
+        rate = self.floor_fall if energy_db < self.noise_floor_db else self.floor_rise
+        self.noise_floor_db += rate * (energy_db - self.noise_floor_db)
+
+    def track_noise(self, frame):
+        energy_db, _, _ = self._features(frame)
+        self._update_floor(energy_db)
+
+    def is_speech(self, frame) -> bool:
+        energy_db, band_ratio, flatness = self._features(frame)
+        speech = (energy_db > self.noise_floor_db + self.speech_margin_db
+                  and band_ratio >= self.min_voice_band_ratio
+                  and flatness <= self.max_flatness)
+        if not speech:
+            self._update_floor(energy_db)
+        return speech
+
+    def should_end(self) -> bool:
+        if self.speech_seconds < self.min_speech:
+            if self.duration >= self.no_speech_timeout:
+                self.end_reason = "no_speech"
+                return True
+            return False
+        return self.trailing_silence >= self.hangover
+
+
+def make_endpointer(kind, sample_rate, max_duration, **options):
+    """Build an endpointer by name ("vad" or "amplitude")."""
+    if kind == "vad":
+        return VADEndpointer(sample_rate, max_duration, **options)
+    if kind == "amplitude":
+        return AmplitudeEndpointer(sample_rate, max_duration, **options)
+    raise ValueError(f"Unknown endpointer '{kind}'")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# eval_endpointer.py
+"""
+Offline endpoint-latency evaluation on recorded WAVs.
+
+Each file is fed frame by frame to every endpointer as if the wake word had
+just fired at t=0, followed by --pad seconds of room noise so the endpoint
+can fire. Endpoint latency = endpoint time - end of speech. A file that
+never endpoints, or only through no_speech_timeout (the VAD heard no
+speech at all), is a miss rather than a latency.
+
+End of speech comes from a labels CSV (file,speech_end_seconds) when given,
+otherwise it is estimated offline as the last frame within --ref-db of the
+loudest frame.
+
+    python eval_endpointer.py test.wav data/audio_queue/*.wav
+    python eval_endpointer.py --labels labels.csv data/audio_queue/*.wav
+"""
+import argparse
+import csv
+import os
+import wave
+import numpy as np
+from endpointer import make_endpointer
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 512  # Same as Porcupine's frame length
+
+
+def load_wav(path):
+    """Mono int16 at SAMPLE_RATE (linear resampling is fine for endpointing)."""
+    with wave.open(path) as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        rate, channels = w.getframerate(), w.getnchannels()
+        audio = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        n = int(len(audio) * SAMPLE_RATE / rate)
+        audio = np.interp(np.arange(n) * (rate / SAMPLE_RATE), np.arange(len(audio)), audio)
+    return audio.astype(np.int16)
+
+
+def frame_energy_db(frames):
+    x = frames.astype(np.float32) / 32768.0
+    x -= x.mean(axis=1, keepdims=True)  # The mic's DC offset alone would put every frame near the peak
+    return 10.0 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+
+
+def estimate_speech_end(frames, ref_db):
+    energy = frame_energy_db(frames)
+    loud = np.nonzero(energy >= energy.max() - ref_db)[0]
+    return (loud[-1] + 1) * FRAME_LENGTH / SAMPLE_RATE
+
+
+def pad_with_noise(audio, frames, seconds, rng):
+    """Append noise at the level of the file's quietest 10% of frames, rounded to whole frames."""
+    energy = frame_energy_db(frames)
+    quiet = frames[energy <= np.percentile(energy, 10)]
+    sigma = max(float(np.std(quiet - quiet.mean(axis=1, keepdims=True))), 1.0)
+    noise = rng.normal(0.0, sigma, int(round(seconds * SAMPLE_RATE / FRAME_LENGTH)) * FRAME_LENGTH)
+    return np.concatenate((audio, np.clip(noise, -32768, 32767).astype(np.int16)))
+
+
+def run_endpointer(endpointer, frames, warmup_frames):
+    # Let adaptive endpointers learn the room from the start of the file, as they would before the wake word
+    for frame in frames[:warmup_frames]:
+        endpointer.track_noise(frame)
+    endpointer.reset()
+    for frame in frames:
+        if endpointer.process(frame):
+            return endpointer.duration, endpointer.end_reason
+    return None, "never"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("wavs", nargs="+")
+    parser.add_argument("--labels", help="CSV of file,speech_end_seconds")
+    parser.add_argument("--pad", type=float, default=3.0, help="Seconds of noise appended after each file")
+    parser.add_argument("--ref-db", type=float, default=30.0, help="Speech-end estimate: dB below the peak frame")
+    parser.add_argument("--max-duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    labels = {}
+    if args.labels:
+        with open(args.labels) as f:
+            for row in csv.reader(f):
+                if row and not row[0].startswith("#"):
+                    labels[os.path.basename(row[0])] = float(row[1])
+
+    rng = np.random.default_rng(0)
+    kinds = ["amplitude", "vad"]
+    latencies = {kind: [] for kind in kinds}
+    misses = {kind: 0 for kind in kinds}
+
+    print(f"{'file':<32} {'speech end':>10} " + " ".join(f"{k + ' (s)':>22}" for k in kinds))
+    for path in args.wavs:
+        audio = load_wav(path)
+        usable = len(audio) // FRAME_LENGTH * FRAME_LENGTH
+        frames = audio[:usable].reshape(-1, FRAME_LENGTH)
+        name = os.path.basename(path)
+        speech_end = labels.get(name, estimate_speech_end(frames, args.ref_db))
+
+        padded = pad_with_noise(audio[:usable], frames, args.pad, rng)
+        padded_frames = padded.reshape(-1, FRAME_LENGTH)
+        warmup = max(1, int(0.3 * SAMPLE_RATE / FRAME_LENGTH))
+
+        cells = []
+        for kind in kinds:
+            endpointer = make_endpointer(kind, SAMPLE_RATE, args.max_duration + args.pad)
+            end, reason = run_endpointer(endpointer, padded_frames, warmup)
+            if end is None or reason == "no_speech":
+                misses[kind] += 1
+                cells.append(f"{'never' if end is None else f'{end:6.2f} (miss, no speech)':>22}")
+                continue
+            latency = end - speech_end
+            latencies[kind].append(latency)
+            cells.append(f"{end:6.2f} ({latency:+5.2f}, {reason[:7]})")
+        print(f"{name:<32} {speech_end:>10.2f} " + " ".join(f"{c:>22}" for c in cells))
+
+    print("\n📊 Endpoint latency after end of speech:")
+    for kind in kinds:
+        values = np.array(latencies[kind])
+        if len(values) == 0:
+            print(f"  {kind:<10} no endpoints | misses {misses[kind]}")
+            continue
+        print(f"  {kind:<10} mean {values.mean():+.2f}s | median {np.median(values):+.2f}s | "
+              f"max {values.max():+.2f}s | early cut-offs {(values < 0).sum()}/{len(values)} | "
+              f"misses {misses[kind]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# intents.py
+"""
+Deterministic parser for simple, well-known robot commands.
+
+Commands like "stop", "go forward one meter", "turn right" or "draw a hexagon"
+don't need an LLM round trip. parse_command() maps them straight to
+ActionDecision lists and returns None for anything it doesn't fully
+understand, so the planner can fall back to the LLM.
+"""
+import re
+from typing import List, Optional, Tuple
+from plan_types import ActionDecision
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13,
+    "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80,
+    "ninety": 90, "hundred": 100,
+    "half": 0.5, "a half": 0.5, "half a": 0.5, "quarter": 0.25, "a quarter": 0.25,
+}
+SHAPE_SIDES = {
+    "triangle": 3, "square": 4, "pentagon": 5, "hexagon": 6,
+    "heptagon": 7, "octagon": 8, "nonagon": 9, "decagon": 10,
+}
+DISTANCE_UNITS = {"meter": 1.0, "meters": 1.0, "metre": 1.0, "metres": 1.0, "m": 1.0,
+                  "centimeter": 0.01, "centimeters": 0.01, "cm": 0.01}
+
+ALL_ROBOTS = "*"  # split_target() result for "all robots, ..."
+_ALL_TARGETS = ("all robots", "every robot", "everyone", "everybody")
+# Bare "all" only addresses every robot in "all stop": "all right, turn left" is not for the fleet
+_ALL_STOP_TARGET = "all"
+
+DEFAULT_SIDE_LENGTH = 0.5  # meters
+DEFAULT_TURN_DEGREES = 90.0
+MAX_MOVE_DISTANCE = 3.0  # meters; the fast path skips the LLM, so a misheard number must not send it far
+MAX_MOVE_SECONDS = 10.0
+
+# Whole numbers said as words, possibly several: "forty five", "one hundred and eighty", "one eighty"
+_CARDINALS = "|".join(sorted((w for w, v in NUMBER_WORDS.items() if isinstance(v, int) and " " not in w
+                              and w not in ("a", "an")), key=len, reverse=True))
+_SPOKEN = r"(?:" + _CARDINALS + r")(?: (?:and )?(?:" + _CARDINALS + r"))*"
+_NUMBER = (r"(?P<{name}>\d+(?:\.\d+)?|" + _SPOKEN + "|"
+           + "|".join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r")")
+_UNIT = r"(?P<unit>" + "|".join(sorted(DISTANCE_UNITS, key=len, reverse=True)) + r")"
+
+_FILLER = re.compile(r"^(?:(?:hey |ok |okay )?robot,? |please |can you |could you |now )+|(?: please| now)+$")
+_STOP = re.compile(r"^(?:stop|halt|freeze|stay|emergency stop|stop moving|stop now|stop the robot)$")
+_MOVE = re.compile(
+    r"^(?:go |move |drive |roll )?(?P<direction>forward|forwards|ahead|straight|back|backward|backwards)"
+    r"(?: by| for)?(?: " + _NUMBER.format(name="amount") + r"(?: " + _UNIT + r"| (?P<seconds>seconds?))?)?$"
+)
+_TURN = re.compile(
+    r"^(?:turn|rotate|spin)(?: to the| to)? (?P<direction>left|right)"
+    r"(?: by)?(?: " + _NUMBER.format(name="degrees") + r"(?: degrees?)?)?$"
+)
+_TURN_AROUND = re.compile(r"^(?:turn around|about face|u turn|spin around)$")
+_SHAPE = re.compile(
+    r"^(?:(?:draw|make|do|drive|trace|move in) )?(?:(?:an?|the) )?"
+    r"(?:(?P<shape>" + "|".join(SHAPE_SIDES) + r")"
+    r"|(?:shape|polygon) with " + _NUMBER.format(name="sides") + r" sides"
+    r"|" + _NUMBER.format(name="sides_prefix") + r" sided (?:shape|polygon))"
+    r"(?: (?:of|with sides of|with side|with a side of)? ?" + _NUMBER.format(name="side") + r" " + _UNIT + r"(?: sides?)?)?"
+    r"(?: (?P<rotation>clockwise|counterclockwise|counter clockwise|anticlockwise|anti clockwise))?$"
+)
+
+
+def normalize_command(text: str) -> str:
+    """Lower-case, strip punctuation and filler words ("robot, please ...")."""
+    text = text.lower().replace("-", " ")
+    text = re.sub(r"[^a-z0-9. ]+", " ", text)
+    text = re.sub(r"\.(?!\d)", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return _FILLER.sub("", text).strip()
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    if value in NUMBER_WORDS:
+        return float(NUMBER_WORDS[value])
+    if value[0].isdigit():
+        return float(value)
+    total = 0
+    for word in value.split():
+        number = NUMBER_WORDS.get(word)
+        if number is None:  # "and"
+            continue
+        if number == 100:
+            total = (total or 1) * 100
+        elif number >= 20 and 0 < total < 10:
+            total = total * 100 + number  # "one eighty", "three sixty"
+        else:
+            total += number
+    return float(total)
+
+
+def stop_plan(notes="Stop") -> List[ActionDecision]:
+    return [ActionDecision(action="stop", notes=notes)]
+
+
+def is_stop_command(text: str) -> bool:
+    return bool(_STOP.match(normalize_command(text)))
+
+
+def _spoken_words(text: str) -> List[str]:
+    """Normalized words with spoken numbers as digits, so "robot two" matches ID "2"."""
+    words = []
+    for word in normalize_command(text).split():
+        value = NUMBER_WORDS.get(word) if word not in ("a", "an") else None
+        words.append(str(value) if isinstance(value, int) else word)
+    return words
+
+
+def split_target(text: str, robot_ids) -> Tuple[Optional[str], str]:
+    """
+    Splits an addressed command like "alpha, turn left" or "robot two stop"
+    into (robot_id, "turn left"). Only a robot named at the start counts;
+    "all robots, ..." (or "all stop") gives ALL_ROBOTS. Returns (None, text) unchanged when no
+    known robot is named.
+    """
+    words = _spoken_words(text)
+    candidates = [(rid, _spoken_words(rid)) for rid in robot_ids]
+    candidates += [(ALL_ROBOTS, target.split()) for target in _ALL_TARGETS]
+    # Longest name first: "all robots" before "all", "alpha two" before "alpha"
+    for robot_id, name in sorted(candidates, key=lambda c: len(c[1]), reverse=True):
+        if name and words[:len(name)] == name:
+            return robot_id, " ".join(words[len(name):])
+    rest = " ".join(words[1:])
+    if words[:1] == [_ALL_STOP_TARGET] and is_stop_command(rest):
+        return ALL_ROBOTS, rest
+    return None, text
+
+
+def _polygon(sides: int, side_length: float, clockwise: bool) -> List[ActionDecision]:
+    turn = "right" if clockwise else "left"
+    exterior = 360.0 / sides
+    steps = []
+    for i in range(sides):
+        steps.append(ActionDecision(action="forward", distance=side_length, notes=f"Side {i + 1} of {sides}"))
+        steps.append(ActionDecision(action=turn, angle=round(exterior, 3),
+                                    notes=f"Turn {exterior:g}° {turn}"))
+    steps.append(ActionDecision(action="stop", notes="Shape complete"))
+    return steps
+
+
+def parse_command(text: str) -> Optional[List[ActionDecision]]:
+    """Returns the plan for a known command, or None to fall back to the LLM."""
+    command = normalize_command(text)
+    if not command:
+        return None
+
+    if _STOP.match(command):
+        return stop_plan()
+
+    match = _MOVE.match(command)
+    if match:
+        action = "backward" if match["direction"].startswith("back") else "forward"
+        amount = _number(match["amount"])
+        if match["seconds"]:
+            seconds = min(amount, MAX_MOVE_SECONDS)
+            step = ActionDecision(action=action, duration=seconds, notes=f"Move {action} {seconds:g}s")
+        elif amount is not None and not match["unit"]:
+            return None  # "forward 30": meters or centimeters? Let the LLM decide
+        else:
+            meters = (amount if amount is not None else 0.5) * DISTANCE_UNITS.get(match["unit"] or "m", 1.0)
+            meters = min(meters, MAX_MOVE_DISTANCE)
+            step = ActionDecision(action=action, distance=round(meters, 3), notes=f"Move {action} {meters:g} m")
+        return [step, ActionDecision(action="stop", notes="Done")]
+
+    match = _TURN.match(command)
+    if match:
+        degrees = _number(match["degrees"])
+        if degrees is None:
+            degrees = DEFAULT_TURN_DEGREES
+        action = match["direction"]
+        return [ActionDecision(action=action, angle=degrees, notes=f"Turn {degrees:g}° {action}"),
+                ActionDecision(action="stop", notes="Done")]
+
+    if _TURN_AROUND.match(command):
+        return [ActionDecision(action="right", angle=180.0, notes="Turn around"),
+                ActionDecision(action="stop", notes="Done")]
+
+    match = _SHAPE.match(command)
+    if match:
+        if match["shape"]:
+            sides = SHAPE_SIDES[match["shape"]]
+        else:
+            sides = int(_number(match["sides"] or match["sides_prefix"]))
+        if sides < 3 or sides > 12:
+            return None
+        side = _number(match["side"])
+        side_length = side * DISTANCE_UNITS[match["unit"]] if side is not None else DEFAULT_SIDE_LENGTH
+        side_length = min(side_length, MAX_MOVE_DISTANCE)
+        clockwise = match["rotation"] is None or match["rotation"] == "clockwise"
+        return _polygon(sides, side_length, clockwise)
+
+    return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# load_test.py
+"""
+Throughput and tail latency of /submit_state and /get_command under many
+simulated robots. Each robot is a thread with its own robot ID and keep-alive
+connection doing the Pi's loop: post its distances, then ask for a plan.
+
+    python load_test.py --host http://127.0.0.1:5000 --robots 50 --duration 20
+    python load_test.py --spawn waitress --robots 100       # starts serve.py --no-audio itself
+    python load_test.py --spawn werkzeug --robots 100       # same against the dev server
+    python load_test.py --spawn waitress --sweep 1 10 50 100 200 --interval 0.2
+
+--interval is the pause between a robot's cycles (the Pi uses 0.2 s);
+0 runs every robot flat out to find the server's ceiling. The client is
+Python too: for high robot counts run it on another machine than the server
+so the two don't share cores.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+ENDPOINTS = ("/submit_state", "/get_command")
+
+
+class SimulatedRobot(threading.Thread):
+    def __init__(self, index, host, port, interval, stop_at):
+        super().__init__(name=f"robot-{index}", daemon=True)
+        self.index = index
+        self.host, self.port = host, port
+        self.interval = interval
+        self.stop_at = stop_at
+        self.robot_id = f"sim-{index}"
+        self.latencies = {path: [] for path in ENDPOINTS}
+        self.errors = 0
+        self.conn = None
+
+    def _request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, f"{path}?robot_id={self.robot_id}", body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise http.client.HTTPException(f"HTTP {response.status}")
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            self.conn.close()
+            self.conn = None  # Reconnect on the next request
+            return
+        self.latencies[path].append(time.perf_counter() - start)
+
+    def run(self):
+        # Spread the robots' phases so they don't all fire on the same tick
+        time.sleep(random.uniform(0, self.interval))
+        while time.perf_counter() < self.stop_at:
+            distances = {"front": round(random.uniform(5.0, 200.0), 1)}
+            self._request("POST", "/submit_state", json.dumps({"distances": distances}))
+            self._request("GET", "/get_command")
+            if self.interval:
+                time.sleep(self.interval)
+        if self.conn is not None:
+            self.conn.close()
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def run_load(host, port, robots, duration, interval):
+    stop_at = time.perf_counter() + duration
+    fleet = [SimulatedRobot(i, host, port, interval, stop_at) for i in range(robots)]
+    start = time.perf_counter()
+    for robot in fleet:
+        robot.start()
+    for robot in fleet:
+        robot.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for path in ENDPOINTS:
+        samples = sorted(t for robot in fleet for t in robot.latencies[path])
+        results[path] = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed,
+            "p50_ms": percentile(samples, 0.50) * 1000,
+            "p99_ms": percentile(samples, 0.99) * 1000,
+            "max_ms": samples[-1] * 1000 if samples else 0.0,
+        }
+    return results, sum(robot.errors for robot in fleet)
+
+
+def report(results, errors):
+    for path, r in results.items():
+        print(f"{path:<14} {r['requests']:7d} req | {r['rps']:8.1f} req/s | p50 {r['p50_ms']:7.2f} ms | "
+              f"p99 {r['p99_ms']:7.2f} ms | max {r['max_ms']:7.2f} ms")
+    print(f"{'errors':<14} {errors:7d}")
+
+
+def spawn_server(server, port):
+    """Starts serve.py --no-audio in a child process and waits until it answers."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    process = subprocess.Popen([sys.executable, script, "--no-audio", "--server", server,
+                                "--host", "127.0.0.1", "--port", str(port)])
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("serve.py did not come up within 60 s")
+
+
+def sweep(host, port, counts, duration, interval):
+    """Same load at growing fleet sizes: how server latency scales with N robots."""
+    print(f"{'robots':>6} | {'submit req/s':>12} {'p50 ms':>8} {'p99 ms':>8} | "
+          f"{'get req/s':>10} {'p50 ms':>8} {'p99 ms':>8} | errors")
+    for robots in counts:
+        results, errors = run_load(host, port, robots, duration, interval)
+        submit, get = results["/submit_state"], results["/get_command"]
+        print(f"{robots:6d} | {submit['rps']:12.1f} {submit['p50_ms']:8.2f} {submit['p99_ms']:8.2f} | "
+              f"{get['rps']:10.1f} {get['p50_ms']:8.2f} {get['p99_ms']:8.2f} | {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", choices=("waitress", "werkzeug"), help="start serve.py --no-audio locally")
+    parser.add_argument("--port", type=int, default=5055, help="port for --spawn")
+    parser.add_argument("--robots", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=0.0, help="pause between a robot's cycles (s)")
+    parser.add_argument("--sweep", type=int, nargs="+", metavar="N", help="run once per fleet size instead of --robots")
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        process = spawn_server(args.spawn, args.port)
+        host, port = "127.0.0.1", args.port
+    else:
+        url = urllib.parse.urlsplit(args.host)
+        host, port = url.hostname, url.port or 80
+
+    try:
+        if args.sweep:
+            print(f"⏱️ Sweeping {args.sweep} robots, {args.duration:.0f}s each, against {host}:{port} "
+                  f"({args.spawn or 'external server'}, interval {args.interval}s)")
+            sweep(host, port, args.sweep, args.duration, args.interval)
+        else:
+            print(f"⏱️ {args.robots} robots for {args.duration:.0f}s against {host}:{port} "
+                  f"({args.spawn or 'external server'}, interval {args.interval}s)")
+            results, errors = run_load(host, port, args.robots, args.duration, args.interval)
+            report(results, errors)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,121 +1,478 @@
 # main.py
-from flask import Flask, jsonify, request
-from stt import STT
+from flask import Blueprint, Flask, Response, jsonify, request, stream_with_context
 from AI import AIPlanner  # Make sure your AI.py file is named AI.py or change this
+import intents
+from async_pipeline import AsyncCommandPipeline
+from pipeline import BoundedStage
+from robots import RobotRegistry
 import threading
 import time
 from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
 import json
+import uuid
 import numpy as np
 import queue  # Import the standard queue module
+from typing import TYPE_CHECKING
 
-app = Flask(__name__)
+if TYPE_CHECKING:
+    from stt import STT  # Imported lazily in warm_start(): needs PortAudio and Whisper
+
+try:
+    import msgpack  # Optional: compact encoding for /exchange and /submit_state
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+
+# Routes live on a blueprint; create_app() builds the Flask app around it
+bp = Blueprint("robot", __name__)
 
 # --- Thread-Safe Global State ---
-# We need to store the Pi's latest state and the newest plan
-g_current_distances = {"front": 100.0}
-g_state_lock = threading.Lock()
-g_plan_queue = Queue()  # Holds complete plans for the Pi
+# Each robot's latest state and plan queue, keyed by the robot ID it sends
+g_robots = RobotRegistry()
+g_partial_transcript = {"committed": "", "tentative": "", "stop_sent": False}  # Live transcript while the user speaks
+# --------------------------------
+
+# --- Config ---
+# Publish each LLM step as soon as it is generated instead of the whole plan at the end. The Pi appends
+# the steps to one plan on the Arduino (protocol v5; older firmware runs them upload by upload), but
+# compiles each on its own, so adjacent steps aren't merged the way a whole plan's are
+STREAM_PLANS = True
+PIPELINE_MODE = "staged"  # "staged": Whisper/LLM stages, "thread": one worker_thread, "async": AsyncCommandPipeline
+AUDIO_QUEUE_SIZE = 4  # Recorded commands waiting for Whisper (each up to MAX_COMMAND_SECONDS of int16 audio)
+PLANNING_QUEUE_SIZE = 4  # Transcripts waiting for the LLM
+QUEUE_POLICY = "drop_oldest"  # What a full queue does with a new item: "drop_oldest" or "reject"
+TRANSCRIBE_WORKERS = 1  # >1 only helps if the Whisper profile's num_workers matches
+PLANNING_WORKERS = 1  # Ollama must allow parallel requests (OLLAMA_NUM_PARALLEL) for >1 to help
+MAX_LONG_POLL_SECONDS = 30.0  # Upper bound for /get_command?wait=
+SSE_KEEPALIVE_SECONDS = 15.0
 # --------------------------------
 
-# Initialize modules
-ai = AIPlanner()
+# Built by create_app(), not at import time, so importing main needs no microphone or model
+ai = None
+stt = None
+
+# Initialize a Queue for audio arrays waiting to be processed ("thread" mode)
+audio_queue = Queue(maxsize=AUDIO_QUEUE_SIZE)
+async_pipeline = None  # Set by start_voice_pipeline() when PIPELINE_MODE == "async"
+stages = None  # (transcription, planning) when PIPELINE_MODE == "staged"
+
+
+def get_current_distances(robot_id: str = None) -> dict:
+    """Latest distances of a robot (the voice target if robot_id is None or ALL_ROBOTS)."""
+    if robot_id is None or robot_id == intents.ALL_ROBOTS:
+        return g_robots.active_channel().distances()
+    return g_robots.get(robot_id).distances()
 
-# Initialize a Queue for audio arrays waiting to be processed
-audio_queue = Queue()
 
+def get_sensor_history(robot_id: str = None):
+    """A robot's SensorStore (the voice target's if robot_id is None or ALL_ROBOTS)."""
+    if robot_id is None or robot_id == intents.ALL_ROBOTS:
+        return g_robots.active_channel().history
+    return g_robots.get(robot_id).history
 
-def worker_thread(audio_queue: Queue, ai_planner: AIPlanner, stt_instance: STT):
+
+def publish_plan(plan: list, preempt: bool = False, robot_id: str = None):
     """
-    A dedicated thread that handles the heavy processing (Whisper/LLM).
+    Hands a finished plan to a robot (the voice target if robot_id is None,
+    every robot for ALL_ROBOTS). preempt=True (used for "stop") throws away
+    plans the robot hasn't fetched yet so the stop is the very next thing it gets.
     """
-    print("👷 Worker thread started, waiting for audio commands...")
-    while True:
-        # Blocks until an audio array is available
-        # --- FIX 1: Only get audio_array, not distances ---
-        audio_array = audio_queue.get()
+    if robot_id == intents.ALL_ROBOTS:
+        channels = [g_robots.get(rid) for rid in g_robots.ids()]
+    else:
+        channels = [g_robots.active_channel() if robot_id is None else g_robots.get(robot_id)]
+    for channel in channels:
+        channel.publish(plan, preempt)
+
+
+def route_command(command: str):
+    """
+    (robot_id, command) for a transcript: "alpha, turn left" goes to robot
+    alpha and makes it the target of later commands that don't name a robot.
+    Un-addressed commands go to the current target.
+    """
+    robot_id, command = intents.split_target(command, g_robots.ids())
+    if robot_id is None:
+        return g_robots.active_channel().robot_id, command
+    if robot_id != intents.ALL_ROBOTS and g_robots.active != robot_id:
+        g_robots.active = robot_id
+        print(f"🎯 Voice commands now go to robot '{robot_id}'.")
+    return robot_id, command
+
+
+def is_stop_plan(plan: list) -> bool:
+    return len(plan) == 1 and plan[0].get("action") == "stop"
+
+
+class PlanSuperseded(Exception):
+    """Raised from a streamed plan's publish callback once a newer plan preempted it."""
+
+
+def stream_plan(ai_planner: AIPlanner, transcript: str, robot_id: str) -> list:
+    """
+    Streams the plan to the robot step by step. Each step is queued as its own
+    one-step plan tagged with plan_id/seq, so the Pi starts on step 1 while
+    the LLM is still writing step 2. Plans that need no LLM (fast path, plan
+    cache, safety stop) are already complete and go out as one plan.
+    """
+    channel = g_robots.get(robot_id)
+    epoch = [channel.plan_epoch]
+    plan_id = uuid.uuid4().hex[:8]
+    seq = [0]
+
+    def publish_step(step):
+        if channel.plan_epoch != epoch[0]:
+            raise PlanSuperseded()
+        step = dict(step, plan_id=plan_id, seq=seq[0])
+        seq[0] += 1
+        # A lone stop at the start (fast path "stop" or safety override) still jumps the queue
+        channel.publish([step], preempt=seq[0] == 1 and step["action"] == "stop")
+        epoch[0] = channel.plan_epoch  # Our own preemption doesn't supersede us
+        print(f"📤 Step {step['seq']} published: {step['action']}")
+
+    def publish_whole(plan):
+        publish_plan(plan, is_stop_plan(plan), robot_id)
+
+    try:
+        return ai_planner.generate_plan_stream(transcript, channel.distances(), publish_step, channel.history,
+                                               publish_whole)
+    except PlanSuperseded:
+        print(f"⏹️ Plan {plan_id} superseded after {seq[0]} steps, abandoning the stream.")
+        return []
+
+
+def take_partial_stop() -> bool:
+    """
+    True if this utterance's "stop" already went out from the partial
+    transcript. Clears the flag for the next utterance; every pipeline mode
+    calls it once per finished transcript.
+    """
+    stop_sent = g_partial_transcript["stop_sent"]
+    g_partial_transcript["stop_sent"] = False
+    return stop_sent
+
 
-        # 1. Perform transcription (heavy task)
+def transcribe_command(item, stt_instance: "STT"):
+    """
+    Stage 1 (Whisper): (audio_array, transcript) -> (robot_id, cleaned transcript), or None to drop.
+    """
+    audio_array, transcript = item
+
+    # 1. Perform transcription (heavy task), unless the streaming transcriber already did
+    if transcript is None:
         transcript = stt_instance.model_transcribe(audio_array)
 
-        # 2. Clean the Transcribed Command Input
-        cleaned_transcript = transcript.strip().lower()
-        if cleaned_transcript.endswith('.'):
-            cleaned_transcript = cleaned_transcript[:-1]
+    # 2. Clean the Transcribed Command Input
+    cleaned_transcript = transcript.strip().lower()
+    if cleaned_transcript.endswith('.'):
+        cleaned_transcript = cleaned_transcript[:-1]
 
-        if not cleaned_transcript:
-            print("🎙️ Heard empty audio, ignoring.")
-            audio_queue.task_done()
-            continue
+    # A "stop" heard in the partial transcript has already been dispatched
+    stop_already_sent = take_partial_stop()
+    if not cleaned_transcript:
+        print("🎙️ Heard empty audio, ignoring.")
+        return None
 
-        # 3. Get the most recent sensor data from our global state
-        with g_state_lock:
-            local_distances = g_current_distances.copy()
+    robot_id, command = route_command(cleaned_transcript)
+    if intents.is_stop_command(command):
+        # Stop lane: published right here, never queued behind (or dropped with) planning work
+        if stop_already_sent:
+            print("🛑 Stop was already sent from the partial transcript.")
+        else:
+            send_stop(robot_id)
+        return None
+    return robot_id, command
 
-        print(f"\n✨ Worker Processing: '{cleaned_transcript}' with distances {local_distances}")
 
-        # 4. Perform AI planning (heavy task)
-        try:
-            plan = ai_planner.generate_plan(cleaned_transcript, local_distances)
+def send_stop(robot_id: str, notes: str = "Stop"):
+    """Publishes a stop that jumps the robot's plan queue (every robot's for ALL_ROBOTS)."""
+    distances = {} if robot_id == intents.ALL_ROBOTS else get_current_distances(robot_id)
+    publish_plan(ai.apply_safety(intents.stop_plan(notes), distances), True, robot_id)
+    print(f"🛑 Stop sent to {'all robots' if robot_id == intents.ALL_ROBOTS else robot_id}.")
 
-            # 5. Put the finished plan on the queue for the Pi to fetch
-            g_plan_queue.put(plan)
 
-            print("\n🤖 GENERATED PLAN (waiting for Pi to fetch):")
-            print(json.dumps(plan, indent=2))
+def plan_command(item, ai_planner: AIPlanner):
+    """
+    Stage 2 (LLM): (robot_id, cleaned transcript) -> plan published for that robot.
+    """
+    robot_id, cleaned_transcript = item
+    if robot_id == intents.ALL_ROBOTS:
+        # Plans depend on each robot's surroundings; only "stop" (sent by transcribe_command) is safe to broadcast
+        print(f"⚠️ Only 'stop' can go to all robots, ignoring '{cleaned_transcript}'.")
+        return
+
+    # 3. Get the most recent sensor data of the target robot
+    local_distances = get_current_distances(robot_id)
+
+    print(f"\n✨ Worker Processing: '{cleaned_transcript}' for robot '{robot_id}' with distances {local_distances}")
+
+    # 4. Perform AI planning (heavy task)
+    try:
+        if STREAM_PLANS:
+            # 5. Steps go on the robot's queue as they are generated
+            plan = stream_plan(ai_planner, cleaned_transcript, robot_id)
+        else:
+            plan = ai_planner.generate_plan(cleaned_transcript, local_distances, g_robots.get(robot_id).history)
+
+            # 5. Put the finished plan on the robot's queue ("stop" jumps the queue)
+            publish_plan(plan, is_stop_plan(plan), robot_id)
+
+        print(f"\n🤖 GENERATED PLAN (waiting for robot '{robot_id}' to fetch):")
+        print(json.dumps(plan, indent=2))
+
+    except Exception as e:
+        print(f"❌ Worker Error during plan generation: {e}")
 
-        except Exception as e:
-            print(f"❌ Worker Error during plan generation: {e}")
 
+def worker_thread(audio_queue: Queue, ai_planner: AIPlanner, stt_instance: "STT"):
+    """
+    A dedicated thread that handles the heavy processing (Whisper/LLM) in series.
+    Used when PIPELINE_MODE == "thread".
+    """
+    print("👷 Worker thread started, waiting for audio commands...")
+    while True:
+        # Blocks until an audio array is available
+        item = audio_queue.get()
+        routed = transcribe_command(item, stt_instance)
+        if routed:
+            plan_command(routed, ai_planner)
         audio_queue.task_done()
 
 
+def start_staged_pipeline(ai_planner: AIPlanner, stt_instance: "STT"):
+    """
+    PIPELINE_MODE == "staged": Whisper and the LLM run in separate stages with
+    bounded queues, so transcribing command N+1 overlaps planning command N.
+    A "stop" never enters the planning queue: transcribe_command publishes it.
+    """
+    planning = BoundedStage(
+        "planning", lambda routed: plan_command(routed, ai_planner),
+        workers=PLANNING_WORKERS, maxsize=PLANNING_QUEUE_SIZE, policy=QUEUE_POLICY
+    ).start()
+    transcription = BoundedStage(
+        "transcription", lambda item: transcribe_command(item, stt_instance),
+        workers=TRANSCRIBE_WORKERS, maxsize=AUDIO_QUEUE_SIZE, policy=QUEUE_POLICY, downstream=planning
+    ).start()
+    return transcription, planning
+
+
 # --- FIX 2: Corrected function signature ---
-def command_callback_queue(audio_array: np.ndarray):
+def command_callback_queue(audio_array: np.ndarray, transcript=None):
     """
     Lightweight callback from STT. Just puts the audio in the queue.
+    transcript is set when streaming transcription already produced it.
     """
-    # Put the heavy task data (audio) into the queue
-    audio_queue.put(audio_array)
+    if async_pipeline is not None:
+        async_pipeline.submit(audio_array, transcript)
+    elif transcript is not None and intents.is_stop_command(intents.split_target(transcript, g_robots.ids())[1]):
+        # A known stop skips the queues, so it can't wait behind (or be dropped for) other commands
+        transcribe_command((audio_array, transcript), stt)
+        return
+    elif stages is not None:
+        if not stages[0].submit((audio_array, transcript)):
+            return
+    else:
+        # Put the heavy task data (audio) into the queue; never block the audio side
+        try:
+            audio_queue.put_nowait((audio_array, transcript))
+        except queue.Full:
+            print("⛔ Audio queue full, command dropped.")
+            return
     print("📝 Command audio recorded and queued for processing.")
 
 
-# Initialize SST and pass the lightweight queuing callback function
-stt = STT(callback=command_callback_queue)
+def partial_transcript_callback(committed: str, tentative: str):
+    """
+    Called by the streaming transcriber while the user is still speaking.
+    committed text will not change any more; tentative text may.
+    """
+    g_partial_transcript["committed"] = committed
+    g_partial_transcript["tentative"] = tentative
+    print(f"💬 ...{committed} [{tentative}]")
 
+    # "stop" must not wait for the endpointer: send it as soon as it's heard
+    robot_id, heard = intents.split_target(f"{committed} {tentative}", g_robots.ids())
+    if not g_partial_transcript["stop_sent"] and intents.is_stop_command(heard):
+        g_partial_transcript["stop_sent"] = True
+        publish_plan(ai.apply_safety(intents.stop_plan("Stop (heard while speaking)"), get_current_distances(robot_id)),
+                     True, robot_id)
+        print(f"🛑 Stop dispatched from partial transcript to {robot_id or g_robots.active_channel().robot_id}.")
 
-@app.route("/")
+
+def warm_start():
+    """
+    Loads the Ollama model while STT loads Whisper and Porcupine, so the
+    slowest component sets the startup time instead of the sum of them.
+    """
+    from stt import STT
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        ollama_future = pool.submit(ai.warm_up)
+        # Initialize SST and pass the lightweight queuing callback function
+        stt_instance = STT(callback=command_callback_queue, partial_callback=partial_transcript_callback)
+        timings = dict(stt_instance.startup_timings)
+        try:
+            timings["ollama_warm_up"] = ollama_future.result()
+        except Exception as e:
+            print(f"⚠️ Ollama warm-up failed (first command will be slower): {e}")
+
+    print("⏱️ Startup timings:")
+    for name, seconds in timings.items():
+        print(f"   {name:<18} {seconds:6.2f}s")
+    print(f"   {'total (parallel)':<18} {time.perf_counter() - start:6.2f}s")
+    return stt_instance
+
+
+def start_voice_pipeline(stt_instance: "STT", ai_planner: AIPlanner):
+    """Starts the Whisper/LLM worker(s) for PIPELINE_MODE and the STT listening loop."""
+    global async_pipeline, stages
+    # 1. Start the dedicated worker thread for heavy tasks (or the async pipeline)
+    if PIPELINE_MODE == "async":
+        async_pipeline = AsyncCommandPipeline(stt_instance, ai_planner, get_current_distances, publish_plan,
+                                              route=route_command, get_history=get_sensor_history,
+                                              take_partial_stop=take_partial_stop)
+        async_pipeline.start()
+    elif PIPELINE_MODE == "staged":
+        stages = start_staged_pipeline(ai_planner, stt_instance)
+    else:
+        worker = threading.Thread(target=worker_thread, args=(audio_queue, ai_planner, stt_instance), daemon=True)
+        worker.start()
+
+    # 2. Start the SST continuous listening loop in a separate thread
+    stt_thread = threading.Thread(target=stt_instance.start_listening, daemon=True)
+    stt_thread.start()
+    print("🚀 SST Listening and Worker threads started...")
+
+
+def create_app(with_audio: bool = True, planner: AIPlanner = None) -> Flask:
+    """
+    Application factory. with_audio=False serves every endpoint without
+    opening the microphone or loading Whisper/Porcupine (load tests, a
+    server without audio hardware). Call it once per process: the plan
+    queue and robot state are process-wide, so run one worker process and
+    scale with threads.
+    """
+    global ai, stt
+    ai = planner if planner is not None else AIPlanner()
+    if with_audio:
+        stt = warm_start()
+        start_voice_pipeline(stt, ai)
+    else:
+        print("🔇 Audio disabled: serving the robot endpoints only.")
+
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app
+
+
+def read_payload() -> dict:
+    """Request body as a dict, JSON or (if installed) msgpack."""
+    if request.mimetype == MSGPACK_MIMETYPE:
+        if msgpack is None:
+            raise RuntimeError("msgpack body received but the msgpack package is not installed")
+        return msgpack.unpackb(request.get_data())
+    return request.get_json(force=True)
+
+
+def request_robot(data: dict = None):
+    """
+    The calling robot's channel. The ID comes from ?robot_id=, the X-Robot-Id
+    header or a "robot_id" body field; robots that send none share "default".
+    """
+    robot_id = (request.args.get("robot_id") or request.headers.get("X-Robot-Id")
+                or (data or {}).get("robot_id"))
+    return g_robots.get(robot_id)
+
+
+def respond(obj):
+    """Answers in msgpack if the client asked for it, JSON otherwise."""
+    if msgpack is not None and request.accept_mimetypes.best == MSGPACK_MIMETYPE:
+        return Response(msgpack.packb(obj), mimetype=MSGPACK_MIMETYPE)
+    return jsonify(obj)
+
+
+@bp.route("/")
 def index():
+    if stt is None:
+        return "🤖 Autonomous Robot MCP running (audio disabled)"
     return "🤖 Autonomous Robot MCP running (Voice command worker active)"
 
 
+@bp.route("/audio_stats", methods=["GET"])
+def audio_stats():
+    """Capture-path counters: SPSC queue depth, dropped frames, callback duration."""
+    if stt is None:
+        return jsonify({"enabled": False})
+    stats = stt.capture_stats()
+    stats["buffer"] = stt.audio_buffer.stats()
+    return jsonify(stats)
+
+
+@bp.route("/partial_transcript", methods=["GET"])
+def partial_transcript():
+    """What the streaming transcriber has heard so far for the current command."""
+    return jsonify(g_partial_transcript)
+
+
+@bp.route("/pipeline_stats", methods=["GET"])
+def pipeline_stats():
+    if stages is not None:
+        return jsonify({"mode": PIPELINE_MODE, "transcription": stages[0].stats(), "planning": stages[1].stats()})
+    if async_pipeline is None:
+        return jsonify({"mode": PIPELINE_MODE, "audio_queue_depth": audio_queue.qsize()})
+    return jsonify(dict(async_pipeline.stats, mode=PIPELINE_MODE))
+
+
+@bp.route("/llm_stats", methods=["GET"])
+def llm_stats():
+    """Ollama prompt-eval vs eval timings (last request and running totals)."""
+    return jsonify({"last": ai.last_timings, "totals": ai.timing_totals})
+
+
+@bp.route("/plan_cache", methods=["GET"])
+def plan_cache_stats():
+    """Hit/miss counters of the planner's plan cache."""
+    if ai.plan_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(ai.plan_cache.stats())
+
+
+@bp.route("/plan_cache/invalidate", methods=["POST"])
+def plan_cache_invalidate():
+    ai.invalidate_plan_cache()
+    return jsonify({"status": "invalidated"})
+
+
 # --- NEW ENDPOINT 1 ---
-@app.route("/submit_state", methods=["POST"])
+@bp.route("/submit_state", methods=["POST"])
 def submit_state():
     """
     Called by the Raspberry Pi very frequently to report its sensor data.
     """
     try:
-        data = request.get_json(force=True)
-        with g_state_lock:
-            global g_current_distances
-            g_current_distances = data.get("distances", {"front": 100.0})
-        # print(f"State update: {g_current_distances}") # Uncomment for debugging
-        return jsonify({"status": "received"})
+        data = read_payload()
+        request_robot(data).update_state(data.get("distances", {"front": 100.0}))
+        return respond({"status": "received"})
     except Exception as e:
         print(f"❌ Error in /submit_state: {e}")
         return jsonify({"error": str(e)}), 500
 
 
 # --- NEW ENDPOINT 2 ---
-@app.route("/get_command", methods=["GET"])
+@bp.route("/get_command", methods=["GET"])
 def get_command():
     """
     Called by the Raspberry Pi in its loop, asking "any new plans for me?"
+    With ?wait=<seconds> it long-polls: the request is held open until a plan
+    is queued (and answered within milliseconds of that) or the wait runs out.
     """
     try:
-        # Try to get a plan from the queue without blocking
-        plan = g_plan_queue.get_nowait()
+        wait = min(max(request.args.get("wait", default=0.0, type=float), 0.0), MAX_LONG_POLL_SECONDS)
+        # Blocks up to wait seconds on this robot's queue only (no wait: just a peek)
+        plan = request_robot().next_plan(wait)
         return jsonify(plan)
     except queue.Empty:
         # This is normal. It just means no new voice command has been processed.
@@ -125,19 +482,91 @@ def get_command():
         return jsonify({"error": str(e)}), 500
 
 
+@bp.route("/exchange", methods=["POST"])
+def exchange():
+    """
+    One round trip per Pi cycle: stores the posted sensor state and returns
+    {"plan": [...]} with the next pending plan ([] if none). ?wait=<seconds>
+    long-polls for a plan like /get_command. JSON or msgpack both ways.
+    """
+    try:
+        data = read_payload()
+        robot = request_robot(data)
+        robot.update_state(data.get("distances", {"front": 100.0}))
+
+        wait = min(max(request.args.get("wait", default=0.0, type=float), 0.0), MAX_LONG_POLL_SECONDS)
+        try:
+            plan = robot.next_plan(wait)
+        except queue.Empty:
+            plan = []
+        return respond({"plan": plan})
+    except Exception as e:
+        print(f"❌ Error in /exchange: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/plans/stream", methods=["GET"])
+def plans_stream():
+    """
+    Server-Sent Events: one "data:" event per plan as soon as it is queued,
+    plus a comment line every SSE_KEEPALIVE_SECONDS so proxies keep the
+    connection open. Plans taken here are not returned by /get_command.
+    """
+    robot = request_robot()
+
+    def events():
+        yield ": connected\n\n"
+        while True:
+            try:
+                plan = robot.next_plan(SSE_KEEPALIVE_SECONDS)
+                yield f"data: {json.dumps(plan)}\n\n"
+            except queue.Empty:
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@bp.route("/state/history", methods=["GET"])
+def state_history():
+    """
+    Debug view of a robot's sensor history: per-sensor summary over
+    ?seconds= (default: everything kept) and, with ?raw=1, the readings.
+    """
+    robot = request_robot()
+    seconds = request.args.get("seconds", type=float)
+    result = {"robot_id": robot.robot_id, "smoothed": robot.distances(), "sensors": robot.history.summary(seconds)}
+    if request.args.get("raw", type=int):
+        result["readings"] = {}
+        for sensor in result["sensors"]:
+            times, values = robot.history.get(sensor).window(seconds)
+            result["readings"][sensor] = {"t": times.round(3).tolist(), "value": values.tolist()}
+    return jsonify(result)
+
+
+@bp.route("/robots", methods=["GET"])
+def robots():
+    """Connected robots: last state, when they were last seen, queued plans; plus the voice target."""
+    return jsonify(g_robots.stats())
+
+
+@bp.route("/robots/active", methods=["POST"])
+def set_active_robot():
+    """Sets which robot un-addressed voice commands go to: {"robot_id": "alpha"}."""
+    robot_id = (request.get_json(force=True) or {}).get("robot_id")
+    if not robot_id:
+        return jsonify({"error": "robot_id is required"}), 400
+    g_robots.active = g_robots.get(robot_id).robot_id
+    return jsonify({"active": g_robots.active})
+
+
 # --- OLD /decide ENDPOINT IS REMOVED ---
 
 
 if __name__ == "__main__":
-    # 1. Start the dedicated worker thread for heavy tasks
-    worker = threading.Thread(target=worker_thread, args=(audio_queue, ai, stt), daemon=True)
-    worker.start()
-
-    # 2. Start the SST continuous listening loop in a separate thread
-    stt_thread = threading.Thread(target=stt.start_listening, daemon=True)
-    stt_thread.start()
-    print("🚀 SST Listening and Worker threads started...")
+    app = create_app()
 
-    # 3. Start the Flask server in the main thread
+    # Development server; serve.py runs the same app under a production WSGI server
     print("🌐 Flask server starting...")
-    app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
\ No newline at end of file
+    # threaded=True: long-poll and SSE requests each hold a thread while they wait
+    app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False, threaded=True)
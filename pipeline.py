@@ -0,0 +1,116 @@
+# pipeline.py
+import collections
+import queue
+import threading
+import time
+
+
+class BoundedStage:
+    """
+    One stage of the command pipeline: a bounded queue drained by N worker threads.
+
+    handler(item) does the work; a non-None result is submitted to the
+    downstream stage. When the queue is full, policy decides what happens:
+    "drop_oldest" discards the oldest waiting item to make room (fresh
+    commands matter more than stale ones), "reject" refuses the new item.
+    """
+
+    POLICIES = ("drop_oldest", "reject")
+
+    def __init__(self, name, handler, workers=1, maxsize=4, policy="drop_oldest", downstream=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}' (choose from {self.POLICIES})")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.policy = policy
+        self.downstream = downstream
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._put_lock = threading.Lock()  # drop-oldest is get+put; keep producers from interleaving
+        self._stats_lock = threading.Lock()
+
+        self.submitted = self.processed = self.dropped = self.rejected = self.errors = 0
+        self.max_depth = 0
+        self._wait_times = collections.deque(maxlen=200)  # Seconds spent queued
+        self._run_times = collections.deque(maxlen=200)  # Seconds in handler
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True).start()
+        print(f"👷 Stage '{self.name}' started with {self.workers} worker(s), "
+              f"queue size {self.queue.maxsize}, policy {self.policy}.")
+        return self
+
+    def submit(self, item) -> bool:
+        """Non-blocking. Returns False if the item was rejected."""
+        entry = (time.perf_counter(), item)
+        with self._put_lock:
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                if self.policy == "reject":
+                    with self._stats_lock:
+                        self.rejected += 1
+                    print(f"⛔ Stage '{self.name}' full, rejecting new item.")
+                    return False
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    with self._stats_lock:
+                        self.dropped += 1
+                    print(f"🗑️ Stage '{self.name}' full, dropped the oldest item.")
+                except queue.Empty:
+                    pass
+                self.queue.put_nowait(entry)
+            with self._stats_lock:
+                self.submitted += 1
+                self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _worker(self):
+        while True:
+            enqueued_at, item = self.queue.get()
+            started = time.perf_counter()
+            try:
+                result = self.handler(item)
+                if result is not None and self.downstream is not None:
+                    self.downstream.submit(result)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                print(f"❌ Stage '{self.name}' error: {e}")
+            finally:
+                finished = time.perf_counter()
+                with self._stats_lock:
+                    self.processed += 1
+                    self._wait_times.append(started - enqueued_at)
+                    self._run_times.append(finished - started)
+                self.queue.task_done()
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(samples)
+        return {
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "policy": self.policy,
+                "depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+                "capacity": self.queue.maxsize,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "queue_wait": self._summary(self._wait_times),
+                "latency": self._summary(self._run_times),
+            }
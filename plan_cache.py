@@ -0,0 +1,120 @@
+# plan_cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PlanCache:
+    """
+    LRU + TTL cache of LLM plans, keyed on the normalized command and a coarse
+    bucket of the sensor distances.
+
+    Plans are stored BEFORE the safety layer, so the caller must still run
+    the safety layer with the current distances on every hit.
+
+    The fingerprint identifies the model/prompt that produced the plans; when
+    it changes (invalidate(new_fingerprint)) every entry is dropped. With a
+    path, entries survive restarts as long as the fingerprint still matches.
+    """
+
+    def __init__(self, capacity=128, ttl=3600.0, bucket_size=25.0, path=None, fingerprint=""):
+        self.capacity = capacity
+        self.ttl = ttl  # Seconds; None = never expire
+        self.bucket_size = bucket_size  # Same unit as the distances the Pi sends (cm)
+        self.path = path
+        self.fingerprint = fingerprint
+        self._entries = OrderedDict()  # key -> (created_at, steps as dicts)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        if path:
+            self._load()
+
+    def make_key(self, command: str, distances: dict) -> str:
+        buckets = ",".join(f"{name}:{int(value // self.bucket_size)}"
+                           for name, value in sorted(distances.items()) if isinstance(value, (int, float)))
+        return f"{command}|{buckets}"
+
+    def get(self, command: str, distances: dict):
+        """Cached steps (list of dicts) or None."""
+        key = self.make_key(command, distances)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(step) for step in entry[1]]
+
+    def put(self, command: str, distances: dict, steps: list):
+        key = self.make_key(command, distances)
+        with self._lock:
+            self._entries[key] = (time.time(), [dict(step) for step in steps])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.path:
+                self._save()
+
+    def invalidate(self, fingerprint=None):
+        """Drops every entry. Pass the new fingerprint when the model or prompt changed."""
+        with self._lock:
+            self._entries.clear()
+            if fingerprint is not None:
+                self.fingerprint = fingerprint
+            if self.path:
+                self._save()
+        print("🧹 Plan cache invalidated.")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read plan cache '{self.path}': {e}")
+            return
+        if data.get("fingerprint") != self.fingerprint:
+            print("🧹 Plan cache on disk was built by a different model/prompt, ignoring it.")
+            return
+        now = time.time()
+        for key, created_at, steps in data.get("entries", []):
+            if self.ttl is None or now - created_at <= self.ttl:
+                self._entries[key] = (created_at, steps)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        print(f"📦 Loaded {len(self._entries)} cached plans from '{self.path}'.")
+
+    def _save(self):
+        """Atomic write (caller holds the lock)."""
+        data = {
+            "fingerprint": self.fingerprint,
+            "entries": [[key, created_at, steps] for key, (created_at, steps) in self._entries.items()],
+        }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Could not write plan cache '{self.path}': {e}")
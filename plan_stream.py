@@ -0,0 +1,67 @@
+# plan_stream.py
+import json
+
+
+class PlanStreamParser:
+    """
+    Incremental parser for a streamed {"plan": [ {...}, {...}, ... ]} response.
+
+    feed() takes the next chunk of LLM output and returns every step object
+    that closed inside the "plan" array since the last call, already decoded.
+    Only brace/bracket depth and string state are tracked, so each character
+    is looked at once no matter how the text is chunked.
+    """
+
+    def __init__(self, array_key="plan"):
+        self.array_key = array_key
+        self._buffer = []  # Characters of the step object being collected
+        self._stack = []  # Open '{' / '['
+        self._in_string = False
+        self._escape = False
+        self._string_chars = []  # Current string at top-level object depth (candidate key)
+        self._last_key = None
+        self._plan_depth = None  # len(stack) inside the plan array
+        self.skipped = 0  # Step objects that were not valid JSON
+
+    def feed(self, text: str) -> list:
+        steps = []
+        for ch in text:
+            collecting = self._plan_depth is not None and len(self._stack) > self._plan_depth
+            if collecting:
+                self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = "".join(self._string_chars)
+                elif len(self._stack) == 1:
+                    self._string_chars.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_chars = []
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1 and self._last_key == self.array_key:
+                    self._plan_depth = 2
+                self._stack.append(ch)
+                if self._plan_depth is not None and len(self._stack) == self._plan_depth + 1 and ch == "{":
+                    self._buffer = ["{"]
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._plan_depth is not None:
+                    if len(self._stack) == self._plan_depth and ch == "}":
+                        try:
+                            steps.append(json.loads("".join(self._buffer)))
+                        except json.JSONDecodeError:
+                            self.skipped += 1
+                        self._buffer = []
+                    elif len(self._stack) < self._plan_depth:
+                        self._plan_depth = None  # The plan array closed
+        return steps
@@ -0,0 +1,34 @@
+# plan_types.py
+"""Plan step models shared by the LLM planner (AI.py) and the fast-path parser (intents.py)."""
+from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
+
+
+class ActionDecision(BaseModel):
+    """Defines a single robot movement step."""
+    action: Literal['forward', 'backward', 'left', 'right', 'stop'] = Field(
+        description="The movement command. Use 'left' or 'right' for turns."
+    )
+    duration: Optional[float] = Field(
+        default=None,
+        description="Duration in seconds. Use for turns or time-based movements."
+    )
+    distance: Optional[float] = Field(
+        default=None,
+        description="Distance in meters for forward/backward motions."
+    )
+    angle: Optional[float] = Field(
+        default=None,
+        description="Angle in degrees for left/right turns."
+    )
+    notes: Optional[str] = Field(
+        default=None,
+        description="Brief description of the action."
+    )
+
+
+class ActionPlan(BaseModel):
+    """Top-level structure containing the plan list."""
+    plan: List[ActionDecision] = Field(
+        description="A sequence of robot actions. The final action MUST be 'stop'."
+    )
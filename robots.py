@@ -0,0 +1,112 @@
+# robots.py
+import queue
+import threading
+import time
+from sensor_history import SensorStore
+
+DEFAULT_ROBOT_ID = "default"  # Robots that don't send an ID (the original single-robot client)
+STATE_HISTORY_SIZE = 256  # Readings kept per sensor (~50 s at the Pi's 5 Hz upload rate)
+SMOOTHING_SECONDS = 0.6  # distances() is the median over this window instead of the last noisy sample
+
+
+class RobotChannel:
+    """
+    Server-side state of one robot: its latest distances and its plan queue.
+
+    State posts swap in a fresh dict (a single reference assignment, atomic
+    under the GIL), so readers never take a lock and never see a half-written
+    update. Every reading is also kept in a bounded per-sensor history. The
+    lock only serialises plan publishing, where a preempting plan drains the
+    queue and bumps the epoch in one step.
+    """
+
+    def __init__(self, robot_id):
+        self.robot_id = robot_id
+        self._distances = {"front": 100.0}
+        self.history = SensorStore(STATE_HISTORY_SIZE)
+        self.plan_queue = queue.Queue()
+        self.plan_epoch = 0  # Bumped by every preempting plan; older streamed plans stop publishing
+        self.last_seen = 0.0
+        self.state_updates = 0
+        self.plans_published = 0
+        self._publish_lock = threading.Lock()
+
+    def update_state(self, distances):
+        self._distances = dict(distances)
+        self.last_seen = time.time()
+        self.history.record(self._distances, self.last_seen)
+        self.state_updates += 1
+
+    def distances(self) -> dict:
+        """Median of each sensor over SMOOTHING_SECONDS (the last reading for sensors without history)."""
+        return dict(self._distances, **self.history.smoothed(SMOOTHING_SECONDS))
+
+    def publish(self, plan, preempt=False):
+        """Queues a plan; its steps are stamped with published_at (epoch seconds) for latency reports."""
+        published_at = round(time.time(), 3)
+        plan = [dict(step, published_at=published_at) for step in plan]
+        with self._publish_lock:
+            if preempt:
+                self.plan_epoch += 1
+                while True:
+                    try:
+                        self.plan_queue.get_nowait()
+                    except queue.Empty:
+                        break
+            self.plan_queue.put(plan)
+            self.plans_published += 1
+
+    def next_plan(self, wait=0.0):
+        """Next queued plan, long-polling up to wait seconds. Raises queue.Empty."""
+        if wait > 0:
+            return self.plan_queue.get(timeout=wait)
+        return self.plan_queue.get_nowait()
+
+    def stats(self):
+        return {
+            "distances": self._distances,
+            "last_seen_s_ago": round(time.time() - self.last_seen, 2) if self.last_seen else None,
+            "state_updates": self.state_updates,
+            "plans_published": self.plans_published,
+            "queued_plans": self.plan_queue.qsize(),
+        }
+
+
+class RobotRegistry:
+    """
+    All connected robots by ID, plus which one un-addressed voice commands go to.
+
+    Lookups of known robots are a plain dict read; the lock is only taken the
+    first time a robot ID is seen.
+    """
+
+    def __init__(self):
+        self._robots = {}
+        self._lock = threading.Lock()
+        self.active = DEFAULT_ROBOT_ID  # Target of voice commands that don't name a robot
+
+    def get(self, robot_id=None) -> RobotChannel:
+        robot_id = robot_id or DEFAULT_ROBOT_ID
+        channel = self._robots.get(robot_id)
+        if channel is None:
+            with self._lock:
+                channel = self._robots.get(robot_id)
+                if channel is None:
+                    channel = self._robots[robot_id] = RobotChannel(robot_id)
+                    print(f"🤝 Robot '{robot_id}' connected.")
+        return channel
+
+    def ids(self) -> list:
+        return list(self._robots)
+
+    def active_channel(self) -> RobotChannel:
+        """The voice target; with a single connected robot that robot, whatever its ID."""
+        if self.active not in self._robots and len(self._robots) == 1:
+            return next(iter(self._robots.values()))
+        return self.get(self.active)
+
+    def stats(self):
+        return {
+            "active": self.active_channel().robot_id,
+            "robots": {robot_id: channel.stats() for robot_id, channel in list(self._robots.items())},
+        }
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Per-cycle network time and Pi CPU cost of the state/plan exchange.
+
+  before:   requests.post(/submit_state) + requests.get(/get_command), new TCP connection each
+  session:  RobotClient.exchange() over a keep-alive session, JSON
+  msgpack:  RobotClient.exchange() over a keep-alive session, msgpack (if installed)
+
+Run it on the Pi against the real server while no voice commands are being given:
+
+    python3 bench_client.py --host http://172.24.154.33:5000 --cycles 500
+"""
+import argparse
+import time
+import requests
+from robot_client import RobotClient, msgpack
+
+
+def legacy_cycle(host, distances):
+    requests.post(f"{host}/submit_state", json={"distances": distances}, timeout=1.0)
+    requests.get(f"{host}/get_command", timeout=1.0).json()
+
+
+def run(name, cycle, cycles):
+    cycle()  # Warm-up (DNS, first connection)
+    times = []
+    cpu_start = time.process_time()
+    for _ in range(cycles):
+        start = time.perf_counter()
+        cycle()
+        times.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+    times.sort()
+    avg = sum(times) / len(times)
+    print(f"{name:<8} avg {avg * 1000:7.2f} ms | p50 {times[len(times) // 2] * 1000:7.2f} ms | "
+          f"p95 {times[int(len(times) * 0.95)] * 1000:7.2f} ms | "
+          f"CPU {cpu / cycles * 1000:6.2f} ms/cycle ({cpu / sum(times) * 100:4.1f}% of one core)")
+    return avg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="http://172.24.154.33:5000")
+    parser.add_argument("--cycles", type=int, default=300)
+    args = parser.parse_args()
+
+    distances = {"front": 87.0}
+    print(f"⏱️ {args.cycles} cycles against {args.host}")
+    before = run("before", lambda: legacy_cycle(args.host, distances), args.cycles)
+
+    client = RobotClient(args.host)
+    after = run("session", lambda: client.exchange(distances), args.cycles)
+
+    if msgpack is not None:
+        packed = RobotClient(args.host, encoding="msgpack")
+        run("msgpack", lambda: packed.exchange(distances), args.cycles)
+    else:
+        print("msgpack  skipped (pip install msgpack)")
+
+    print(f"🚀 Session exchange is {before / after:.1f}x faster per cycle than the old two-request loop")
+
+
+if __name__ == "__main__":
+    main()
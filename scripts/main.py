@@ -1,50 +1,49 @@
 #!/usr/bin/env python3
 import serial
 import time
-import requests
+import threading
+import queue
+from collections import deque
 from motor_controller import MotorController
+from robot_client import RobotClient
+from plan_compiler import STOP_COMMAND, compile_plan, estimate_seconds
 
 # --- CHANGE 1: Define the host, not the full URL ---
 API_HOST = "http://172.24.154.33:5000"
+LONG_POLL_SECONDS = 20.0  # How long the server may hold a /get_command request open
+LOOP_INTERVAL = 0.2  # State upload period; a queued plan wakes the loop immediately
+SENSOR_INTERVAL = 0.05  # Distance read period (cheap with streaming: no serial round trip)
+REPORT_INTERVAL = 30.0  # Seconds between jitter/latency reports
+DELIVERY_MODE = "exchange"  # "exchange": one /exchange round trip per cycle, "long_poll": /submit_state + PlanListener
+ENCODING = "json"  # "json" or "msgpack" (needs the msgpack package on both sides)
+SERIAL_PROTOCOL = "auto"  # "binary" frames, "text" lines, or "auto" (binary if the firmware answers HELLO)
+DISTANCE_STREAM_MS = 50  # Arduino pushes a distance this often (binary protocol); 0 asks for each one instead
+DISTANCE_SAMPLES = 5  # Pings in the Arduino's median filter for streamed distances
+PLAN_UPLOAD = True  # Send whole plans to the Arduino's buffer (binary protocol); False queues them step by step
+ROBOT_ID = "default"  # Unique per robot when several share one server; also the name voice commands address it by
 
-def send_ai_command_to_arduino(mc, decision):
+def dispatch_plan(mc, action_sequence):
     """
-    Convert AI JSON decision into Arduino command string and send it.
-    (This function is unchanged)
-    """
-    action = decision.get("action", "stop")
-    duration_sec = decision.get("duration")
-    if duration_sec is None or duration_sec <= 0:
-        duration_sec = 1  # default 1 second
-    speed = decision.get("speed")
-    if speed is None:
-        speed = 180  # default speed
-
-    duration_ms = int(duration_sec * 1000) if action != "stop" else 1000
-    speed = 0 if action == "stop" else speed
-
-    command_str = f"{action},{duration_ms},{speed}"
-    print(f"Sending to Arduino: {command_str}")
-    mc.send_action(command_str)
-
-def execute_action_sequence(mc, action_sequence):
-    """
-    Execute a sequence of actions from the AI.
-    (This function is unchanged)
+    Compile a plan and send it to the Arduino without waiting for it to run.
+    Returns a function that blocks until it has run (False if cut short).
+
+    The whole plan goes to the Arduino's plan buffer in one upload and runs
+    there back-to-back. A plan that compiles to just a stop (e.g. the
+    server's safety override) takes the preempting per-step path. Links
+    without plan upload queue the steps one by one behind whatever is
+    running, the MotorController keeping the next one on the wire.
     """
-    if not action_sequence:
-        print("No actions to execute")
-        return
-    
-    print(f"Executing {len(action_sequence)} actions:")
-    for i, action in enumerate(action_sequence):
-        print(f"  {i+1}. {action}")
-    
-    # Execute each action in sequence
-    for i, action in enumerate(action_sequence):
-        print(f"\n--- Executing action {i+1}/{len(action_sequence)}: {action['action']} ---")
-        send_ai_command_to_arduino(mc, action)
-        time.sleep(0.2)  # Small delay between actions
+    commands = compile_plan(action_sequence)
+    if commands == [STOP_COMMAND]:
+        seq = mc.stop()
+        return lambda: mc.wait_for(seq)
+    print(f"Compiled to {len(commands)} steps, ~{estimate_seconds(commands):.1f} s")
+    plan_id = mc.upload_plan(commands) if PLAN_UPLOAD else None
+    if plan_id is not None:
+        return lambda: mc.wait_plan(plan_id) == "done"
+
+    seqs = [mc.submit_action(command) for command in commands]
+    return lambda: mc.wait_for(seqs[-1]) if seqs else True
 
 def check_the_arduino():
     """
@@ -55,7 +54,7 @@ def check_the_arduino():
     for port in ports:
         try:
             print(f"Trying {port}...")
-            mc = MotorController(port=port)
+            mc = MotorController(port=port, protocol_name=SERIAL_PROTOCOL)
             print(f"Connected to Arduino on {port}")
             return mc
         except Exception:
@@ -65,63 +64,310 @@ def check_the_arduino():
 
 # --- CHANGE 2: Old send_to_ai function is removed ---
 
-# --- CHANGE 3: New function to submit state ---
-def submit_state_to_server(distance_cm):
-    """Send sensor data to the server."""
-    payload = {"distances": {"front": distance_cm}}
-    try:
-        requests.post(f"{API_HOST}/submit_state", json=payload, timeout=1.0)
-    except Exception as e:
-        print(f"Failed to submit state: {e}")
+class PlanListener:
+    """
+    Background thread that long-polls /get_command?wait=... so a plan reaches
+    the Pi a few ms after the server queues it, instead of on the next 200 ms
+    poll. Received plans are handed to the main loop through a local queue.
+    """
 
-# --- CHANGE 4: New function to fetch a plan ---
-def fetch_plan_from_server():
-    """Ask the server if there is a new command plan."""
-    try:
-        response = requests.get(f"{API_HOST}/get_command", timeout=1.0)
-        if response.status_code == 200:
-            action_sequence = response.json()
-            if action_sequence:  # Will be [] if no new plan
-                return action_sequence
-    except Exception as e:
-        print(f"Failed to get command: {e}")
-    return None  # No new plan
-
-# --- CHANGE 5: Updated main loop ---
-def loop(mc):
-    while True:
+    def __init__(self, wait=LONG_POLL_SECONDS):
+        self.wait = wait
+        self.plans = queue.Queue()
+        self.running = True
+        self.client = RobotClient(API_HOST, timeout=5.0, robot_id=ROBOT_ID)  # Own session: Sessions aren't shared across threads
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        while self.running:
+            try:
+                action_sequence = self.client.get_command(wait=self.wait)
+                if action_sequence:  # None means the wait ran out
+                    self.plans.put(action_sequence)
+            except Exception as e:
+                print(f"Failed to get command: {e}")
+                time.sleep(1.0)  # Server down: don't spin
+
+    def next_plan(self, timeout):
+        """Blocks up to timeout for the next plan; None if there isn't one."""
         try:
-            # 1️⃣ Request distance from Arduino
-            distance = mc.get_distance()
-            
-            if distance is None:
-                print("Failed to get valid distance.")
-                time.sleep(0.5)
+            return self.plans.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LoopTimer:
+    """
+    Fixed-rate pacing for a periodic thread: cycles are due every interval
+    from the start, so slow cycles don't make the schedule drift. Records
+    how late each cycle starts (the loop's jitter).
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.due = time.perf_counter()
+        self.lateness = deque(maxlen=1000)  # Seconds, newest cycles
+
+    def remaining(self):
+        """Seconds until the next cycle is due."""
+        return max(0.0, self.due + self.interval - time.perf_counter())
+
+    def wait(self):
+        self.due += self.interval
+        now = time.perf_counter()
+        if now < self.due:
+            time.sleep(self.due - now)
+            now = time.perf_counter()
+        self.lateness.append(now - self.due)
+        if now - self.due > self.interval:
+            self.due = now  # A whole cycle behind (e.g. a slow request): restart rather than burst to catch up
+
+    def stats(self):
+        return percentiles_ms(self.lateness)
+
+
+def percentiles_ms(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {"p50_ms": round(values[len(values) // 2] * 1000, 1),
+            "p99_ms": round(values[int(len(values) * 0.99)] * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1)}
+
+
+# --- CHANGE 5: Concurrent agent instead of one blocking loop ---
+class RobotAgent:
+    """
+    The Pi agent as concurrent threads, so a running plan never holds up
+    telemetry and the server always plans with current distances:
+
+      sensor  reads the distance every SENSOR_INTERVAL into `distance`
+      uplink  uploads the newest distance every LOOP_INTERVAL ("exchange"
+              mode also gets plans back on the same round trip)
+      fetch   PlanListener long-polls for plans ("long_poll" mode)
+      motion  compiles and dispatches plans, one after another
+
+    Threads share latest values by plain attribute assignment (a reference
+    swap, atomic under the GIL), so readers never wait on a writer. A newly
+    fetched plan preempts the running one; streamed chunks of the same
+    plan_id are appended to it on the Arduino instead.
+    """
+
+    def __init__(self, mc):
+        self.mc = mc
+        self.running = False
+        self.distance = None  # (cm, time.time()) of the newest reading
+        self.plans = queue.Queue()  # (plan, generation, received_at) for the motion thread
+        self.generation = 0  # Bumped by every preempting plan; older queued plans are skipped
+        self.current_plan_id = None  # plan_id of the streamed plan being run
+        self.dropped_plan_id = None  # plan_id of a streamed plan an emergency stop ended; its later chunks are dropped
+        self._dispatch_lock = threading.Lock()  # A preemption lands either before or after a dispatch
+        self._plan_lock = threading.Lock()  # generation/plan_id/queue swaps; never held over serial I/O
+        self._latency_mark = None  # (received_at, published_at) until the new plan's first move starts
+        self._dispatched_generation = None
+        self._onboard_plan = None  # MotorController plan id the streamed plan's chunks are appended to
+        self.sensor_timer = self.uplink_timer = None  # Created by start(), where their schedules begin
+        self.command_latency = deque(maxlen=100)  # Plan received -> first move started, seconds
+        self.end_to_end_latency = deque(maxlen=100)  # Plan published on the server -> first move started
+        self.client = RobotClient(API_HOST, encoding=ENCODING, robot_id=ROBOT_ID)
+        self.listener = None
+        mc.listeners.append(self._on_serial_event)
+
+    def start(self):
+        self.running = True
+        self.sensor_timer = LoopTimer(SENSOR_INTERVAL)
+        self.uplink_timer = LoopTimer(LOOP_INTERVAL)
+        if DISTANCE_STREAM_MS and self.mc.stream_distance(DISTANCE_STREAM_MS, DISTANCE_SAMPLES):
+            print(f"📡 Distance streaming every {DISTANCE_STREAM_MS} ms (median of {DISTANCE_SAMPLES})")
+        if DELIVERY_MODE == "long_poll":
+            self.listener = PlanListener().start()
+            threading.Thread(target=self._fetch_loop, name="fetch", daemon=True).start()
+        for name, target in (("sensor", self._sensor_loop), ("uplink", self._uplink_loop),
+                             ("motion", self._motion_loop)):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.listener:
+            self.listener.running = False
+        self.mc.stop()
+
+    # --- Threads ---
+
+    def _sensor_loop(self):
+        while self.running:
+            try:
+                distance = self.mc.get_distance()
+                if distance is None:
+                    print("Failed to get valid distance.")
+                else:
+                    self.distance = (distance, time.time())
+            except Exception as e:
+                print(f"Sensor error: {e}")
+            self.sensor_timer.wait()
+
+    def _uplink_loop(self):
+        while self.running:
+            try:
+                reading = self.distance
+                if reading is None:
+                    pass  # No distance yet
+                elif self.listener is None:
+                    # State up, pending plan down; the server holds the request until the next cycle is due
+                    plan = self.client.exchange({"front": reading[0]}, wait=self.uplink_timer.remaining())
+                    if plan:
+                        self.submit_plan(plan)
+                else:
+                    self.client.submit_state({"front": reading[0]})
+            except Exception as e:
+                print(f"Failed to exchange state/plan: {e}")
+            self.uplink_timer.wait()
+
+    def _fetch_loop(self):
+        while self.running:
+            plan = self.listener.next_plan(timeout=1.0)
+            if plan:
+                self.submit_plan(plan)
+
+    def _motion_loop(self):
+        while self.running:
+            plan, generation, received_at = self.plans.get()
+            streamed = plan[0].get("plan_id") is not None
+            with self._dispatch_lock:
+                if generation != self.generation:
+                    continue  # Preempted (or emergency-stopped) before it started
+                new_plan = generation != self._dispatched_generation
+                if new_plan:
+                    self._dispatched_generation = generation
+                    self._latency_mark = (received_at, plan[0].get("published_at"))
+                try:
+                    if not streamed:
+                        done = dispatch_plan(self.mc, plan)
+                    else:
+                        commands = compile_plan(plan, final_stop=plan[-1].get("action") == "stop")
+                        full = self._dispatch_chunk(commands, new_plan)
+                except Exception as e:
+                    print(f"Dispatch error: {e}")
+                    continue
+            if not streamed:
+                print("✅ --- Plan Finished. ---" if done() else "⏹️ --- Plan cut short. ---")
                 continue
+            # A full buffer is waited out here, outside the lock, so a new plan can still preempt
+            if full is not None and self.mc.wait_plan(full) == "done":
+                with self._dispatch_lock:
+                    try:
+                        if generation == self.generation:
+                            self._dispatch_chunk(commands, True)
+                    except Exception as e:
+                        print(f"Dispatch error: {e}")
+
+    def _dispatch_chunk(self, commands, new_plan):
+        """
+        Sends a streamed chunk's compiled commands: the first chunk of a plan
+        is uploaded and later ones are appended to it, so the whole stream
+        runs back-to-back from the Arduino's buffer. Steps are compiled per
+        chunk, so merging doesn't reach across chunks. Returns the on-board
+        plan id when its buffer is full: wait for it, then send the chunk
+        again as a new plan. Links without plan upload queue the steps.
+        """
+        onboard = None if new_plan else self._onboard_plan
+        if not commands:
+            self._onboard_plan = onboard
+            return None
+        if onboard is not None:
+            if self.mc.append_plan(onboard, commands):
+                return None
+            status = self.mc.wait_plan(onboard, timeout=0)
+            if status is None:
+                return onboard  # Still running with a full buffer
+            if status != "done":
+                return None  # Stopped: the rest of this stream is dropped
+        self._onboard_plan = self.mc.upload_plan(commands) if PLAN_UPLOAD else None
+        if self._onboard_plan is None:
+            for command in commands:
+                self.mc.submit_action(command)
+        return None
+
+    # --- Plans ---
+
+    def submit_plan(self, plan):
+        """Hands a fetched plan to the motion thread; anything but the next chunk of the running stream preempts."""
+        received_at = time.time()
+        plan_id = plan[0].get("plan_id")
+        if plan_id is None or plan_id not in (self.current_plan_id, self.dropped_plan_id):
+            with self._dispatch_lock:
+                with self._plan_lock:
+                    self._new_generation(plan_id)
+                self._latency_mark = None
+                if self.mc.is_moving():
+                    print("⏹️ New plan preempts the running one")
+                    self.mc.stop()
+            print(f"✅ --- New Plan Received! ({len(plan)} steps) ---")
+        with self._plan_lock:
+            if plan_id is not None and plan_id == self.dropped_plan_id:
+                print(f"🛑 Dropping a chunk of plan {plan_id}: an emergency stop ended it")
+                return
+            self.plans.put((plan, self.generation, received_at))
+
+    def _new_generation(self, plan_id):
+        """Caller holds _plan_lock. Plans queued for the motion thread are dropped."""
+        self.generation += 1
+        self.current_plan_id = plan_id
+        while True:
+            try:
+                self.plans.get_nowait()
+            except queue.Empty:
+                break
 
-            print(f"Distance: {distance:.2f} cm")
-
-            # 2️⃣ Submit our state to the server
-            submit_state_to_server(distance)
-
-            # 3️⃣ Ask the server for a new plan
-            action_sequence = fetch_plan_from_server()
-
-            # 4️⃣ If we got one, execute it
-            if action_sequence:
-                print("✅ --- New Plan Received! Executing... ---")
-                execute_action_sequence(mc, action_sequence)
-                print("✅ --- Plan Finished. ---")
-            
-            # Wait a short time before polling again
-            time.sleep(0.2)
-
-        except KeyboardInterrupt:
-            print("\nStopping...")
-            break
-        except Exception as e:
-            print(f"Loop error: {e}")
-            time.sleep(0.5)
+    def _on_serial_event(self, event):
+        """
+        Reader thread: an on-board emergency stop ends the running plan here
+        too, and the first move of a new plan started, so its latency is known.
+        """
+        if event.kind == "emergency" or (event.kind == "plan_done" and event.value[0] == "emergency"):
+            # Not _dispatch_lock: the motion thread may hold it while waiting for this thread's ACKs
+            with self._plan_lock:
+                if self.current_plan_id is not None:
+                    self.dropped_plan_id = self.current_plan_id
+                self._new_generation(None)
+            return
+        mark = self._latency_mark
+        if mark is None or event.kind not in ("started", "plan_step"):
+            return
+        self._latency_mark = None
+        received_at, published_at = mark
+        self.command_latency.append(event.timestamp - received_at)
+        if published_at:
+            self.end_to_end_latency.append(event.timestamp - published_at)
+
+    def report(self):
+        """Jitter of the periodic threads and command latency (end-to-end assumes NTP-synced clocks)."""
+        return {
+            "distance": self.distance[0] if self.distance else None,
+            "sensor_jitter": self.sensor_timer.stats(),
+            "uplink_jitter": self.uplink_timer.stats(),
+            "command_latency": percentiles_ms(self.command_latency),
+            "end_to_end_latency": percentiles_ms(self.end_to_end_latency),
+            "network": self.client.stats(),
+        }
+
+
+def loop(mc):
+    agent = RobotAgent(mc).start()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    try:
+        while True:
+            time.sleep(REPORT_INTERVAL)
+            cpu = time.process_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            print(f"📊 {agent.report()} | Pi CPU {cpu / wall * 100:.1f}%")
+    except KeyboardInterrupt:
+        print("\nStopping...")
+        agent.stop()
 
 if __name__ == "__main__":
     mc = check_the_arduino()
@@ -1,68 +1,440 @@
 import serial
+import threading
 import time
+from collections import deque
+import serial_protocol as protocol
+from serial_protocol import SerialEvent, parse_line  # noqa: F401 (re-exported for callers)
+
 
 class MotorController:
-    def __init__(self, port="/dev/ttyUSB0", baud=9600):
-        self.arduino = serial.Serial(port, baud, timeout=1)
-        time.sleep(2)
-        print("MotorController ready")
-
-    def get_distance(self):
-        """
-        Request distance from Arduino and read the response.
-        """
-        # Clear the serial buffer first
-        self.arduino.reset_input_buffer()
-        
-        self.arduino.write(b"REQ\n")
-        self.arduino.flush()  # Wait until all data is written
-        
-        start_time = time.time()
-        timeout = 2
-
-        while time.time() - start_time < timeout:
-            line = self.arduino.readline().decode('utf-8').strip()
-            
-            if line:
-                try:
-                    distance = int(line)
-                    return distance
-                except ValueError:
-                    # Ignore non-distance messages
-                    pass
-            
-            time.sleep(0.01)
+    """
+    Serial link to the Arduino.
+
+    A reader thread blocks on the port and turns every frame or line into a
+    SerialEvent, so nothing here polls or sleeps. protocol="binary" sends
+    compact CRC-checked frames (serial_protocol.py), "text" the old lines;
+    "auto" uses frames if the firmware answers a HELLO frame. Motor commands
+    carry a sequence number that the firmware echoes back with DONE. Up to
+    PIPELINE_DEPTH commands are written ahead: the next one is already in the
+    Arduino's queue when the current one finishes, so there is no dead time
+    between steps. More are held here and written as DONEs arrive.
+
+    Motion is asynchronous: submit_action() returns at once, stop() preempts
+    whatever is running, and STARTED/DONE/EMERGENCY status events reach
+    `listeners` as they happen. The firmware keeps answering distance
+    requests mid-move and stops on its own if an obstacle gets too close.
+
+    With the binary protocol a whole plan can also be uploaded in one go
+    (upload_plan): the firmware buffers it and runs the steps back-to-back,
+    reporting each one, instead of one command per step over the wire. A
+    plan that arrives in pieces grows while it runs (append_plan).
+
+    stream_distance() has the firmware push median-filtered distances on its
+    own; the newest one is kept here with its timestamp, so get_distance()
+    returns at once instead of waiting on a serial round trip.
+    """
+
+    PIPELINE_DEPTH = 2  # Commands on the wire at once; the Uno's RX buffer is 64 bytes
+    DONE_MARGIN = 2.0  # Seconds allowed on top of a command's own duration before it counts as lost
+
+    HELLO_TIMEOUT = 0.5  # How long protocol="auto" waits for the firmware to answer a HELLO frame
+    PLAN_ACK_TIMEOUT = 0.5  # How long upload_plan waits for the firmware to acknowledge each chunk
+    STREAM_STALE_PERIODS = 3  # A streamed distance older than this many periods is not trusted
+
+    def __init__(self, port="/dev/ttyUSB0", baud=protocol.BAUD_RATE, verbose=False, protocol_name="auto",
+                 serial_port=None):
+        """serial_port: an already open port-like object (e.g. LoopbackArduino) instead of opening `port`."""
+        if serial_port is None:
+            self.arduino = serial.Serial(port, baud, timeout=1)
+            time.sleep(2)  # Opening the port resets the Uno; wait for its bootloader
+        else:
+            self.arduino = serial_port
+        self.arduino.reset_input_buffer()  # Drop the boot banner once, never again
+        self.verbose = verbose
+        self.protocol = "text" if protocol_name == "text" else "binary"
+        self._decoder = protocol.StreamDecoder()
+
+        self._lock = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._next_seq = 0
+        self._in_flight = deque()  # (seq, command, deadline) written to the Arduino, oldest first
+        self._pending = deque()  # (seq, command, duration_s) waiting for room in the pipeline
+        self._aborted = set()  # Finished without running to completion (stopped, emergency, lost)
+        self.current_seq = None  # Move the Arduino reported STARTED and hasn't finished
+        self.last_emergency = None  # (distance_cm, timestamp) of the last on-board emergency stop
+        self._last_distance = None  # (cm, timestamp) of the newest distance line
+        self._distance_count = 0
+        self._stream_period = 0  # Seconds between streamed distances, 0 = not streaming
+        self._hello_version = None
+        self._next_plan_id = 0
+        self.plan = None  # Last uploaded plan: dict of id, total, acked, step, status, completed, deadline
+        self.listeners = []  # Callables receiving every SerialEvent (on the reader thread)
+        self.lost = 0  # Commands whose DONE never came
+
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, name="arduino-reader", daemon=True)
+        self._reader.start()
+
+        if protocol_name == "auto" and not self._hello():
+            self.protocol = "text"
+        # Older binary firmware lacks newer features; protocol="binary" skips the handshake and assumes the latest
+        version = (self._hello_version or protocol.PROTOCOL_VERSION) if self.protocol == "binary" else 0
+        self.plan_upload = version >= 3
+        self.distance_streaming = version >= 4
+        self.plan_append = version >= 5
+        print(f"MotorController ready ({self.protocol} protocol)")
+
+    def _hello(self):
+        with self._lock:
+            self._hello_version = None
+            self._write_raw(protocol.encode_frame(protocol.OP_HELLO))
+            self._lock.wait_for(lambda: self._hello_version is not None, timeout=self.HELLO_TIMEOUT)
+            return self._hello_version is not None
+
+    # --- Reader thread ---
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                # Blocks until at least one byte or the 1 s port timeout, then takes all that arrived
+                raw = self.arduino.read(max(1, self.arduino.in_waiting))
+            except serial.SerialException as e:
+                print(f"Serial read failed: {e}")
+                break
+            if raw:
+                for event in self._decoder.events(raw):
+                    self._handle(event)
+
+    def _handle(self, event):
+        with self._lock:
+            if event.kind == "distance":
+                self._last_distance = (event.value, event.timestamp)
+                self._distance_count += 1
+            elif event.kind == "done":
+                self._complete(event.seq)
+                if self.current_seq is not None and event.seq is not None \
+                        and (self.current_seq & 0xFFFF) == (event.seq & 0xFFFF):
+                    self.current_seq = None
+            elif event.kind == "started":
+                self.current_seq = event.seq
+            elif event.kind == "emergency":
+                self.last_emergency = (event.value, event.timestamp)
+                self.current_seq = None
+                self._drop_pending()  # Before _complete, which would write the next one
+                self._complete(event.seq, aborted=True)
+                print(f"🛑 Arduino emergency stop at {event.value} cm, plan aborted")
+            elif event.kind in ("plan_ack", "plan_step", "plan_done"):
+                self._plan_event(event)
+            elif event.kind == "hello":
+                self._hello_version = event.value
+            elif event.kind == "error":
+                print(f"Arduino {event.value}")
+            elif self.verbose:
+                print(f"Arduino: {event.value}")
+            self._lock.notify_all()
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Serial event listener failed: {e}")
+
+    def _complete(self, seq, aborted=False):
+        """
+        Retire a command (the oldest one for a DONE without seq) and write the
+        next pending one. Older commands without their own DONE were dropped
+        by the firmware (preempted by a stop) and count as aborted.
+        """
+        # Frames carry the low 16 bits of the sequence number: match on those
+        for i, (in_flight_seq, _, _) in enumerate(self._in_flight):
+            if seq is None or (in_flight_seq & 0xFFFF) == (seq & 0xFFFF):
+                for j in range(i + 1):
+                    done_seq = self._in_flight.popleft()[0]
+                    if aborted or j < i:
+                        self._aborted.add(done_seq)
+                break
+        self._fill_pipeline()
+
+    def _plan_event(self, event):
+        plan = self.plan
+        if plan is None or (plan["id"] & 0xFFFF) != event.seq:
+            return  # From a plan that has since been replaced
+        if event.kind == "plan_ack":
+            plan["acked"] = event.value[0]
+        elif event.kind == "plan_step":
+            plan["step"] = event.value[0]
+            if self.verbose:
+                print(f"Plan {plan['id']}: step {event.value[0] + 1}/{event.value[1]}")
+        elif plan["status"] is None:
+            plan["status"], plan["completed"] = event.value
+            plan["step"] = None
+
+    def _drop_pending(self):
+        for seq, _, _ in self._pending:
+            self._aborted.add(seq)
+        self._pending.clear()
+
+    def _outstanding(self, seq):
+        return any(s == seq for s, _, _ in self._in_flight) or any(s == seq for s, _, _ in self._pending)
+
+    def _fill_pipeline(self):
+        while self._pending and len(self._in_flight) < self.PIPELINE_DEPTH:
+            seq, command, duration = self._pending.popleft()
+            # The deadline counts from when the commands ahead of it should be done
+            start = self._in_flight[-1][2] - self.DONE_MARGIN if self._in_flight else time.time()
+            self._in_flight.append((seq, command, max(start, time.time()) + duration + self.DONE_MARGIN))
+            self._send_command(command, seq)
+
+    def _send_command(self, command, seq):
+        if self.protocol == "binary":
+            self._write_raw(protocol.encode_command(command, seq))
+        else:
+            self._write_raw(f"{command},{seq}\n".encode())
+        if self.verbose:
+            print(f"Sent #{seq}: '{command}'")
+
+    def _write_raw(self, data):
+        with self._write_lock:
+            self.arduino.write(data)
+
+    # --- Motion ---
+
+    def submit_action(self, command, duration=None):
+        """
+        Queue "action,duration_ms,speed" without waiting; returns its sequence
+        number. duration (seconds) defaults to the one in the command.
+        """
+        if duration is None:
+            parts = command.split(",")
+            duration = int(parts[1]) / 1000.0 if len(parts) > 1 and parts[1].strip().isdigit() else 1.0
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append((seq, command, duration))
+            self._fill_pipeline()
+        return seq
 
-        return None
+    def wait_for(self, seq, timeout=None):
+        """Blocks until command `seq` is DONE. False if it was aborted, lost or timeout ran out."""
+        end = None if timeout is None else time.time() + timeout
+        with self._lock:
+            if seq >= self._next_seq:
+                return False  # Never submitted
+            while self._outstanding(seq):
+                now = time.time()
+                if self._in_flight and self._in_flight[0][2] < now:
+                    lost_seq, command, _ = self._in_flight.popleft()
+                    self.lost += 1
+                    print(f"Warning: Action {command.split(',')[0]} (#{lost_seq}) timed out!")
+                    self._aborted.add(lost_seq)
+                    self._fill_pipeline()
+                    continue
+                if end is not None and now >= end:
+                    return False
+                wake = min(self._in_flight[0][2], end) if end is not None else self._in_flight[0][2]
+                self._lock.wait(timeout=wake - now)
+            return seq not in self._aborted
+
+    def stop(self):
+        """
+        Preempting stop: the Arduino halts mid-move and drops its queued moves
+        and uploaded plan; moves still held here are dropped too. Returns the stop's sequence
+        number (wait_for it to know the motors are off). The per-step
+        send_action("stop,...") path still exists for a stop at the end of a plan.
+        """
+        with self._lock:
+            self._drop_pending()
+            seq = self._next_seq
+            self._next_seq += 1
+            self._in_flight.append((seq, "STOP", time.time() + self.DONE_MARGIN))
+            if self.protocol == "binary":
+                self._write_raw(protocol.encode_stop(seq))
+            else:
+                self._write_raw(f"STOP {seq}\n".encode())
+        return seq
+
+    def upload_plan(self, commands):
+        """
+        Send a whole plan of "action,duration_ms,speed" commands to the
+        Arduino's plan buffer, chunk by chunk, and return its plan id once the
+        firmware has all of it (it starts right away, replacing any running
+        plan or queued moves). None if this link can't upload plans (text
+        protocol, older firmware, too many steps) or a chunk wasn't
+        acknowledged: send the steps with submit_action() instead.
+        """
+        if not self.plan_upload or not 0 < len(commands) <= protocol.PLAN_CAPACITY:
+            return None
+        steps = [protocol.parse_command(command) for command in commands]
+        with self._lock:
+            # The firmware drops queued moves for a new plan; so do we
+            self._drop_pending()
+            for seq, _, _ in self._in_flight:
+                self._aborted.add(seq)
+            self._in_flight.clear()
+            self.current_seq = None
+            plan_id = self._next_plan_id
+            self._next_plan_id += 1
+            plan = self.plan = {"id": plan_id, "total": len(steps), "acked": 0, "step": None,
+                                "status": None, "completed": 0, "deadline": None}
+            if not self._load_plan(plan, steps, 0):
+                return None
+            duration = sum(duration_ms for _, duration_ms, _ in steps) / 1000.0
+            plan["deadline"] = time.time() + duration + self.DONE_MARGIN
+        if self.verbose:
+            print(f"Uploaded plan {plan_id} ({len(steps)} steps, {duration:.1f} s)")
+        return plan_id
+
+    def append_plan(self, plan_id, commands):
+        """
+        Add commands to the end of uploaded plan `plan_id` while it runs (or
+        resume it with them if it just finished), so a plan that arrives in
+        pieces still runs back-to-back from the Arduino's buffer. False if
+        it can't: older firmware, the plan was stopped or replaced, the
+        buffer would overflow or a chunk wasn't acknowledged.
+        """
+        if not self.plan_append or not commands:
+            return False
+        steps = [protocol.parse_command(command) for command in commands]
+        with self._lock:
+            plan = self.plan
+            if plan is None or plan["id"] != plan_id or plan["status"] not in (None, "done") \
+                    or plan["total"] + len(steps) > protocol.PLAN_CAPACITY:
+                return False
+            if not self._load_plan(plan, steps, plan["total"]):
+                return False
+            plan["total"] += len(steps)
+            plan["status"] = None  # The firmware picks up where it was, even if it had finished
+            duration = sum(duration_ms for _, duration_ms, _ in steps) / 1000.0
+            plan["deadline"] = max(plan["deadline"] - self.DONE_MARGIN, time.time()) + duration + self.DONE_MARGIN
+        if self.verbose:
+            print(f"Appended {len(steps)} steps to plan {plan_id} ({plan['total']} steps)")
+        return True
+
+    def _load_plan(self, plan, steps, offset):
+        """Caller holds _lock. Sends steps from `offset` chunk by chunk, each after the last one's ACK."""
+        for i, frame in enumerate(protocol.encode_plan(plan["id"], steps, offset)):
+            received = offset + min((i + 1) * protocol.PLAN_CHUNK_STEPS, len(steps))
+            self._write_raw(frame)
+            if not self._lock.wait_for(lambda: plan["acked"] >= received or self.plan is not plan,
+                                       timeout=self.PLAN_ACK_TIMEOUT) or self.plan is not plan:
+                print(f"Warning: plan {plan['id']} upload not acknowledged")
+                self.plan = None
+                return False
+        return True
+
+    def wait_plan(self, plan_id, timeout=None):
+        """
+        Blocks until uploaded plan `plan_id` ends; returns "done", "aborted",
+        "emergency" or "lost" (no PLAN_DONE in time), None if timeout ran out.
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self._lock:
+            plan = self.plan
+            if plan is None or plan["id"] != plan_id:
+                return "aborted"  # Replaced by a newer plan
+            while plan["status"] is None:
+                now = time.time()
+                if now >= plan["deadline"]:
+                    plan["status"] = "lost"
+                    self.lost += 1
+                    print(f"Warning: plan {plan_id} timed out at step {plan['step']}")
+                    break
+                if end is not None and now >= end:
+                    return None
+                self._lock.wait(timeout=min(plan["deadline"], end) - now if end is not None
+                                else plan["deadline"] - now)
+            return plan["status"]
+
+    def abort_plan(self):
+        """Stops the uploaded plan mid-step; its wait_plan() returns "aborted"."""
+        if self.plan_upload:
+            self._write_raw(protocol.encode_frame(protocol.OP_PLAN_ABORT))
+
+    def is_moving(self):
+        with self._lock:
+            plan_running = self.plan is not None and self.plan["status"] is None
+            return bool(self._in_flight or self._pending or plan_running)
+
+    def status(self):
+        with self._lock:
+            return {
+                "current_seq": self.current_seq,
+                "in_flight": len(self._in_flight),
+                "pending": len(self._pending),
+                "aborted": len(self._aborted),
+                "lost": self.lost,
+                "last_emergency": self.last_emergency,
+                "plan": None if self.plan is None else {k: self.plan[k] for k in ("id", "step", "total", "status")},
+            }
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every queued command is DONE."""
+        with self._lock:
+            last = self._next_seq - 1
+        return self.wait_for(last, timeout)
 
     def send_action(self, command):
         """
         Send motor command to Arduino and wait for DONE.
         """
-        # Clear the serial buffer first
-        self.arduino.reset_input_buffer()
-        
-        # Send command with newline
-        full_command = command + "\n"
-        self.arduino.write(full_command.encode())
-        self.arduino.flush()  # Ensure command is sent
-        
-        print(f"Sent: '{full_command.strip()}'")  # Debug
-        
-        start_time = time.time()
-        timeout = 10
-
-        while time.time() - start_time < timeout:
-            if self.arduino.in_waiting > 0:
-                line = self.arduino.readline().decode('utf-8').strip()
-                print(f"Received from Arduino: '{line}'")  # Debug
-                
-                if line == "DONE":
-                    print(f"Action {command.split(',')[0]} complete")
-                    return
-                elif line:
-                    # Print any other messages
-                    print(f"Arduino: {line}")
-            time.sleep(0.05)
-        
-        print(f"Warning: Action {command.split(',')[0]} timed out!")
\ No newline at end of file
+        seq = self.submit_action(command)
+        if self.wait_for(seq):
+            print(f"Action {command.split(',')[0]} complete")
+
+    # --- Sensing ---
+
+    def get_distance(self, timeout=2.0):
+        """
+        Distance in cm: the newest streamed reading if it is fresh, otherwise
+        request one from the Arduino and wait for the reply (the next distance
+        line the reader sees). None on timeout.
+        """
+        with self._lock:
+            if self._stream_period:
+                distance = self.latest_distance(self._stream_period * self.STREAM_STALE_PERIODS)
+                if distance is not None:
+                    return distance
+            count = self._distance_count
+        self._write_raw(protocol.encode_frame(protocol.OP_REQ_DISTANCE) if self.protocol == "binary" else b"REQ\n")
+        end = time.time() + timeout
+        with self._lock:
+            while self._distance_count == count:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(timeout=remaining)
+            return self._last_distance[0]
+
+    def latest_distance(self, max_age=None):
+        """Newest distance the reader has seen, without asking for one; None if none or older than max_age s."""
+        with self._lock:
+            if self._last_distance is None:
+                return None
+            distance, timestamp = self._last_distance
+            if max_age is not None and time.time() - timestamp > max_age:
+                return None
+            return distance
+
+    def stream_distance(self, period_ms=50, samples=5):
+        """
+        Have the Arduino push the median of its last `samples` pings every
+        period_ms (0 stops it). False if the firmware can't stream; keep
+        calling get_distance(), which then asks each time.
+        """
+        if not self.distance_streaming:
+            return False
+        self._write_raw(protocol.encode_stream(period_ms, samples))
+        with self._lock:
+            self._stream_period = period_ms / 1000.0
+        return True
+
+    def set_verbosity(self, level):
+        """Firmware debug output: 0 = none (default), 1 = commands, 2 = pin-level detail."""
+        if self.protocol == "binary":
+            self._write_raw(protocol.encode_frame(protocol.OP_SET_VERBOSITY, bytes((level,))))
+        else:
+            self._write_raw(f"VERBOSE {level}\n".encode())
+
+    def close(self):
+        self._running = False
+        self._reader.join(timeout=2)
+        self.arduino.close()
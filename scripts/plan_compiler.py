@@ -0,0 +1,82 @@
+"""
+Plan compiler: turns the server's plan (dicts with "action" and a "distance"
+in meters, an "angle" in degrees or a "duration" in seconds) into Arduino
+commands "action,duration_ms,speed".
+
+Distances and angles become durations through CALIBRATION, measured on this
+robot. Adjacent steps doing the same thing are merged into one, no-ops
+(zero-length moves, stops between moves) are dropped and the plan always
+ends in exactly one stop, so the Arduino gets fewer, correct steps.
+"""
+DEFAULT_SPEED = 180  # PWM the calibration was measured at
+DEFAULT_DURATION = 1.0  # Seconds for a move that gives neither distance, angle nor duration
+MIN_STEP_MS = 20  # Shorter moves are dropped as no-ops
+MAX_STEP_MS = 0xFFFF  # Longest move one binary command can carry
+
+# Meters per second (forward/backward) and degrees per second (left/right) at
+# DEFAULT_SPEED. Re-measure after changing motors, wheels, battery or floor:
+# drive forward 2 s and measure, spin 4 s and count the degrees.
+CALIBRATION = {
+    "forward": 0.25,
+    "backward": 0.25,
+    "left": 45.0,  # 90° in 2 s
+    "right": 45.0,
+}
+
+STOP_COMMAND = "stop,0,0"
+
+_OPPOSITE = {"forward": "backward", "backward": "forward", "left": "right", "right": "left"}
+
+
+def step_timing(decision, calibration=CALIBRATION):
+    """(action, duration_ms, speed) for one plan step."""
+    action = decision.get("action", "stop")
+    if action not in calibration:
+        return "stop", 0, 0
+    speed = decision.get("speed")
+    speed = DEFAULT_SPEED if speed is None else max(0, min(int(speed), 255))
+    if speed == 0:
+        return action, 0, 0
+    # Motor speed is close enough to proportional to PWM in the range the robot uses
+    rate = calibration[action] * speed / DEFAULT_SPEED
+    amount = decision.get("distance") if action in ("forward", "backward") else decision.get("angle")
+    if amount is not None:
+        if amount < 0:
+            action, amount = _OPPOSITE[action], -amount
+        seconds = amount / rate
+    else:
+        seconds = decision.get("duration")
+        if seconds is None or seconds <= 0:
+            seconds = DEFAULT_DURATION
+    return action, int(round(seconds * 1000)), speed
+
+
+def compile_plan(action_sequence, calibration=CALIBRATION, final_stop=True):
+    """
+    Arduino commands for a plan: calibrated, merged, no-ops dropped, one
+    final stop. final_stop=False leaves it off for a streamed chunk that
+    more steps will follow.
+    """
+    steps = []
+    for decision in action_sequence:
+        action, duration_ms, speed = step_timing(decision, calibration)
+        if action == "stop" or duration_ms < MIN_STEP_MS:
+            continue  # A stop between moves leaves the motors running into the next one anyway
+        if steps and steps[-1][0] == action and steps[-1][2] == speed:
+            duration_ms += steps.pop()[1]
+        steps.append((action, duration_ms, speed))
+
+    commands = []
+    for action, duration_ms, speed in steps:
+        while duration_ms > 0:
+            chunk = min(duration_ms, MAX_STEP_MS)
+            commands.append(f"{action},{chunk},{speed}")
+            duration_ms -= chunk
+    if final_stop:
+        commands.append(STOP_COMMAND)
+    return commands
+
+
+def estimate_seconds(commands):
+    """How long the Arduino will take to run compiled commands."""
+    return sum(int(command.split(",")[1]) for command in commands) / 1000.0
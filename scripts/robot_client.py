@@ -0,0 +1,98 @@
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import msgpack  # Optional: compact binary encoding
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+
+
+class RobotClient:
+    """
+    HTTP client for the planning server.
+
+    Uses one pooled keep-alive Session, so the TCP connection is reused every
+    cycle instead of being opened twice per loop. exchange() sends the sensor
+    state and receives any pending plan in a single round trip. robot_id is
+    sent with every request so one server can drive several robots.
+    """
+
+    def __init__(self, host, encoding="json", timeout=1.0, robot_id=None):
+        if encoding == "msgpack" and msgpack is None:
+            raise RuntimeError("encoding='msgpack' needs the msgpack package (pip install msgpack)")
+        self.host = host
+        self.encoding = encoding
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        content_type = MSGPACK_TYPE if encoding == "msgpack" else JSON_TYPE
+        self.session.headers.update({"Content-Type": content_type, "Accept": content_type})
+        if robot_id:
+            self.session.headers["X-Robot-Id"] = robot_id
+
+        # Per-cycle network timings (seconds, including any server-side long-poll wait)
+        self.cycles = 0
+        self.net_time_total = 0.0
+        self.net_time_max = 0.0
+        self.last_net_time = 0.0
+
+    def _encode(self, payload):
+        if self.encoding == "msgpack":
+            return msgpack.packb(payload)
+        return json.dumps(payload)
+
+    def _decode(self, response):
+        if response.headers.get("Content-Type", "").startswith(MSGPACK_TYPE):
+            return msgpack.unpackb(response.content)
+        return response.json()
+
+    def _record(self, elapsed):
+        self.cycles += 1
+        self.net_time_total += elapsed
+        self.net_time_max = max(self.net_time_max, elapsed)
+        self.last_net_time = elapsed
+
+    def exchange(self, distances, wait=0.0):
+        """
+        Upload the state and get back any pending plan (None if there is none).
+        With wait > 0 the server holds the request up to that long for a plan,
+        which doubles as the loop's pacing.
+        """
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.host}/exchange", params={"wait": wait} if wait else None,
+            data=self._encode({"distances": distances}), timeout=self.timeout + wait
+        )
+        self._record(time.perf_counter() - start)
+        response.raise_for_status()
+        plan = self._decode(response).get("plan")
+        return plan or None
+
+    def submit_state(self, distances):
+        start = time.perf_counter()
+        response = self.session.post(f"{self.host}/submit_state", data=self._encode({"distances": distances}),
+                                     timeout=self.timeout)
+        self._record(time.perf_counter() - start)
+        response.raise_for_status()
+
+    def get_command(self, wait=0.0):
+        """Pending plan or None; wait > 0 long-polls."""
+        response = self.session.get(f"{self.host}/get_command", params={"wait": wait} if wait else None,
+                                    timeout=self.timeout + wait)
+        response.raise_for_status()
+        return response.json() or None
+
+    def stats(self):
+        return {
+            "cycles": self.cycles,
+            "net_ms_avg": round(self.net_time_total / self.cycles * 1000, 2) if self.cycles else 0.0,
+            "net_ms_max": round(self.net_time_max * 1000, 2),
+            "net_ms_last": round(self.last_net_time * 1000, 2),
+        }
@@ -0,0 +1,512 @@
+"""
+Pi <-> Arduino serial protocol (see src/protocol.h for the firmware side).
+
+Binary frames:  0xAA | opcode | len | payload[len] | CRC-8 (poly 0x07 over opcode, len, payload)
+Multi-byte fields are little-endian. The firmware still understands the old
+text lines ("REQ", "forward,1000,180,7") and answers in whichever format the
+command came in, so both can be decoded from the same byte stream.
+"""
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+FRAME_START = 0xAA
+MAX_PAYLOAD = 32
+PROTOCOL_VERSION = 5  # 3 added plan upload, 4 distance streaming, 5 appending to a plan
+BAUD_RATE = 115200
+
+# Pi -> Arduino
+OP_HELLO = 0x01
+OP_MOVE = 0x10  # action u8, duration_ms u16, speed u8, seq u16 (queued behind the running move)
+OP_STOP = 0x11  # seq u16: stop now and drop queued moves and the plan
+OP_PLAN_LOAD = 0x12  # plan_id u16, offset u8, total u8, steps (action u8, duration_ms u16, speed u8)...
+#                      chunks past a complete plan's total append to it until it is stopped
+OP_PLAN_ABORT = 0x13  # stop the running plan
+OP_REQ_DISTANCE = 0x20
+OP_STREAM_DISTANCE = 0x21  # period_ms u16 (0 = off), samples u8: pushes the median of the last pings as OP_DISTANCE
+OP_SET_VERBOSITY = 0x30  # level u8
+# Arduino -> Pi
+OP_HELLO_REPLY = 0x81  # version u8
+OP_DISTANCE = 0x82  # cm u16
+OP_DONE = 0x83  # seq u16
+OP_ERROR = 0x84  # code u8, seq u16
+OP_LOG = 0x85  # text
+OP_STARTED = 0x86  # seq u16, action u8
+OP_EMERGENCY = 0x87  # distance u16, seq u16 (moves up to seq were dropped)
+OP_PLAN_ACK = 0x88  # plan_id u16, received u8, total u8
+OP_PLAN_STEP = 0x89  # plan_id u16, step u8, total u8
+OP_PLAN_DONE = 0x8A  # plan_id u16, status u8, completed u8
+
+ACTIONS = {"stop": 0, "forward": 1, "backward": 2, "left": 3, "right": 4}
+ACTION_NAMES = {code: name for name, code in ACTIONS.items()}
+ERRORS = {1: "bad command", 2: "bad CRC", 3: "motion queue full", 4: "bad plan"}
+PLAN_STATUS = {0: "done", 1: "aborted", 2: "emergency"}
+EMERGENCY_STOP_CM = 15  # Firmware stops forward motion below this
+MOTION_QUEUE_SIZE = 4  # Moves the firmware holds behind the running one
+PLAN_CAPACITY = 24  # Steps of an uploaded plan the firmware holds
+SAMPLE_MS = 30  # Firmware sonar ping period while streaming
+MAX_SAMPLES = 9  # Most pings the streamed median can cover
+
+_MOVE = struct.Struct("<BHBH")
+_U16 = struct.Struct("<H")
+_ERROR = struct.Struct("<BH")
+_STARTED = struct.Struct("<HB")
+_EMERGENCY = struct.Struct("<HH")
+_PLAN = struct.Struct("<HBB")  # plan_id, then offset/total, step/total or status/completed
+_PLAN_STEP = struct.Struct("<BHB")
+_STREAM = struct.Struct("<HB")
+PLAN_CHUNK_STEPS = (MAX_PAYLOAD - _PLAN.size) // _PLAN_STEP.size
+
+# One message from the Arduino. kind: "distance" (value = cm), "done" (seq of the
+# finished command, None from firmware that doesn't echo it), "started" (seq, value =
+# action), "emergency" (seq = last dropped move, value = cm), "error", "log" (value = text),
+# "hello" (value = protocol version) or, with seq = plan id, "plan_ack" (value = (received,
+# total)), "plan_step" (value = (step, total)) and "plan_done" (value = (status, completed))
+SerialEvent = namedtuple("SerialEvent", "kind seq value timestamp")
+
+
+def crc8(data, crc=0):
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def encode_frame(opcode, payload=b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    body = bytes((opcode, len(payload))) + payload
+    return bytes((FRAME_START,)) + body + bytes((crc8(body),))
+
+
+def encode_move(action, duration_ms, speed, seq):
+    return encode_frame(OP_MOVE, _MOVE.pack(ACTIONS.get(action, 0), min(int(duration_ms), 0xFFFF),
+                                            max(0, min(int(speed), 255)), seq & 0xFFFF))
+
+
+def encode_stop(seq):
+    return encode_frame(OP_STOP, _U16.pack(seq & 0xFFFF))
+
+
+def parse_command(command):
+    """(action, duration_ms, speed) from a text-protocol command string "action,duration_ms,speed"."""
+    action, duration_ms, speed = (command.split(",") + ["0", "0"])[:3]
+    return action.strip(), int(duration_ms or 0), int(speed or 0)
+
+
+def encode_command(command, seq):
+    """Frame for a text-protocol command string "action,duration_ms,speed"."""
+    return encode_move(*parse_command(command), seq)
+
+
+def encode_stream(period_ms, samples):
+    return encode_frame(OP_STREAM_DISTANCE, _STREAM.pack(min(int(period_ms), 0xFFFF),
+                                                         max(1, min(int(samples), MAX_SAMPLES))))
+
+
+def encode_plan(plan_id, steps, offset=0):
+    """
+    OP_PLAN_LOAD frames for a list of (action, duration_ms, speed), at most
+    PLAN_CHUNK_STEPS steps each. Send one at a time, after the previous ACK.
+    offset > 0 appends the steps to a plan that already has that many.
+    """
+    total = offset + len(steps)
+    if total > PLAN_CAPACITY:
+        raise ValueError(f"Plan of {total} steps exceeds {PLAN_CAPACITY}")
+    frames = []
+    for start in range(0, max(len(steps), 1), PLAN_CHUNK_STEPS):
+        payload = _PLAN.pack(plan_id & 0xFFFF, offset + start, total) + b"".join(
+            _PLAN_STEP.pack(ACTIONS.get(action, 0), min(int(duration_ms), 0xFFFF), max(0, min(int(speed), 255)))
+            for action, duration_ms, speed in steps[start:start + PLAN_CHUNK_STEPS])
+        frames.append(encode_frame(OP_PLAN_LOAD, payload))
+    return frames
+
+
+def parse_line(line, timestamp=None):
+    """Turns one line of text-protocol Arduino output into a SerialEvent."""
+    timestamp = time.time() if timestamp is None else timestamp
+    if line.isdigit():
+        return SerialEvent("distance", None, int(line), timestamp)
+    if line == "DONE" or line.startswith("DONE "):
+        seq = line[5:].strip()
+        return SerialEvent("done", int(seq) if seq.isdigit() else None, None, timestamp)
+    if line.startswith("ERROR"):
+        return SerialEvent("error", None, line, timestamp)
+    parts = line.split()
+    if parts[0] == "STARTED" and len(parts) == 2 and parts[1].isdigit():
+        return SerialEvent("started", int(parts[1]), None, timestamp)
+    if parts[0] == "EMERGENCY" and len(parts) == 3:
+        return SerialEvent("emergency", int(parts[2]), int(parts[1]), timestamp)
+    return SerialEvent("log", None, line, timestamp)
+
+
+def frame_event(opcode, payload, timestamp=None):
+    """Turns one decoded Arduino -> Pi frame into a SerialEvent."""
+    timestamp = time.time() if timestamp is None else timestamp
+    if opcode == OP_DISTANCE and len(payload) == 2:
+        return SerialEvent("distance", None, _U16.unpack(payload)[0], timestamp)
+    if opcode == OP_DONE and len(payload) == 2:
+        return SerialEvent("done", _U16.unpack(payload)[0], None, timestamp)
+    if opcode == OP_ERROR and len(payload) == 3:
+        code, seq = _ERROR.unpack(payload)
+        return SerialEvent("error", seq, f"ERROR: {ERRORS.get(code, code)}", timestamp)
+    if opcode == OP_STARTED and len(payload) == 3:
+        seq, action = _STARTED.unpack(payload)
+        return SerialEvent("started", seq, ACTION_NAMES.get(action, action), timestamp)
+    if opcode == OP_EMERGENCY and len(payload) == 4:
+        distance, seq = _EMERGENCY.unpack(payload)
+        return SerialEvent("emergency", seq, distance, timestamp)
+    if opcode in (OP_PLAN_ACK, OP_PLAN_STEP, OP_PLAN_DONE) and len(payload) == _PLAN.size:
+        plan_id, a, b = _PLAN.unpack(payload)
+        if opcode == OP_PLAN_ACK:
+            return SerialEvent("plan_ack", plan_id, (a, b), timestamp)
+        if opcode == OP_PLAN_STEP:
+            return SerialEvent("plan_step", plan_id, (a, b), timestamp)
+        return SerialEvent("plan_done", plan_id, (PLAN_STATUS.get(a, a), b), timestamp)
+    if opcode == OP_HELLO_REPLY and payload:
+        return SerialEvent("hello", None, payload[0], timestamp)
+    if opcode == OP_LOG:
+        return SerialEvent("log", None, payload.decode("utf-8", errors="replace"), timestamp)
+    return SerialEvent("log", None, f"Unknown frame 0x{opcode:02X} {payload.hex()}", timestamp)
+
+
+class StreamDecoder:
+    """
+    Splits a byte stream that mixes binary frames and text lines into
+    (opcode, payload) frames and text lines. 0xAA never occurs in the text,
+    so it always starts a frame; a bad CRC drops the frame and resyncs.
+    """
+
+    def __init__(self):
+        self._frame = None  # bytearray of opcode, len, payload... while inside a frame
+        self._line = bytearray()
+        self.bad_frames = 0
+
+    def feed(self, data):
+        """Returns a list of ("frame", opcode, payload) and ("line", text, None) tuples."""
+        out = []
+        for byte in data:
+            frame = self._frame
+            if frame is not None:
+                frame.append(byte)
+                if len(frame) >= 2 and frame[1] > MAX_PAYLOAD:
+                    self._frame = None
+                    self.bad_frames += 1
+                elif len(frame) >= 2 and len(frame) == frame[1] + 3:
+                    self._frame = None
+                    if crc8(frame[:-1]) == frame[-1]:
+                        out.append(("frame", frame[0], bytes(frame[2:-1])))
+                    else:
+                        self.bad_frames += 1
+            elif byte == FRAME_START:
+                self._frame = bytearray()
+            elif byte == 0x0A:  # '\n'
+                line = self._line.decode("utf-8", errors="replace").strip()
+                self._line = bytearray()
+                if line:
+                    out.append(("line", line, None))
+            elif len(self._line) < 256:
+                self._line.append(byte)
+        return out
+
+    def events(self, data, timestamp=None):
+        """feed() and convert straight to SerialEvents."""
+        timestamp = time.time() if timestamp is None else timestamp
+        return [frame_event(a, b, timestamp) if kind == "frame" else parse_line(a, timestamp)
+                for kind, a, b in self.feed(data)]
+
+
+class LoopbackArduino:
+    """
+    Pure-Python stand-in for the firmware with the pyserial interface
+    MotorController uses (write, read, readline, in_waiting,
+    reset_input_buffer, close). It speaks both the text and the binary
+    protocol. Like the firmware, moves are queued and "run" on their own
+    thread for duration times time_scale, while commands keep being
+    answered: a STOP preempts, and forward motion stops itself when
+    `distance` drops below EMERGENCY_STOP_CM. Uploaded plans run after the
+    queued moves, report each step and take appended chunks, and a
+    distance stream pushes `distance` every period.
+    """
+
+    def __init__(self, distance=100, time_scale=1.0, timeout=1.0):
+        self.distance = distance  # What the sonar reports, in cm
+        self.time_scale = time_scale
+        self.timeout = timeout
+        self.verbosity = 0
+        self.binary = False
+        self.moves = []  # (action, duration_ms, speed, seq) in execution order
+        self._rx = queue.Queue()  # Bytes written by the Pi
+        self._tx = bytearray()  # Bytes waiting for the Pi to read
+        self._tx_ready = threading.Condition()
+        self._decoder = StreamDecoder()
+        self._motion = []  # Queued (action, duration_ms, speed, seq)
+        self._current = None
+        self._plan = []  # Steps of the uploaded plan
+        self._plan_id = 0
+        self._plan_next = 0
+        self._plan_active = False
+        self._plan_started = False  # Complete once: later chunks append to it
+        self._plan_stopped = False  # Stopped early: no more chunks are taken for it
+        self._current_from_plan = False
+        self._motion_changed = threading.Condition()
+        self._stream_period = 0  # ms, 0 = off
+        self._stream_changed = threading.Event()
+        self._closed = False
+        threading.Thread(target=self._stream_loop, name="loopback-stream", daemon=True).start()
+        threading.Thread(target=self._firmware_loop, name="loopback-arduino", daemon=True).start()
+        threading.Thread(target=self._motion_loop, name="loopback-motion", daemon=True).start()
+        self._emit_line("Arduino ready!")
+
+    # --- pyserial interface ---
+
+    def write(self, data):
+        self._rx.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        with self._tx_ready:
+            return len(self._tx)
+
+    def read(self, size=1):
+        with self._tx_ready:
+            if not self._tx:
+                self._tx_ready.wait(self.timeout)
+            data = bytes(self._tx[:size])
+            del self._tx[:size]
+            return data
+
+    def readline(self):
+        end = time.time() + self.timeout
+        with self._tx_ready:
+            while b"\n" not in self._tx and time.time() < end:
+                self._tx_ready.wait(end - time.time())
+            cut = self._tx.find(b"\n") + 1 or len(self._tx)
+            data = bytes(self._tx[:cut])
+            del self._tx[:cut]
+            return data
+
+    def reset_input_buffer(self):
+        with self._tx_ready:
+            self._tx.clear()
+
+    def close(self):
+        self._closed = True
+        self._rx.put(b"")
+        self._stream_changed.set()
+        with self._motion_changed:
+            self._motion_changed.notify_all()
+
+    # --- Simulated firmware ---
+
+    def _send(self, data):
+        with self._tx_ready:
+            self._tx.extend(data)
+            self._tx_ready.notify_all()
+
+    def _emit_line(self, text):
+        self._send(text.encode() + b"\r\n")
+
+    def _reply(self, opcode, payload, text):
+        if self.binary:
+            self._send(encode_frame(opcode, payload))
+        else:
+            self._emit_line(text)
+
+    def _log(self, level, text):
+        if self.verbosity >= level:
+            self._reply(OP_LOG, text.encode()[:MAX_PAYLOAD], text)
+
+    def _firmware_loop(self):
+        while not self._closed:
+            data = self._rx.get()
+            for kind, a, b in self._decoder.feed(data):
+                if kind == "frame":
+                    self.binary = True
+                    self._handle_frame(a, b)
+                else:
+                    self.binary = False
+                    self._handle_line(a)
+            if self._decoder.bad_frames:
+                self._decoder.bad_frames = 0
+                self.binary = True
+                self._reply(OP_ERROR, _ERROR.pack(2, 0), "ERROR: Bad CRC")
+
+    def _handle_frame(self, opcode, payload):
+        if opcode == OP_HELLO:
+            self._send(encode_frame(OP_HELLO_REPLY, bytes((PROTOCOL_VERSION,))))
+        elif opcode == OP_REQ_DISTANCE:
+            self._send(encode_frame(OP_DISTANCE, _U16.pack(self.distance)))
+        elif opcode == OP_STREAM_DISTANCE and len(payload) == _STREAM.size:
+            self._set_stream(_STREAM.unpack(payload)[0])
+        elif opcode == OP_SET_VERBOSITY and payload:
+            self.verbosity = payload[0]
+        elif opcode == OP_STOP and len(payload) == 2:
+            self._stop(_U16.unpack(payload)[0])
+        elif opcode == OP_PLAN_LOAD and len(payload) >= _PLAN.size \
+                and (len(payload) - _PLAN.size) % _PLAN_STEP.size == 0:
+            self._load_plan(payload)
+        elif opcode == OP_PLAN_ABORT:
+            with self._motion_changed:
+                self._end_plan(1)
+        elif opcode == OP_MOVE and len(payload) == _MOVE.size:
+            action, duration_ms, speed, seq = _MOVE.unpack(payload)
+            self._move(ACTION_NAMES.get(action, "stop"), duration_ms, speed, seq)
+        else:
+            self._send(encode_frame(OP_ERROR, _ERROR.pack(1, 0)))
+
+    def _handle_line(self, line):
+        self._log(1, f"Received: {line}")
+        if line == "REQ":
+            self._emit_line(str(self.distance))
+        elif line == "STOP" or line.startswith("STOP "):
+            self._stop(int(line[5:]) if line[5:].strip().isdigit() else None)
+        elif line.startswith("STREAM "):
+            self._set_stream(int(line.split()[1]))
+        elif line.startswith("VERBOSE "):
+            self.verbosity = int(line[8:])
+        else:
+            parts = line.split(",")
+            if len(parts) < 3:
+                self._emit_line("ERROR: Invalid command format")
+                self._emit_line("DONE")
+                return
+            seq = int(parts[3]) if len(parts) > 3 else None
+            self._move(parts[0], int(parts[1]), int(parts[2]), seq)
+
+    def _set_stream(self, period_ms):
+        self._stream_period = period_ms
+        self._stream_changed.set()
+
+    def _stream_loop(self):
+        while not self._closed:
+            period = self._stream_period / 1000.0 * self.time_scale
+            self._stream_changed.clear()
+            if not period:
+                self._stream_changed.wait()
+            elif not self._stream_changed.wait(period):
+                self._reply(OP_DISTANCE, _U16.pack(self.distance), str(self.distance))
+
+    def _done(self, seq):
+        if seq is None:
+            self._emit_line("DONE")
+        else:
+            self._reply(OP_DONE, _U16.pack(seq), f"DONE {seq}")
+
+    def _move(self, action, duration_ms, speed, seq):
+        self._log(1, f"Move {action} for {duration_ms} ms at {speed}")
+        with self._motion_changed:
+            if len(self._motion) >= MOTION_QUEUE_SIZE:
+                self._reply(OP_ERROR, _ERROR.pack(3, seq or 0), "ERROR: Motion queue full")
+                self._done(seq)
+                return
+            self._motion.append((action, duration_ms, speed, seq))
+            self._motion_changed.notify_all()
+
+    def _load_plan(self, payload):
+        plan_id, offset, total = _PLAN.unpack(payload[:_PLAN.size])
+        steps = [_PLAN_STEP.unpack_from(payload, i) for i in range(_PLAN.size, len(payload), _PLAN_STEP.size)]
+        with self._motion_changed:
+            if total > PLAN_CAPACITY or offset + len(steps) > total:
+                self._send(encode_frame(OP_ERROR, _ERROR.pack(4, 0)))
+                return
+            if offset == 0:  # A new plan replaces whatever is running or queued
+                self._end_plan(1)
+                self._abort()
+                self._plan_id, self._plan = plan_id, []
+                self._plan_started = self._plan_stopped = False
+            elif plan_id != self._plan_id or offset != len(self._plan) or self._plan_stopped:
+                self._send(encode_frame(OP_ERROR, _ERROR.pack(4, 0)))
+                return
+            self._plan.extend((ACTION_NAMES.get(action, "stop"), duration_ms, speed, None)
+                              for action, duration_ms, speed in steps)
+            self._send(encode_frame(OP_PLAN_ACK, _PLAN.pack(plan_id, len(self._plan), total)))
+            if len(self._plan) == total and self._plan_started:
+                self._plan_active = self._plan_next < total  # Resumes it if it had finished
+                self._motion_changed.notify_all()
+            elif len(self._plan) == total:
+                self._plan_started = True
+                self._plan_next = 0
+                self._plan_active = total > 0
+                if not total:
+                    self._send(encode_frame(OP_PLAN_DONE, _PLAN.pack(plan_id, 0, 0)))
+                self._motion_changed.notify_all()
+
+    def _end_plan(self, status):
+        """Stops a running plan (and its running step) and reports PLAN_DONE with `status`."""
+        self._plan_stopped = True
+        if not self._plan_active:
+            return
+        self._plan_active = False
+        completed = self._plan_next
+        if self._current_from_plan and self._current is not None:
+            self._current = None
+            completed -= 1
+        self._send(encode_frame(OP_PLAN_DONE, _PLAN.pack(self._plan_id, status, completed)))
+        self._motion_changed.notify_all()
+
+    def _abort(self):
+        """Drops the running and queued moves; returns the last dropped seq (None if none)."""
+        running = None if self._current_from_plan else self._current
+        dropped = self._motion[-1] if self._motion else running
+        self._motion.clear()
+        self._current = None
+        self._motion_changed.notify_all()
+        return dropped[3] if dropped else None
+
+    def _stop(self, seq):
+        with self._motion_changed:
+            self._end_plan(1)
+            self._abort()
+            self.moves.append(("stop", 0, 0, seq))
+        self._done(seq)
+
+    def _motion_loop(self):
+        with self._motion_changed:
+            while not self._closed:
+                if self._motion:
+                    move = self._current = self._motion.pop(0)
+                    self._current_from_plan = False
+                elif self._plan_active and self._plan_next < len(self._plan):
+                    move = self._current = self._plan[self._plan_next]
+                    self._current_from_plan = True
+                    self._plan_next += 1
+                else:
+                    self._motion_changed.wait()
+                    continue
+                action, duration_ms, _, seq = move
+                self.moves.append(move)
+                if self._current_from_plan:
+                    self._send(encode_frame(OP_PLAN_STEP, _PLAN.pack(self._plan_id, self._plan_next - 1,
+                                                                     len(self._plan))))
+                elif seq is not None:
+                    self._reply(OP_STARTED, _STARTED.pack(seq, ACTIONS.get(action, 0)), f"STARTED {seq}")
+                end = time.time() + (duration_ms / 1000.0 * self.time_scale if action != "stop" else 0.0)
+                while self._current is move and time.time() < end:
+                    if action == "forward" and self.distance < EMERGENCY_STOP_CM:
+                        had_plan = self._plan_active
+                        completed = self._plan_next - 1 if self._current_from_plan else self._plan_next
+                        self._plan_active = False
+                        self._plan_stopped = True
+                        dropped = self._abort()
+                        self._reply(OP_EMERGENCY, _EMERGENCY.pack(self.distance, dropped or 0),
+                                    f"EMERGENCY {self.distance} {dropped}")
+                        if had_plan:
+                            self._send(encode_frame(OP_PLAN_DONE, _PLAN.pack(self._plan_id, 2, completed)))
+                        break
+                    self._motion_changed.wait(min(0.04, end - time.time()))
+                if self._current is not move:  # Stopped/aborted meanwhile
+                    continue
+                self._current = None
+                if not self._current_from_plan:
+                    self._done(seq)
+                elif self._plan_next >= len(self._plan) and self._plan_active:
+                    self._plan_active = False
+                    self._send(encode_frame(OP_PLAN_DONE, _PLAN.pack(self._plan_id, 0, len(self._plan))))
@@ -0,0 +1,191 @@
+import time
+
+import pytest
+
+pytest.importorskip("serial")  # motor_controller needs pyserial even with a loopback port
+
+from motor_controller import MotorController, SerialEvent  # noqa: E402
+from serial_protocol import LoopbackArduino  # noqa: E402
+
+
+@pytest.fixture(params=["binary", "text"])
+def link(request):
+    arduino = LoopbackArduino(time_scale=0.01, timeout=0.1)
+    mc = MotorController(serial_port=arduino, protocol_name=request.param)
+    yield mc, arduino
+    mc.close()
+
+
+def test_auto_protocol_picks_binary():
+    arduino = LoopbackArduino(timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    assert mc.protocol == "binary"
+    mc.close()
+
+
+def test_get_distance(link):
+    mc, arduino = link
+    arduino.distance = 64
+    assert mc.get_distance() == 64
+
+
+def test_pipelined_moves_run_in_order(link):
+    mc, arduino = link
+    seqs = [mc.submit_action(f"{action},100,180") for action in ("forward", "left", "backward", "right")]
+    assert mc.wait_idle(timeout=5)
+    assert [seq for *_, seq in arduino.moves] == seqs
+    assert [action for action, *_ in arduino.moves] == ["forward", "left", "backward", "right"]
+    assert not mc.is_moving()
+
+
+def test_done_for_a_later_seq_aborts_the_older_ones():
+    arduino = LoopbackArduino(time_scale=100, timeout=0.1)  # Moves stay in flight for the whole test
+    mc = MotorController(serial_port=arduino)
+    first = mc.submit_action("forward,1000,180")
+    second = mc.submit_action("left,1000,180")
+    mc._handle(SerialEvent("done", second, None, 0.0))
+    assert mc.wait_for(second, timeout=1)
+    assert not mc.wait_for(first, timeout=1)
+    mc.close()
+
+
+def test_seq_matches_on_the_low_16_bits():
+    arduino = LoopbackArduino(time_scale=100, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    mc._next_seq = 0x10005
+    seq = mc.submit_action("forward,1000,180")
+    mc._handle(SerialEvent("done", seq & 0xFFFF, None, 0.0))
+    assert mc.wait_for(seq, timeout=1)
+    mc.close()
+
+
+def test_wait_for_unknown_seq_is_false(link):
+    mc, _ = link
+    assert not mc.wait_for(1000, timeout=0.1)
+
+
+def test_started_events_reach_listeners(link):
+    mc, _ = link
+    events = []
+    mc.listeners.append(lambda event: events.append((event.kind, event.seq)))
+    seq = mc.submit_action("forward,100,180")
+    assert mc.wait_for(seq, timeout=5)
+    assert ("started", seq) in events and ("done", seq) in events
+
+
+def test_stop_preempts_running_and_queued_moves(link):
+    mc, arduino = link
+    arduino.time_scale = 100  # Long enough that the stop lands mid-move
+    moves = [mc.submit_action("forward,1000,180") for _ in range(4)]
+    stop = mc.stop()
+    assert mc.wait_for(stop, timeout=2)
+    assert not any(mc.wait_for(seq, timeout=1) for seq in moves)
+    assert not mc.is_moving()
+    assert arduino.moves[-1][0] == "stop"
+
+
+def test_emergency_aborts_the_plan(link):
+    mc, arduino = link
+    arduino.time_scale = 100
+    moves = [mc.submit_action("forward,1000,180") for _ in range(4)]
+    arduino.distance = 5
+    assert not mc.wait_for(moves[-1], timeout=2)
+    assert mc.last_emergency[0] == 5
+    assert not mc.is_moving()
+    assert [seq for *_, seq in arduino.moves] == [moves[0]]  # Nothing after the emergency ran
+
+
+def test_uploaded_plan_runs_back_to_back():
+    arduino = LoopbackArduino(time_scale=0.01, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    commands = [f"{'forward' if i % 2 else 'left'},100,180" for i in range(10)] + ["stop,0,0"]
+    plan_id = mc.upload_plan(commands)  # Two chunks
+    assert plan_id is not None
+    assert mc.wait_plan(plan_id, timeout=5) == "done"
+    assert mc.plan["completed"] == len(commands)
+    assert len(arduino.moves) == len(commands)
+    assert not mc.is_moving()
+    mc.close()
+
+
+@pytest.mark.parametrize("how", ["abort_plan", "stop", "emergency", "new_plan"])
+def test_uploaded_plan_cut_short(how):
+    arduino = LoopbackArduino(time_scale=100, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    plan_id = mc.upload_plan(["forward,1000,180"] * 3)
+    if how == "abort_plan":
+        mc.abort_plan()
+    elif how == "stop":
+        mc.stop()
+    elif how == "emergency":
+        arduino.distance = 5
+    else:
+        mc.upload_plan(["left,1000,180"])
+    expected = {"emergency": "emergency"}.get(how, "aborted")
+    assert mc.wait_plan(plan_id, timeout=2) == expected
+    mc.close()
+
+
+def test_appended_steps_run_after_the_plan():
+    arduino = LoopbackArduino(time_scale=0.01, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    plan_id = mc.upload_plan(["forward,1000,180"])
+    assert mc.append_plan(plan_id, ["left,100,180", "stop,0,0"])
+    assert mc.wait_plan(plan_id, timeout=5) == "done"
+    assert mc.append_plan(plan_id, ["right,100,180"])  # Resumes the finished plan
+    assert mc.wait_plan(plan_id, timeout=5) == "done"
+    assert [action for action, *_ in arduino.moves] == ["forward", "left", "stop", "right"]
+    assert mc.plan["completed"] == 4
+    mc.close()
+
+
+def test_append_refused_once_the_plan_is_stopped():
+    arduino = LoopbackArduino(time_scale=100, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    plan_id = mc.upload_plan(["forward,1000,180"])
+    assert not mc.append_plan(plan_id, ["left,100,180"] * 30)  # Beyond the buffer
+    mc.stop()
+    assert mc.wait_plan(plan_id, timeout=2) == "aborted"
+    assert not mc.append_plan(plan_id, ["left,100,180"])
+    mc.close()
+
+
+def test_upload_plan_falls_back(link):
+    mc, _ = link
+    too_long = ["forward,100,180"] * 100
+    assert mc.upload_plan(too_long) is None
+    if mc.protocol == "text":
+        assert mc.upload_plan(["forward,100,180"]) is None
+        assert not mc.append_plan(0, ["forward,100,180"])
+
+
+def test_streamed_distance_needs_no_request():
+    arduino = LoopbackArduino(distance=40, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    assert mc.stream_distance(period_ms=20)
+    arduino.distance = 41
+    time.sleep(0.1)
+    requests = []
+    original_write = arduino.write
+    arduino.write = lambda data: requests.append(data) or original_write(data)
+    assert mc.get_distance() == 41
+    assert requests == []  # Served from the cached reading
+    assert mc.latest_distance(max_age=1.0) == 41
+    mc.close()
+
+
+def test_stale_stream_falls_back_to_a_request():
+    arduino = LoopbackArduino(distance=40, timeout=0.1)
+    mc = MotorController(serial_port=arduino)
+    mc.stream_distance(period_ms=20)
+    time.sleep(0.1)
+    arduino._set_stream(0)  # Firmware stops pushing without the Pi knowing
+    time.sleep(0.2)
+    assert mc.latest_distance(max_age=0.05) is None
+    assert mc.get_distance() == 40
+    mc.close()
+
+
+def test_text_protocol_cannot_stream(link):
+    mc, _ = link
+    assert mc.stream_distance() == (mc.protocol == "binary")
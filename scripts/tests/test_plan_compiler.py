@@ -0,0 +1,55 @@
+from plan_compiler import CALIBRATION, MAX_STEP_MS, STOP_COMMAND, compile_plan, estimate_seconds, step_timing
+
+
+def test_distance_and_angle_use_the_calibration():
+    assert step_timing({"action": "forward", "distance": 0.5}) == ("forward", 2000, 180)
+    assert step_timing({"action": "left", "angle": 90}) == ("left", 2000, 180)
+    # Half the speed, twice as long
+    assert step_timing({"action": "forward", "distance": 0.5, "speed": 90}) == ("forward", 4000, 90)
+
+
+def test_negative_amount_flips_the_direction():
+    assert step_timing({"action": "forward", "distance": -0.25}) == ("backward", 1000, 180)
+    assert step_timing({"action": "right", "angle": -45}) == ("left", 1000, 180)
+
+
+def test_stops_and_no_ops_between_moves_are_dropped():
+    plan = [
+        {"action": "forward", "duration": 1},
+        {"action": "stop"},
+        {"action": "left", "angle": 0},
+        {"action": "right", "duration": 0.01},  # Under MIN_STEP_MS
+        {"action": "backward", "duration": 1, "speed": 0},
+        {"action": "right", "duration": 1},
+    ]
+    assert compile_plan(plan) == ["forward,1000,180", "right,1000,180", STOP_COMMAND]
+
+
+def test_same_moves_merge_only_at_the_same_speed():
+    plan = [
+        {"action": "forward", "duration": 1},
+        {"action": "stop"},
+        {"action": "forward", "duration": 0.5},
+        {"action": "forward", "duration": 1, "speed": 100},
+    ]
+    assert compile_plan(plan) == ["forward,1500,180", "forward,1000,100", STOP_COMMAND]
+
+
+def test_plan_ends_in_exactly_one_stop():
+    assert compile_plan([{"action": "stop"}, {"action": "stop"}]) == [STOP_COMMAND]
+    assert compile_plan([]) == [STOP_COMMAND]
+    commands = compile_plan([{"action": "left", "duration": 1}, {"action": "stop"}])
+    assert commands == ["left,1000,180", STOP_COMMAND]
+    assert compile_plan([{"action": "left", "duration": 1}, {"action": "stop"}], final_stop=False) == ["left,1000,180"]
+
+
+def test_long_moves_are_split_to_fit_a_command():
+    meters = 80 * CALIBRATION["forward"]  # 80 s
+    commands = compile_plan([{"action": "forward", "distance": meters}])
+    assert commands == [f"forward,{MAX_STEP_MS},180", f"forward,{80000 - MAX_STEP_MS},180", STOP_COMMAND]
+
+
+def test_estimate_seconds():
+    commands = compile_plan([{"action": "forward", "distance": 0.5}, {"action": "left", "angle": 45}])
+    assert estimate_seconds(commands) == 3.0
+    assert estimate_seconds([]) == 0.0
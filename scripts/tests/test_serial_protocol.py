@@ -0,0 +1,233 @@
+import time
+
+import serial_protocol as protocol
+from serial_protocol import LoopbackArduino, StreamDecoder
+
+
+def frames(data):
+    return [(a, b) for kind, a, b in StreamDecoder().feed(data) if kind == "frame"]
+
+
+def read_events(arduino, count, timeout=2.0):
+    """The next `count` SerialEvents the loopback sends (fewer if timeout runs out)."""
+    decoder = StreamDecoder()
+    events = []
+    end = time.time() + timeout
+    while len(events) < count and time.time() < end:
+        events += decoder.events(arduino.read(max(1, arduino.in_waiting)))
+    return events
+
+
+def test_crc8_known_value():
+    # CRC-8/SMBUS (poly 0x07, init 0) check value
+    assert protocol.crc8(b"123456789") == 0xF4
+
+
+def test_frame_round_trip():
+    frame = protocol.encode_frame(protocol.OP_LOG, b"hello")
+    assert frame[0] == protocol.FRAME_START
+    assert frames(frame) == [(protocol.OP_LOG, b"hello")]
+
+
+def test_oversized_payload_rejected():
+    try:
+        protocol.encode_frame(protocol.OP_LOG, bytes(protocol.MAX_PAYLOAD + 1))
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_encode_command_matches_text_command():
+    ((opcode, payload),) = frames(protocol.encode_command("left,1500,200", 0x1234))
+    assert opcode == protocol.OP_MOVE
+    assert protocol._MOVE.unpack(payload) == (protocol.ACTIONS["left"], 1500, 200, 0x1234)
+
+
+def test_encode_move_clamps_fields():
+    ((_, payload),) = frames(protocol.encode_move("forward", 100000, 300, 0x12345))
+    assert protocol._MOVE.unpack(payload) == (protocol.ACTIONS["forward"], 0xFFFF, 255, 0x2345)
+
+
+def test_parse_line():
+    assert protocol.parse_line("42").kind == "distance"
+    assert protocol.parse_line("42").value == 42
+    assert protocol.parse_line("DONE 7").seq == 7
+    assert protocol.parse_line("DONE").seq is None
+    assert protocol.parse_line("ERROR: Invalid command format").kind == "error"
+    assert protocol.parse_line("Arduino ready!").kind == "log"
+
+
+def test_frame_event_decodes_replies():
+    done = protocol.frame_event(protocol.OP_DONE, protocol._U16.pack(9))
+    assert (done.kind, done.seq) == ("done", 9)
+    distance = protocol.frame_event(protocol.OP_DISTANCE, protocol._U16.pack(123))
+    assert (distance.kind, distance.value) == ("distance", 123)
+    error = protocol.frame_event(protocol.OP_ERROR, protocol._ERROR.pack(2, 5))
+    assert (error.kind, error.seq) == ("error", 5)
+
+
+def test_decoder_splits_frames_and_lines_in_one_stream():
+    data = (b"Arduino ready!\r\n" + protocol.encode_frame(protocol.OP_DISTANCE, protocol._U16.pack(50))
+            + b"DONE 3\r\n")
+    kinds = [(event.kind, event.seq, event.value) for event in StreamDecoder().events(data)]
+    assert kinds == [("log", None, "Arduino ready!"), ("distance", None, 50), ("done", 3, None)]
+
+
+def test_decoder_handles_frames_split_across_reads():
+    frame = protocol.encode_frame(protocol.OP_DONE, protocol._U16.pack(1))
+    decoder = StreamDecoder()
+    out = []
+    for byte in frame:
+        out += decoder.feed(bytes((byte,)))
+    assert out == [("frame", protocol.OP_DONE, protocol._U16.pack(1))]
+
+
+def test_decoder_resyncs_after_bad_crc():
+    bad = bytearray(protocol.encode_frame(protocol.OP_DONE, protocol._U16.pack(1)))
+    bad[-1] ^= 0xFF
+    good = protocol.encode_frame(protocol.OP_DONE, protocol._U16.pack(2))
+    decoder = StreamDecoder()
+    assert decoder.feed(bytes(bad) + good) == [("frame", protocol.OP_DONE, protocol._U16.pack(2))]
+    assert decoder.bad_frames == 1
+
+
+def test_decoder_drops_impossible_length():
+    decoder = StreamDecoder()
+    assert decoder.feed(bytes((protocol.FRAME_START, protocol.OP_LOG, protocol.MAX_PAYLOAD + 1))) == []
+    assert decoder.bad_frames == 1
+    assert decoder.feed(b"12\n") == [("line", "12", None)]
+
+
+def test_loopback_answers_hello_and_distance():
+    arduino = LoopbackArduino(distance=77)
+    arduino.reset_input_buffer()
+    arduino.write(protocol.encode_frame(protocol.OP_HELLO))
+    arduino.write(protocol.encode_frame(protocol.OP_REQ_DISTANCE))
+    hello, distance = read_events(arduino, 2)
+    assert (hello.kind, hello.value) == ("hello", protocol.PROTOCOL_VERSION)
+    assert (distance.kind, distance.value) == ("distance", 77)
+    arduino.close()
+
+
+def test_loopback_text_protocol():
+    arduino = LoopbackArduino(distance=33, time_scale=0.01)
+    arduino.reset_input_buffer()
+    arduino.write(b"REQ\n")
+    arduino.write(b"forward,100,180,4\n")
+    events = [e for e in read_events(arduino, 3) if e.kind in ("distance", "done")]
+    assert [(e.kind, e.seq, e.value) for e in events] == [("distance", None, 33), ("done", 4, None)]
+    arduino.close()
+
+
+def test_loopback_reports_bad_crc():
+    arduino = LoopbackArduino()
+    arduino.reset_input_buffer()
+    bad = bytearray(protocol.encode_frame(protocol.OP_REQ_DISTANCE))
+    bad[-1] ^= 0xFF
+    arduino.write(bytes(bad))
+    (event,) = read_events(arduino, 1)
+    assert event.kind == "error"
+    arduino.close()
+
+
+def test_status_events():
+    started = protocol.frame_event(protocol.OP_STARTED, protocol._STARTED.pack(5, protocol.ACTIONS["left"]))
+    assert (started.kind, started.seq, started.value) == ("started", 5, "left")
+    emergency = protocol.frame_event(protocol.OP_EMERGENCY, protocol._EMERGENCY.pack(12, 8))
+    assert (emergency.kind, emergency.seq, emergency.value) == ("emergency", 8, 12)
+    assert protocol.parse_line("STARTED 5").seq == 5
+    emergency = protocol.parse_line("EMERGENCY 12 8")
+    assert (emergency.kind, emergency.seq, emergency.value) == ("emergency", 8, 12)
+
+
+def test_loopback_reports_queue_full():
+    arduino = LoopbackArduino(time_scale=100)
+    arduino.reset_input_buffer()
+    arduino.write(protocol.encode_move("forward", 1000, 180, 0))
+    assert read_events(arduino, 1)[0].kind == "started"
+    for seq in range(1, protocol.MOTION_QUEUE_SIZE + 2):  # MOTION_QUEUE_SIZE wait, the last is refused
+        arduino.write(protocol.encode_move("forward", 1000, 180, seq))
+    events = read_events(arduino, 2)
+    assert [(e.kind, e.seq) for e in events if e.kind in ("error", "done")] == [
+        ("error", protocol.MOTION_QUEUE_SIZE + 1), ("done", protocol.MOTION_QUEUE_SIZE + 1)]
+    arduino.close()
+
+
+def test_encode_plan_chunks():
+    steps = [("forward", 100 * i, 180) for i in range(protocol.PLAN_CHUNK_STEPS + 2)]
+    chunks = [frames(frame)[0] for frame in protocol.encode_plan(0x10203, steps)]
+    assert [opcode for opcode, _ in chunks] == [protocol.OP_PLAN_LOAD] * 2
+    assert [protocol._PLAN.unpack(payload[:protocol._PLAN.size]) for _, payload in chunks] == [
+        (0x0203, 0, len(steps)), (0x0203, protocol.PLAN_CHUNK_STEPS, len(steps))]
+    assert max(len(payload) for _, payload in chunks) <= protocol.MAX_PAYLOAD
+    try:
+        protocol.encode_plan(0, steps * protocol.PLAN_CAPACITY)
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_plan_events():
+    ack = protocol.frame_event(protocol.OP_PLAN_ACK, protocol._PLAN.pack(3, 7, 9))
+    assert (ack.kind, ack.seq, ack.value) == ("plan_ack", 3, (7, 9))
+    done = protocol.frame_event(protocol.OP_PLAN_DONE, protocol._PLAN.pack(3, 2, 1))
+    assert (done.kind, done.value) == ("plan_done", ("emergency", 1))
+
+
+def test_loopback_runs_an_uploaded_plan():
+    arduino = LoopbackArduino(time_scale=0.01)
+    arduino.reset_input_buffer()
+    (frame,) = protocol.encode_plan(4, [("forward", 100, 180), ("left", 100, 180)])
+    arduino.write(frame)
+    events = [(e.kind, e.value) for e in read_events(arduino, 4)]
+    assert events == [("plan_ack", (2, 2)), ("plan_step", (0, 2)), ("plan_step", (1, 2)), ("plan_done", ("done", 2))]
+    arduino.close()
+
+
+def test_loopback_appends_to_a_plan_until_it_is_stopped():
+    arduino = LoopbackArduino(time_scale=0.01)
+    arduino.reset_input_buffer()
+    (first,) = protocol.encode_plan(4, [("forward", 100, 180)])
+    arduino.write(first)
+    assert [e.kind for e in read_events(arduino, 3)] == ["plan_ack", "plan_step", "plan_done"]
+    (more,) = protocol.encode_plan(4, [("left", 100, 180)], offset=1)
+    arduino.write(more)  # Resumes the finished plan
+    events = [(e.kind, e.value) for e in read_events(arduino, 3)]
+    assert events == [("plan_ack", (2, 2)), ("plan_step", (1, 2)), ("plan_done", ("done", 2))]
+    arduino.write(protocol.encode_stop(1))
+    read_events(arduino, 1)
+    arduino.write(protocol.encode_plan(4, [("left", 100, 180)], offset=2)[0])
+    (event,) = read_events(arduino, 1)
+    assert event.kind == "error"
+    assert [action for action, *_ in arduino.moves] == ["forward", "left", "stop"]
+    arduino.close()
+
+
+def test_loopback_rejects_out_of_order_chunk():
+    arduino = LoopbackArduino()
+    arduino.reset_input_buffer()
+    steps = [("forward", 100, 180)] * (protocol.PLAN_CHUNK_STEPS + 1)
+    arduino.write(protocol.encode_plan(4, steps)[1])  # Second chunk without the first
+    (event,) = read_events(arduino, 1)
+    assert event.kind == "error"
+    arduino.close()
+
+
+def test_encode_stream_clamps_samples():
+    ((opcode, payload),) = frames(protocol.encode_stream(50, 100))
+    assert opcode == protocol.OP_STREAM_DISTANCE
+    assert protocol._STREAM.unpack(payload) == (50, protocol.MAX_SAMPLES)
+
+
+def test_loopback_streams_distances():
+    arduino = LoopbackArduino(distance=21)
+    arduino.reset_input_buffer()
+    arduino.write(protocol.encode_stream(20, 5))
+    events = read_events(arduino, 3, timeout=1.0)
+    assert [(e.kind, e.value) for e in events] == [("distance", 21)] * 3
+    arduino.write(protocol.encode_stream(0, 5))
+    time.sleep(0.1)
+    arduino.reset_input_buffer()
+    time.sleep(0.1)
+    assert arduino.in_waiting == 0
+    arduino.close()
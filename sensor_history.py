@@ -0,0 +1,131 @@
+# sensor_history.py
+import math
+import threading
+import time
+import numpy as np
+
+
+class SensorHistory:
+    """
+    Fixed-size ring buffer of timestamped readings for one sensor.
+
+    Two preallocated numpy arrays (timestamps, values) are overwritten in
+    place, so memory is capacity * 16 bytes however long the robot runs.
+    Queries select the readings inside a time window with one vectorized
+    mask instead of looping over them in Python.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._next = 0  # Slot the next reading goes into
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, value, timestamp=None):
+        with self._lock:
+            self._times[self._next] = time.time() if timestamp is None else timestamp
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def window(self, seconds=None, now=None):
+        """(timestamps, values) of the readings in the last `seconds`, oldest first."""
+        with self._lock:
+            if self._count < self.capacity:
+                times, values = self._times[:self._count], self._values[:self._count]
+            else:
+                # Unroll the ring: oldest reading sits at _next
+                times = np.roll(self._times, -self._next)
+                values = np.roll(self._values, -self._next)
+            if seconds is not None and self._count:
+                recent = times >= (time.time() if now is None else now) - seconds
+                times, values = times[recent], values[recent]
+            return times.copy(), values.copy()
+
+    def latest(self):
+        with self._lock:
+            return float(self._values[self._next - 1]) if self._count else None
+
+    def median(self, seconds=None):
+        _, values = self.window(seconds)
+        return float(np.median(values)) if values.size else None
+
+    def min(self, seconds=None):
+        _, values = self.window(seconds)
+        return float(values.min()) if values.size else None
+
+    def approach_rate(self, seconds=None):
+        """
+        How fast the reading shrinks, in units per second (positive = getting
+        closer), from a least-squares line through the window. 0.0 with fewer
+        than 3 readings or no time spread.
+        """
+        times, values = self.window(seconds)
+        if values.size < 3:
+            return 0.0
+        t = times - times.mean()
+        spread = np.dot(t, t)
+        if spread <= 0:
+            return 0.0
+        return float(-np.dot(t, values - values.mean()) / spread)
+
+
+class SensorStore:
+    """A SensorHistory per sensor name ("front", ...), created on first reading."""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._sensors = {}
+
+    def __contains__(self, sensor):
+        return sensor in self._sensors
+
+    def get(self, sensor) -> SensorHistory:
+        return self._sensors.get(sensor)
+
+    def record(self, distances: dict, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        for sensor, value in distances.items():
+            if not isinstance(value, (int, float)) or not math.isfinite(value):
+                continue
+            history = self._sensors.get(sensor)
+            if history is None:
+                history = self._sensors.setdefault(sensor, SensorHistory(self.capacity))
+            history.append(float(value), timestamp)
+
+    def smoothed(self, seconds) -> dict:
+        """Median of each sensor over the last `seconds` (latest reading if the window is empty)."""
+        result = {}
+        for sensor, history in list(self._sensors.items()):
+            value = history.median(seconds)
+            result[sensor] = value if value is not None else history.latest()
+        return result
+
+    def projected(self, sensor, seconds, horizon):
+        """
+        Conservative distance `horizon` seconds from now: the window median
+        minus the approach over the horizon (never more than the median). None
+        without readings.
+        """
+        history = self._sensors.get(sensor)
+        median = history.median(seconds) if history is not None else None
+        if median is None:
+            return history.latest() if history is not None else None
+        return median - max(0.0, history.approach_rate(seconds)) * horizon
+
+    def summary(self, seconds=None) -> dict:
+        summary = {}
+        for sensor, history in list(self._sensors.items()):
+            summary[sensor] = {
+                "readings": len(history),
+                "latest": history.latest(),
+                "median": history.median(seconds),
+                "min": history.min(seconds),
+                "approach_rate": round(history.approach_rate(seconds), 3),
+            }
+        return summary
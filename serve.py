@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# serve.py
+"""
+Production entry point: serves main.create_app() with a multi-threaded WSGI
+server instead of Flask's development server.
+
+    python serve.py                      # waitress, microphone + voice pipeline
+    python serve.py --no-audio           # endpoints only (no mic / Whisper needed)
+    python serve.py --server werkzeug    # the old dev server, for comparison
+
+Uses waitress (pip install waitress) and falls back to Werkzeug's threaded
+server if it isn't installed. Plans and robot state live in this process, so
+always run a single process; long-polls and SSE each hold one thread, so
+--threads must cover every robot's open request plus headroom. Under
+gunicorn that means:
+
+    gunicorn -w 1 --threads 64 -b 0.0.0.0:5000 "main:create_app(with_audio=False)"
+"""
+import argparse
+
+try:
+    import waitress  # Optional: production WSGI server
+except ImportError:
+    waitress = None
+
+
+def serve(app, host, port, server, threads):
+    if server == "waitress" and waitress is None:
+        print("⚠️ waitress is not installed (pip install waitress), falling back to Werkzeug's threaded server.")
+        server = "werkzeug"
+
+    print(f"🌐 Serving on http://{host}:{port} with {server}" + (f" ({threads} threads)" if server == "waitress" else ""))
+    if server == "waitress":
+        # channel_timeout above the longest long-poll so idle keep-alive robots aren't cut off mid-wait
+        waitress.serve(app, host=host, port=port, threads=threads, connection_limit=max(100, threads * 2),
+                       channel_timeout=120, ident="robot-mcp")
+    else:
+        from werkzeug.serving import WSGIRequestHandler, run_simple
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"  # Keep-alive, like the Pi's RobotClient expects
+        run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--server", choices=("waitress", "werkzeug"), default="waitress")
+    parser.add_argument("--threads", type=int, default=64, help="waitress worker threads")
+    parser.add_argument("--no-audio", action="store_true", help="don't open the microphone or load STT models")
+    args = parser.parse_args()
+
+    from main import create_app
+    app = create_app(with_audio=not args.no_audio)
+    serve(app, args.host, args.port, args.server, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 #include <Arduino.h>
 #include "motor_control.h"
+#include "protocol.h"
 #include <NewPing.h>
 
 // Ultrasonic pins
@@ -8,87 +9,377 @@ const int echoPin = 4;
 const int MAX_DISTANCE = 200;
 NewPing sonar(trigPin, echoPin, MAX_DISTANCE);
 
+const long BAUD_RATE = 115200;  // Keep in sync with monitor_speed and MotorController
+const unsigned int EMERGENCY_STOP_CM = 15;  // Forward motion stops on board below this
+// Sonar ping period while streaming or moving forward. NewPing wants ~29 ms between
+// pings for old echoes to die out; its timer mode would take Timer2 from the PWM on pin 11.
+const unsigned long SAMPLE_MS = 30;
+unsigned long lastSample = 0;
+
+// Distance streaming: the median of the last streamSamples pings every streamPeriod ms
+const uint8_t MAX_SAMPLES = 9;
+unsigned int samples[MAX_SAMPLES];  // Newest pings, a ring
+uint8_t sampleHead = 0;
+uint8_t sampleCount = 0;
+uint8_t streamSamples = 5;
+unsigned int streamPeriod = 0;  // 0 = only on request
+unsigned long lastStream = 0;
+
+unsigned int planId = 0;  // Plan being loaded or run
+uint8_t planLoaded = 0;   // Steps of it received so far
+bool planStarted = false; // Complete once: later chunks append to it
+bool planStopped = false; // Stopped early: no more chunks are taken for it
+
+FrameParser parser;
+char lineBuffer[48];  // Text command being received
+uint8_t lineLength = 0;
+
+void writeU16(uint8_t* out, unsigned int value) {
+  out[0] = value & 0xFF;
+  out[1] = value >> 8;
+}
+
+// Tell the Pi a command finished; the sequence number lets it keep the next commands queued
+void reportDone(long seq) {
+  if (binaryMode) {
+    uint8_t payload[2];
+    writeU16(payload, seq < 0 ? 0 : seq);
+    sendFrame(OP_DONE, payload, 2);
+  } else if (seq >= 0) {
+    Serial.print("DONE ");
+    Serial.println(seq);
+  } else {
+    Serial.println("DONE");
+  }
+}
+
+void reportError(uint8_t code, long seq, const char* message) {
+  if (binaryMode) {
+    uint8_t payload[3] = {code, 0, 0};
+    writeU16(payload + 1, seq < 0 ? 0 : seq);
+    sendFrame(OP_ERROR, payload, 3);
+  } else {
+    Serial.print("ERROR: ");
+    Serial.println(message);
+  }
+}
+
+unsigned int readDistance() {
+  unsigned int distance = sonar.ping_cm();
+  if (distance == 0 || distance > MAX_DISTANCE) distance = MAX_DISTANCE;
+  return distance;
+}
+
+void sendDistance(unsigned int distance) {
+  if (binaryMode) {
+    uint8_t payload[2];
+    writeU16(payload, distance);
+    sendFrame(OP_DISTANCE, payload, 2);
+  } else {
+    Serial.println(distance);
+  }
+}
+
+void reportDistance() {
+  sendDistance(readDistance());
+}
+
+unsigned int medianDistance() {
+  uint8_t n = sampleCount < streamSamples ? sampleCount : streamSamples;
+  unsigned int sorted[MAX_SAMPLES];
+  for (uint8_t i = 0; i < n; i++) {
+    // Insertion sort of the newest n pings
+    unsigned int value = samples[(sampleHead + MAX_SAMPLES - 1 - i) % MAX_SAMPLES];
+    uint8_t j = i;
+    for (; j > 0 && sorted[j - 1] > value; j--) sorted[j] = sorted[j - 1];
+    sorted[j] = value;
+  }
+  return sorted[n / 2];
+}
+
+void setStream(unsigned int period, uint8_t count) {
+  streamPeriod = period;
+  streamSamples = count < 1 ? 1 : (count > MAX_SAMPLES ? MAX_SAMPLES : count);
+  sampleCount = 0;
+  lastStream = millis();
+  LOG(1, String("Distance stream every ") + period + " ms, median of " + streamSamples);
+}
+
+// Called by updateMotion(): status events for the Pi
+void onMotionStarted(long seq, uint8_t action) {
+  if (binaryMode) {
+    uint8_t payload[3] = {0, 0, action};
+    writeU16(payload, seq < 0 ? 0 : seq);
+    sendFrame(OP_STARTED, payload, 3);
+  } else if (seq >= 0) {
+    Serial.print("STARTED ");
+    Serial.println(seq);
+  }
+}
+
+void onMotionFinished(long seq) {
+  // Signal back to Pi
+  reportDone(seq);
+}
+
+void reportPlan(uint8_t opcode, uint8_t a, uint8_t b) {
+  uint8_t payload[4] = {0, 0, a, b};
+  writeU16(payload, planId);
+  sendFrame(opcode, payload, 4);
+}
+
+void onPlanStep(uint8_t index) {
+  LOG(1, String("Plan ") + planId + " step " + index);
+  reportPlan(OP_PLAN_STEP, index, planLoaded);
+}
+
+void onPlanFinished(uint8_t completed) {
+  reportPlan(OP_PLAN_DONE, PLAN_COMPLETED, completed);
+}
+
+// Ends a running plan early and tells the Pi why
+void endPlan(uint8_t status) {
+  planStopped = true;
+  if (!planRunning()) return;
+  reportPlan(OP_PLAN_DONE, status, abortPlan());
+}
+
+// One chunk of an uploaded plan. Chunks come one at a time (the Pi waits for
+// each ACK), so a whole plan never overruns the 64-byte serial buffer.
+void loadPlan(const uint8_t* p, uint8_t length) {
+  if (length < 4 || (length - 4) % 4 != 0) {
+    reportError(ERR_BAD_PLAN, -1, "Short PLAN frame");
+    return;
+  }
+  unsigned int id = p[0] | (p[1] << 8);
+  uint8_t offset = p[2];
+  uint8_t total = p[3];
+  uint8_t steps = (length - 4) / 4;
+  if (total > PLAN_CAPACITY || offset + steps > total) {
+    reportError(ERR_BAD_PLAN, -1, "Plan too long");
+    return;
+  }
+  if (offset == 0) {
+    // A new plan replaces whatever is running or queued
+    endPlan(PLAN_ABORTED);
+    abortMotion();
+    planId = id;
+    planLoaded = 0;
+    planStarted = false;
+    planStopped = false;
+  } else if (id != planId || offset != planLoaded || planStopped) {
+    reportError(ERR_BAD_PLAN, -1, "PLAN chunk out of order");
+    return;
+  }
+  for (uint8_t i = 0; i < steps; i++) {
+    const uint8_t* step = p + 4 + i * 4;
+    loadPlanStep(offset + i, step[0], step[1] | (step[2] << 8), step[3]);
+  }
+  planLoaded = offset + steps;
+  reportPlan(OP_PLAN_ACK, planLoaded, total);
+  if (planLoaded == total) {
+    LOG(1, String("Plan ") + planId + ": " + total + " steps");
+    if (total == 0) {
+      reportPlan(OP_PLAN_DONE, PLAN_COMPLETED, 0);
+    } else if (planStarted) {
+      extendPlan(total);  // A streamed plan's next chunk
+    } else {
+      planStarted = true;
+      startPlan(total);
+    }
+  }
+}
+
+// Moves are queued and run by updateMotion(); the loop never waits for them
+void runMove(uint8_t action, int duration, int speed, long seq) {
+  LOG(1, String("Move ") + action + " for " + duration + " ms at " + speed + " (#" + seq + ")");
+  if (!queueMove(action, duration, speed, seq)) {
+    reportError(ERR_QUEUE_FULL, seq, "Motion queue full");
+    reportDone(seq);
+  }
+}
+
+// Preempting stop: motors off now, queued moves and the plan dropped, DONE for the stop itself
+void stopNow(long seq) {
+  endPlan(PLAN_ABORTED);
+  long dropped = abortMotion();
+  LOG(1, String("Stop (#") + seq + "), dropped up to #" + dropped);
+  reportDone(seq);
+}
+
+void reportEmergency(unsigned int distance, long seq) {
+  if (binaryMode) {
+    uint8_t payload[4];
+    writeU16(payload, distance);
+    writeU16(payload + 2, seq < 0 ? 0 : seq);
+    sendFrame(OP_EMERGENCY, payload, 4);
+  } else {
+    Serial.print("EMERGENCY ");
+    Serial.print(distance);
+    Serial.print(" ");
+    Serial.println(seq);
+  }
+}
+
+// Reacts to each new ping: obstacle reaction time is one SAMPLE_MS, not a whole step
+void checkObstacle(unsigned int distance) {
+  if (currentAction() != ACTION_FORWARD || distance >= EMERGENCY_STOP_CM) return;
+  bool hadPlan = planRunning();
+  uint8_t completed = abortPlan();
+  planStopped = true;
+  reportEmergency(distance, abortMotion());
+  if (hadPlan) reportPlan(OP_PLAN_DONE, PLAN_EMERGENCY, completed);
+}
+
+// Runs every loop(): one ping per SAMPLE_MS while it's needed, and the streamed median when due
+void updateSonar() {
+  if (streamPeriod == 0 && currentAction() != ACTION_FORWARD) return;
+  unsigned long now = millis();
+  if (now - lastSample >= SAMPLE_MS) {
+    lastSample = now;
+    unsigned int distance = readDistance();
+    samples[sampleHead] = distance;
+    sampleHead = (sampleHead + 1) % MAX_SAMPLES;
+    if (sampleCount < MAX_SAMPLES) sampleCount++;
+    checkObstacle(distance);
+  }
+  if (streamPeriod > 0 && sampleCount > 0 && now - lastStream >= streamPeriod) {
+    lastStream = now;
+    sendDistance(medianDistance());
+  }
+}
+
+uint8_t parseAction(const String& name) {
+  if (name == "forward") return ACTION_FORWARD;
+  if (name == "backward") return ACTION_BACKWARD;
+  if (name == "left") return ACTION_LEFT;
+  if (name == "right") return ACTION_RIGHT;
+  return ACTION_STOP;
+}
+
+void handleFrame() {
+  binaryMode = true;
+  const uint8_t* p = parser.payload;
+  switch (parser.opcode) {
+    case OP_HELLO: {
+      uint8_t version = PROTOCOL_VERSION;
+      sendFrame(OP_HELLO_REPLY, &version, 1);
+      break;
+    }
+    case OP_REQ_DISTANCE:
+      reportDistance();
+      break;
+    case OP_STREAM_DISTANCE:
+      if (parser.length >= 3) {
+        setStream(p[0] | (p[1] << 8), p[2]);
+      } else {
+        reportError(ERR_BAD_COMMAND, -1, "Short STREAM frame");
+      }
+      break;
+    case OP_SET_VERBOSITY:
+      if (parser.length >= 1) verbosity = p[0];
+      break;
+    case OP_STOP:
+      stopNow(parser.length >= 2 ? p[0] | ((long)p[1] << 8) : -1);
+      break;
+    case OP_PLAN_LOAD:
+      loadPlan(p, parser.length);
+      break;
+    case OP_PLAN_ABORT:
+      endPlan(PLAN_ABORTED);
+      break;
+    case OP_MOVE:
+      if (parser.length >= 6) {
+        runMove(p[0], p[1] | (p[2] << 8), p[3], p[4] | ((long)p[5] << 8));
+      } else {
+        reportError(ERR_BAD_COMMAND, -1, "Short MOVE frame");
+      }
+      break;
+    default:
+      reportError(ERR_BAD_COMMAND, -1, "Unknown opcode");
+      break;
+  }
+}
+
+void handleLine(String line) {
+  binaryMode = false;
+  line.trim();
+  LOG(1, String("Received: ") + line);
+
+  if (line == "REQ") {
+    // Pi requested distance
+    reportDistance();
+    return;
+  }
+  if (line == "STOP" || line.startsWith("STOP ")) {
+    stopNow(line.length() > 5 ? line.substring(5).toInt() : -1);
+    return;
+  }
+  if (line.startsWith("STREAM ")) {
+    // STREAM <period_ms> [samples]
+    int space = line.indexOf(' ', 7);
+    setStream(line.substring(7).toInt(), space > 0 ? line.substring(space + 1).toInt() : streamSamples);
+    return;
+  }
+  if (line.startsWith("VERBOSE ")) {
+    verbosity = line.substring(8).toInt();
+    return;
+  }
+
+  // Expecting motor command in format: action,duration,speed[,seq]
+  int firstComma = line.indexOf(',');
+  int secondComma = line.indexOf(',', firstComma + 1);
+  int thirdComma = line.indexOf(',', secondComma + 1);
+  long seq = -1;  // Older Pi code sends no sequence number
+
+  if (firstComma > 0 && secondComma > firstComma) {
+    String action = line.substring(0, firstComma);
+    int duration = line.substring(firstComma + 1, secondComma).toInt();
+    int speed;
+    if (thirdComma > secondComma) {
+      speed = line.substring(secondComma + 1, thirdComma).toInt();
+      seq = line.substring(thirdComma + 1).toInt();
+    } else {
+      speed = line.substring(secondComma + 1).toInt();
+    }
+    runMove(parseAction(action), duration, speed, seq);
+  } else {
+    reportError(ERR_BAD_COMMAND, -1, "Invalid command format");
+    reportDone(thirdComma > 0 ? line.substring(thirdComma + 1).toInt() : -1);
+  }
+}
+
 void setup() {
-  Serial.begin(9600);
-  
-  // Test serial communication immediately
-  Serial.println("=== ARDUINO STARTING ===");
-  
-  // Initialize motors with debug
-  Serial.println("Calling initMotors...");
+  Serial.begin(BAUD_RATE);
   initMotors();
-  Serial.println("initMotors completed");
-  
+  // Quiet by default: debug output is enabled with OP_SET_VERBOSITY or "VERBOSE <level>"
   Serial.println("Arduino ready!");
 }
 
 void loop() {
-  // Check if Pi sent something
-  if (Serial.available()) {
-    String line = Serial.readStringUntil('\n');
-    line.trim();
-
-    Serial.print("Received: ");
-    Serial.println(line);
-
-    if (line == "REQ") {
-      // Pi requested distance
-      unsigned int distance = sonar.ping_cm();
-      if (distance == 0 || distance > MAX_DISTANCE) distance = MAX_DISTANCE;
-      Serial.println(distance);
-    } 
-    else {
-      // Expecting motor command in format: action,duration,speed
-      int firstComma = line.indexOf(',');
-      int secondComma = line.lastIndexOf(',');
-      
-      Serial.print("First comma at: "); Serial.println(firstComma);
-      Serial.print("Second comma at: "); Serial.println(secondComma);
-      
-      if (firstComma > 0 && secondComma > firstComma) {
-        String action = line.substring(0, firstComma);
-        int duration = line.substring(firstComma + 1, secondComma).toInt();
-        int speed = line.substring(secondComma + 1).toInt();
-
-        Serial.print("Parsed - Action: '");
-        Serial.print(action);
-        Serial.print("', Duration: ");
-        Serial.print(duration);
-        Serial.print(", Speed: ");
-        Serial.println(speed);
-
-        // All motor functions handle the delay and stopping
-        Serial.print("Calling motor function for: ");
-        Serial.println(action);
-        
-        if (action == "forward") {
-          Serial.println("=== CALLING moveForward ===");
-          moveForward(speed, duration);
-          Serial.println("=== moveForward COMPLETED ===");
-        }
-        else if (action == "backward") {
-          Serial.println("=== CALLING moveBackward ===");
-          moveBackward(speed, duration);
-        }
-        else if (action == "left") {
-          Serial.println("=== CALLING turnLeft ===");
-          turnLeft(speed, duration);
-        }
-        else if (action == "right") {
-          Serial.println("=== CALLING turnRight ===");
-          turnRight(speed, duration);
-        }
-        else {
-          Serial.println("=== CALLING stopMotors ===");
-          stopMotors();
-        }
-
-        // Signal back to Pi
-        Serial.println("DONE");
-      } else {
-        Serial.println("ERROR: Invalid command format");
-        Serial.println("DONE");
+  // Never block on Serial: take whatever bytes have arrived and act on complete commands
+  while (Serial.available()) {
+    uint8_t b = Serial.read();
+    if (parser.active()) {
+      if (parser.feed(b)) {
+        handleFrame();
+      } else if (parser.badCrc) {
+        parser.badCrc = false;
+        binaryMode = true;
+        reportError(ERR_BAD_CRC, -1, "Bad CRC");
       }
+    } else if (b == FRAME_START) {
+      parser.start();
+    } else if (b == '\n') {
+      lineBuffer[lineLength] = '\0';
+      lineLength = 0;
+      handleLine(String(lineBuffer));
+    } else if (lineLength < sizeof(lineBuffer) - 1) {
+      lineBuffer[lineLength++] = b;
     }
   }
-}
\ No newline at end of file
+
+  // Motion, the sonar watchdog and the distance stream advance on millis(); nothing here waits
+  updateMotion();
+  updateSonar();
+}
@@ -1,4 +1,5 @@
 #include "motor_control.h"
+#include "protocol.h"
 #include <Arduino.h>
 
 // Pin definitions
@@ -11,36 +12,25 @@ const int IN4 = 9;   // Digital pin
 
 // Helper to set motor directions + speed
 void setMotor(bool in1, bool in2, bool in3, bool in4, int speed) {
-    Serial.println("=== setMotor CALLED ===");
-    Serial.print("IN1="); Serial.print(in1);
-    Serial.print(" IN2="); Serial.print(in2);
-    Serial.print(" IN3="); Serial.print(in3);
-    Serial.print(" IN4="); Serial.print(in4);
-    Serial.print(" ENA="); Serial.print(speed);
-    Serial.print(" ENB="); Serial.println(speed);
-    
+    LOG(2, String("setMotor IN1=") + (int)in1 + " IN2=" + (int)in2 + " IN3=" + (int)in3 + " IN4=" + (int)in4
+           + " EN=" + speed);
+
     // Set direction pins
     digitalWrite(IN1, in1);
     digitalWrite(IN2, in2);
     digitalWrite(IN3, in3);
     digitalWrite(IN4, in4);
-    
+
     // Set speed (PWM)
     analogWrite(ENA, speed);
     analogWrite(ENB, speed);
-    
+
     // Verify the pins were set correctly
-    Serial.print("Actual pins - IN1:"); Serial.print(digitalRead(IN1));
-    Serial.print(" IN2:"); Serial.print(digitalRead(IN2));
-    Serial.print(" IN3:"); Serial.print(digitalRead(IN3));
-    Serial.print(" IN4:"); Serial.print(digitalRead(IN4));
-    Serial.print(" ENA:"); Serial.print(analogRead(ENA));
-    Serial.print(" ENB:"); Serial.println(analogRead(ENB));
+    LOG(2, String("Actual pins - IN1:") + digitalRead(IN1) + " IN2:" + digitalRead(IN2)
+           + " IN3:" + digitalRead(IN3) + " IN4:" + digitalRead(IN4));
 }
 
 void initMotors() {
-    Serial.println("=== initMotors CALLED ===");
-    
     // Set all pins as OUTPUT
     pinMode(ENA, OUTPUT);
     pinMode(IN1, OUTPUT);
@@ -48,61 +38,154 @@ void initMotors() {
     pinMode(ENB, OUTPUT);
     pinMode(IN3, OUTPUT);
     pinMode(IN4, OUTPUT);
-    
-    Serial.println("All motor pins set to OUTPUT");
-    
+
     stopMotors();
-    Serial.println("Motors initialized and stopped");
+    LOG(1, "Motors initialized and stopped");
 }
 
 void stopMotors() {
-    Serial.println("=== stopMotors CALLED ===");
     analogWrite(ENA, 0);
     analogWrite(ENB, 0);
     digitalWrite(IN1, LOW);
     digitalWrite(IN2, LOW);
     digitalWrite(IN3, LOW);
     digitalWrite(IN4, LOW);
-    Serial.println("All motors stopped");
+    LOG(2, "All motors stopped");
 }
 
-void moveForward(int speed, int duration_ms) {
-    Serial.println("=== moveForward CALLED ===");
-    Serial.print("Speed: "); Serial.print(speed);
-    Serial.print(" Duration: "); Serial.println(duration_ms);
-    
-    // Motor A: IN1 HIGH, IN2 LOW
-    // Motor B: IN3 HIGH, IN4 LOW
-    setMotor(HIGH, LOW, HIGH, LOW, speed);
-    
-    Serial.print("Moving forward for "); Serial.print(duration_ms); Serial.println(" ms");
-    delay(duration_ms);
-    
-    Serial.println("Stopping after forward movement");
-    stopMotors();
+struct Move {
+    uint8_t action;
+    unsigned int duration_ms;
+    uint8_t speed;
+    long seq;
+};
+
+static Move motionQueue[MOTION_QUEUE_SIZE];
+static uint8_t queueHead = 0;   // Next move to start
+static uint8_t queueCount = 0;
+static Move current;
+static bool active = false;
+static unsigned long startedAt = 0;
+
+static Move plan[PLAN_CAPACITY];
+static uint8_t planCount = 0;
+static uint8_t planNext = 0;    // Next plan step to start
+static bool planActive = false;
+static bool currentFromPlan = false;
+
+// Set the H-bridge for an action; the timing lives in updateMotion()
+static void drive(uint8_t action, uint8_t speed) {
+    switch (action) {
+        // Motor A: IN1 HIGH, IN2 LOW / Motor B: IN3 HIGH, IN4 LOW
+        case ACTION_FORWARD:  setMotor(HIGH, LOW, HIGH, LOW, speed); break;
+        // Motor A: IN1 LOW, IN2 HIGH / Motor B: IN3 LOW, IN4 HIGH
+        case ACTION_BACKWARD: setMotor(LOW, HIGH, LOW, HIGH, speed); break;
+        // Turn Left = Motor A Backward, Motor B Forward
+        case ACTION_LEFT:     setMotor(LOW, HIGH, HIGH, LOW, speed); break;
+        // Turn Right = Motor A Forward, Motor B Backward
+        case ACTION_RIGHT:    setMotor(HIGH, LOW, LOW, HIGH, speed); break;
+        default:              stopMotors(); break;
+    }
 }
 
-void moveBackward(int speed, int duration_ms) {
-    Serial.println("=== moveBackward CALLED ===");
-    // Motor A: IN1 LOW, IN2 HIGH
-    // Motor B: IN3 LOW, IN4 HIGH
-    setMotor(LOW, HIGH, LOW, HIGH, speed);
-    delay(duration_ms);
-    stopMotors();
+bool queueMove(uint8_t action, unsigned int duration_ms, uint8_t speed, long seq) {
+    if (queueCount == MOTION_QUEUE_SIZE) return false;
+    motionQueue[(queueHead + queueCount) % MOTION_QUEUE_SIZE] = {action, duration_ms, speed, seq};
+    queueCount++;
+    updateMotion();  // Starts it right away if nothing is running
+    return true;
+}
+
+static bool planStepsLeft() {
+    return planActive && planNext < planCount;
+}
+
+void updateMotion() {
+    unsigned long now = millis();
+    // Unsigned subtraction stays correct across the millis() rollover
+    if (active && (current.action == ACTION_STOP || now - startedAt >= current.duration_ms)) {
+        active = false;
+        // The next move sets the pins itself: no stop/start jerk
+        if (queueCount == 0 && !planStepsLeft()) stopMotors();
+        if (!currentFromPlan) {
+            onMotionFinished(current.seq);
+        } else if (planNext >= planCount) {
+            planActive = false;
+            onPlanFinished(planCount);
+        }
+    }
+    if (active) return;
+    // Single queued moves (the Pi's per-step path) go ahead of the plan
+    if (queueCount > 0) {
+        current = motionQueue[queueHead];
+        queueHead = (queueHead + 1) % MOTION_QUEUE_SIZE;
+        queueCount--;
+        currentFromPlan = false;
+    } else if (planStepsLeft()) {
+        current = plan[planNext++];
+        currentFromPlan = true;
+    } else {
+        return;
+    }
+    drive(current.action, current.speed);
+    startedAt = now;
+    active = true;
+    if (currentFromPlan) {
+        onPlanStep(planNext - 1);
+    } else {
+        onMotionStarted(current.seq, current.action);
+    }
+    if (current.action == ACTION_STOP) updateMotion();  // Nothing to wait for
 }
 
-void turnLeft(int speed, int duration_ms) {
-    Serial.println("=== turnLeft CALLED ===");
-    // Turn Left = Motor A Backward, Motor B Forward
-    setMotor(LOW, HIGH, HIGH, LOW, speed);
-    delay(duration_ms);
+long abortMotion() {
     stopMotors();
+    long lastSeq = -1;
+    if (active && !currentFromPlan) lastSeq = current.seq;
+    if (queueCount > 0) lastSeq = motionQueue[(queueHead + queueCount - 1) % MOTION_QUEUE_SIZE].seq;
+    active = false;
+    queueCount = 0;
+    return lastSeq;
 }
 
-void turnRight(int speed, int duration_ms) {
-    Serial.println("=== turnRight CALLED ===");
-    // Turn Right = Motor A Forward, Motor B Backward
-    setMotor(HIGH, LOW, LOW, HIGH, speed);
-    delay(duration_ms);
-    stopMotors(); 
-}
\ No newline at end of file
+bool loadPlanStep(uint8_t index, uint8_t action, unsigned int duration_ms, uint8_t speed) {
+    if (index >= PLAN_CAPACITY) return false;
+    plan[index] = {action, duration_ms, speed, index};
+    return true;
+}
+
+void startPlan(uint8_t count) {
+    planCount = count < PLAN_CAPACITY ? count : PLAN_CAPACITY;
+    planNext = 0;
+    planActive = planCount > 0;
+    updateMotion();
+}
+
+void extendPlan(uint8_t count) {
+    planCount = count < PLAN_CAPACITY ? count : PLAN_CAPACITY;
+    planActive = planNext < planCount;
+    updateMotion();
+}
+
+uint8_t abortPlan() {
+    if (!planActive) return 0;
+    planActive = false;
+    if (active && currentFromPlan) {
+        stopMotors();
+        active = false;
+        return planNext - 1;  // The running step didn't complete
+    }
+    return planNext;
+}
+
+bool planRunning() {
+    return planActive;
+}
+
+bool motionActive() {
+    return active;
+}
+
+uint8_t currentAction() {
+    return active ? current.action : ACTION_STOP;
+}
@@ -7,15 +7,36 @@
 extern const int ENA, IN1, IN2;
 extern const int ENB, IN3, IN4;
 
+// Moves waiting behind the running one (the Pi keeps up to two on the wire)
+const uint8_t MOTION_QUEUE_SIZE = 4;
+// Steps of an uploaded plan (8 bytes each in RAM)
+const uint8_t PLAN_CAPACITY = 24;
+
 // Initialize pins
 void initMotors();
 
-// Stop motors
+// Stop motors (pins only; see abortMotion to also drop queued moves)
 void stopMotors();
 
-// Move commands
-void moveForward(int speed, int duration_ms);
-void moveBackward(int speed, int duration_ms);
-void turnLeft(int speed, int duration_ms);
-void turnRight(int speed, int duration_ms);
+// Non-blocking motion: moves run one after another, driven by updateMotion()
+// from loop() with millis(), so loop() keeps reading serial and the sonar.
+bool queueMove(uint8_t action, unsigned int duration_ms, uint8_t speed, long seq);  // false if the queue is full
+void updateMotion();                 // Call every loop(): finishes/starts moves when their time is up
+long abortMotion();                  // Stop now, drop queued moves; returns the last seq dropped (-1 if none)
+bool motionActive();
+uint8_t currentAction();
+
+// Uploaded plan: the steps run back-to-back after any queued moves, with no
+// serial round trip between them
+bool loadPlanStep(uint8_t index, uint8_t action, unsigned int duration_ms, uint8_t speed);  // false past PLAN_CAPACITY
+void startPlan(uint8_t count);       // Run steps 0..count-1
+void extendPlan(uint8_t count);      // Run up to step count-1, resuming a plan that had finished
+uint8_t abortPlan();                 // Stop the plan (and its running step); returns the steps completed
+bool planRunning();
+
+// Implemented by the sketch: reports to the Pi
+void onMotionStarted(long seq, uint8_t action);
+void onMotionFinished(long seq);
+void onPlanStep(uint8_t index);        // A plan step began
+void onPlanFinished(uint8_t completed);  // The last plan step finished
 #endif
@@ -0,0 +1,64 @@
+#include "protocol.h"
+
+uint8_t verbosity = 0;
+bool binaryMode = false;
+
+uint8_t crc8(const uint8_t* data, uint8_t len, uint8_t crc) {
+  for (uint8_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void sendFrame(uint8_t opcode, const uint8_t* payload, uint8_t len) {
+  uint8_t header[3] = {FRAME_START, opcode, len};
+  uint8_t crc = crc8(header + 1, 2);
+  crc = crc8(payload, len, crc);
+  Serial.write(header, 3);
+  if (len) Serial.write(payload, len);
+  Serial.write(crc);
+}
+
+void logText(const String& text) {
+  if (binaryMode) {
+    uint8_t len = text.length() > MAX_PAYLOAD ? MAX_PAYLOAD : text.length();
+    sendFrame(OP_LOG, (const uint8_t*)text.c_str(), len);
+  } else {
+    Serial.println(text);
+  }
+}
+
+bool FrameParser::feed(uint8_t b) {
+  switch (state) {
+    case IDLE:
+      return false;
+    case OPCODE:
+      opcode = b;
+      state = LENGTH;
+      return false;
+    case LENGTH:
+      length = b;
+      received = 0;
+      if (length > MAX_PAYLOAD) {
+        state = IDLE;  // Can't be one of ours: resync on the next FRAME_START
+        return false;
+      }
+      state = length ? PAYLOAD : CRC;
+      return false;
+    case PAYLOAD:
+      payload[received++] = b;
+      if (received == length) state = CRC;
+      return false;
+    case CRC: {
+      state = IDLE;
+      uint8_t header[2] = {opcode, length};
+      uint8_t crc = crc8(payload, length, crc8(header, 2));
+      badCrc = crc != b;
+      return !badCrc;
+    }
+  }
+  return false;
+}
@@ -0,0 +1,89 @@
+#ifndef PROTOCOL_H
+#define PROTOCOL_H
+
+#include <Arduino.h>
+
+// Framed binary protocol shared with scripts/serial_protocol.py:
+//   0xAA | opcode | len | payload[len] | CRC-8 (poly 0x07, over opcode, len, payload)
+// Multi-byte fields are little-endian. Text lines ("REQ", "forward,1000,180,7")
+// are still accepted; replies use whichever format the last command came in.
+const uint8_t FRAME_START = 0xAA;
+const uint8_t MAX_PAYLOAD = 32;
+
+// Pi -> Arduino
+const uint8_t OP_HELLO = 0x01;          // -> OP_HELLO_REPLY
+const uint8_t OP_MOVE = 0x10;           // action u8, duration_ms u16, speed u8, seq u16 (queued)
+const uint8_t OP_STOP = 0x11;           // seq u16: stop now, drop queued moves and the plan -> OP_DONE seq
+const uint8_t OP_PLAN_LOAD = 0x12;      // plan_id u16, offset u8, total u8, steps (action u8, duration_ms u16,
+                                        // speed u8)...: one chunk of a plan -> OP_PLAN_ACK; runs once complete.
+                                        // Chunks past a complete plan's total append to it (resuming
+                                        // it if it finished) until it is stopped
+const uint8_t OP_PLAN_ABORT = 0x13;     // Stop the running plan -> OP_PLAN_DONE
+const uint8_t OP_REQ_DISTANCE = 0x20;   // -> OP_DISTANCE
+const uint8_t OP_STREAM_DISTANCE = 0x21;  // period_ms u16 (0 = off), samples u8: push median OP_DISTANCE
+const uint8_t OP_SET_VERBOSITY = 0x30;  // level u8
+
+// Arduino -> Pi
+const uint8_t OP_HELLO_REPLY = 0x81;    // protocol version u8
+const uint8_t OP_DISTANCE = 0x82;       // cm u16
+const uint8_t OP_DONE = 0x83;           // seq u16
+const uint8_t OP_ERROR = 0x84;          // error code u8, seq u16
+const uint8_t OP_LOG = 0x85;            // text
+const uint8_t OP_STARTED = 0x86;        // seq u16, action u8: a queued move began
+const uint8_t OP_EMERGENCY = 0x87;      // distance cm u16, seq u16: sonar stop, moves up to seq dropped
+const uint8_t OP_PLAN_ACK = 0x88;       // plan_id u16, steps received u8, total u8
+const uint8_t OP_PLAN_STEP = 0x89;      // plan_id u16, step index u8, total u8: a plan step began
+const uint8_t OP_PLAN_DONE = 0x8A;      // plan_id u16, status u8, steps completed u8
+
+const uint8_t PROTOCOL_VERSION = 5;
+
+// Actions in OP_MOVE
+const uint8_t ACTION_STOP = 0;
+const uint8_t ACTION_FORWARD = 1;
+const uint8_t ACTION_BACKWARD = 2;
+const uint8_t ACTION_LEFT = 3;
+const uint8_t ACTION_RIGHT = 4;
+
+// Error codes in OP_ERROR
+const uint8_t ERR_BAD_COMMAND = 1;
+const uint8_t ERR_BAD_CRC = 2;
+const uint8_t ERR_QUEUE_FULL = 3;
+const uint8_t ERR_BAD_PLAN = 4;
+
+// Status in OP_PLAN_DONE
+const uint8_t PLAN_COMPLETED = 0;
+const uint8_t PLAN_ABORTED = 1;     // OP_PLAN_ABORT, OP_STOP or a newer plan
+const uint8_t PLAN_EMERGENCY = 2;   // Sonar stop
+
+// Debug output level: 0 = none (default), 1 = commands, 2 = pin-level detail
+extern uint8_t verbosity;
+// True while the Pi talks frames; replies and logs follow its format
+extern bool binaryMode;
+
+// Only builds the message when the level is enabled
+#define LOG(level, message) do { if (verbosity >= (level)) logText(String(message)); } while (0)
+
+uint8_t crc8(const uint8_t* data, uint8_t len, uint8_t crc = 0);
+void sendFrame(uint8_t opcode, const uint8_t* payload, uint8_t len);
+void logText(const String& text);
+
+// Incremental frame decoder: feed it bytes after a FRAME_START, one at a time
+class FrameParser {
+ public:
+  // Returns true when a complete frame with a valid CRC is in opcode/payload/length
+  bool feed(uint8_t b);
+  bool active() const { return state != IDLE; }
+  void start() { state = OPCODE; }
+
+  uint8_t opcode = 0;
+  uint8_t length = 0;
+  uint8_t payload[MAX_PAYLOAD];
+  bool badCrc = false;  // Set when the last frame was dropped for a CRC mismatch
+
+ private:
+  enum State { IDLE, OPCODE, LENGTH, PAYLOAD, CRC };
+  State state = IDLE;
+  uint8_t received = 0;
+};
+
+#endif
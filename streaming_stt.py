@@ -0,0 +1,158 @@
+# streaming_stt.py
+import threading
+import time
+
+
+class StreamingTranscriber:
+    """
+    Incremental Whisper transcription while the user is still speaking.
+
+    While recording, the detector thread hands us snapshots of the growing
+    utterance. Each snapshot is decoded greedily from the end of the committed
+    text onwards; words that two consecutive passes agree on are committed
+    (local agreement) and never decoded again. At the endpoint only the
+    uncommitted tail is decoded, so the final transcript is ready shortly
+    after speech ends instead of after a full pass over the whole command.
+    """
+
+    MIN_PASS_SECONDS = 0.5  # Don't bother decoding less than this
+    MIN_TAIL_SECONDS = 0.2
+
+    def __init__(self, model, sample_rate, normalize, on_final, on_partial=None, options=None):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.normalize = normalize
+        self.on_final = on_final  # on_final(audio_array, transcript)
+        self.on_partial = on_partial  # on_partial(committed_text, tentative_text)
+        # transcribe() keyword arguments of the decoding profile (stt.transcribe_options).
+        # Partial passes always decode greedily, and every pass needs word timestamps
+        # for local agreement, so the profile's without_timestamps is not applied here.
+        self.options = dict(options or {"beam_size": 5})
+        self.options.pop("without_timestamps", None)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending_snapshot = None  # Latest snapshot only; older ones are skipped
+        self._pending_final = None  # (generation, audio_array, speech_end_time)
+        self._generation = 0  # Bumped on every new utterance to discard stale work
+
+        self._reset_hypothesis()
+        self.last_latency = None  # Seconds from end of speech to final transcript
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _reset_hypothesis(self):
+        self.committed_words = []
+        self.committed_end = 0.0  # Seconds into the utterance covered by committed words
+        self._previous_words = []  # Tentative (text, start, end) from the previous pass
+
+    # --- Called from the detector thread (cheap) ---
+
+    def begin(self):
+        """A new utterance started (wake word)."""
+        with self._lock:
+            self._generation += 1
+            self._pending_snapshot = None
+
+    def submit(self, audio_snapshot):
+        """Latest copy of the utterance so far."""
+        with self._lock:
+            self._pending_snapshot = (self._generation, audio_snapshot)
+        self._wakeup.set()
+
+    def finish(self, audio_array, speech_end_time):
+        """The endpointer fired; finish with a tail pass and call on_final."""
+        with self._lock:
+            self._pending_snapshot = None
+            self._pending_final = (self._generation, audio_array, speech_end_time)
+        self._wakeup.set()
+
+    # --- Transcriber thread ---
+
+    def _run(self):
+        current_generation = 0
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                self._wakeup.clear()
+                final = self._pending_final
+                snapshot = self._pending_snapshot
+                self._pending_final = None
+                self._pending_snapshot = None
+
+            try:
+                if final is not None:
+                    generation, audio_array, speech_end_time = final
+                    if generation != current_generation:
+                        self._reset_hypothesis()
+                        current_generation = generation
+                    self._finish_utterance(audio_array, speech_end_time)
+                    self._reset_hypothesis()
+                elif snapshot is not None:
+                    generation, audio = snapshot
+                    if generation != current_generation:
+                        self._reset_hypothesis()
+                        current_generation = generation
+                    self._partial_pass(audio)
+            except Exception as e:
+                print(f"❌ Streaming transcription error: {e}")
+
+    def _decode(self, audio, final):
+        """Decode audio after committed_end, returning (text, start, end) words in utterance time."""
+        offset_samples = int(self.committed_end * self.sample_rate)
+        segment_audio = audio[offset_samples:]
+        if len(segment_audio) == 0:
+            return []
+        offset = offset_samples / self.sample_rate
+        options = dict(self.options)
+        if not final:
+            options["beam_size"] = 1
+        segments, info = self.model.transcribe(
+            self.normalize(segment_audio),
+            **options,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=" ".join(self.committed_words) or None,
+        )
+        return [(w.word.strip(), w.start + offset, w.end + offset)
+                for segment in segments for w in (segment.words or []) if w.word.strip()]
+
+    @staticmethod
+    def _same_word(a, b):
+        return a.lower().strip(".,!?") == b.lower().strip(".,!?")
+
+    def _partial_pass(self, audio):
+        uncommitted = len(audio) / self.sample_rate - self.committed_end
+        if uncommitted < self.MIN_PASS_SECONDS:
+            return
+
+        words = self._decode(audio, final=False)
+
+        # Commit the prefix this pass shares with the previous one
+        agreed = 0
+        for (new, _, _), (old, _, _) in zip(words, self._previous_words):
+            if not self._same_word(new, old):
+                break
+            agreed += 1
+        if agreed:
+            self.committed_words.extend(text for text, _, _ in words[:agreed])
+            self.committed_end = words[agreed - 1][2]
+        self._previous_words = words[agreed:]
+
+        if self.on_partial:
+            self.on_partial(" ".join(self.committed_words),
+                            " ".join(text for text, _, _ in self._previous_words))
+
+    def _finish_utterance(self, audio_array, speech_end_time):
+        tail_seconds = len(audio_array) / self.sample_rate - self.committed_end
+        tail_words = []
+        if tail_seconds >= self.MIN_TAIL_SECONDS:
+            tail_words = [text for text, _, _ in self._decode(audio_array, final=True)]
+
+        transcript = " ".join(self.committed_words + tail_words)
+        self.last_latency = time.monotonic() - speech_end_time
+        print(f"🧠 Streaming transcript: {transcript} "
+              f"({len(self.committed_words)} words committed early, tail {tail_seconds:.2f}s, "
+              f"ready {self.last_latency:.2f}s after end of speech)")
+        self.on_final(audio_array, transcript)
@@ -3,8 +3,50 @@ import sounddevice as sd
 import numpy as np
 from faster_whisper import WhisperModel
 import pvporcupine
-import struct
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from audio_buffer import AudioRingBuffer, FrameQueue
+from wake_word import WakeWordFrontEnd
+from streaming_stt import StreamingTranscriber
+from endpointer import make_endpointer
+
+# Whisper decoding profiles, picked at startup (STT(profile=...) or STT.DECODING_PROFILE).
+# Robot commands are short with a small vocabulary, so greedy decoding on a
+# small model is usually enough; bench_whisper_profiles.py measures the trade-off.
+DECODING_PROFILES = {
+    "latency": {
+        "model_size": "tiny.en", "compute_type": "int8", "cpu_threads": 4, "num_workers": 1,
+        "beam_size": 1, "vad_filter": False, "vad_parameters": None, "without_timestamps": True,
+    },
+    "balanced": {
+        "model_size": "base.en", "compute_type": "int8", "cpu_threads": 4, "num_workers": 1,
+        "beam_size": 2, "vad_filter": True, "vad_parameters": {"min_silence_duration_ms": 300},
+        "without_timestamps": True,
+    },
+    "accuracy": {
+        "model_size": "small.en", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1,
+        "beam_size": 5, "vad_filter": False, "vad_parameters": None, "without_timestamps": False,
+    },
+}
+
+
+def load_whisper_model(profile):
+    """Builds the WhisperModel for a decoding profile (cpu_threads=0 lets CTranslate2 decide)."""
+    return WhisperModel(
+        profile["model_size"], device="cpu", compute_type=profile["compute_type"],
+        cpu_threads=profile["cpu_threads"], num_workers=profile["num_workers"]
+    )
+
+
+def transcribe_options(profile):
+    """Keyword arguments for WhisperModel.transcribe() under a decoding profile."""
+    return {
+        "beam_size": profile["beam_size"],
+        "vad_filter": profile["vad_filter"],
+        "vad_parameters": profile["vad_parameters"],
+        "without_timestamps": profile["without_timestamps"],
+    }
 
 
 class STT:
@@ -13,13 +55,28 @@ class STT:
     WAKE_WORD_PATH = "Wake_Word.ppn"
     SAMPLE_RATE = 16000
     MIC_NAME = "soundcore Liberty 4 NC"
-    MODEL_SIZE = "small.en"
-    SILENCE_THRESHOLD = 800
-    SILENCE_DURATION = 2.0
+    DECODING_PROFILE = "accuracy"  # Key of DECODING_PROFILES
+    ENDPOINTER = "vad"  # "vad": adaptive voice activity detection, "amplitude": the old fixed rule
+    ENDPOINTER_OPTIONS = {}  # e.g. {"hangover": 0.8} for "vad", {"threshold": 800, "silence_duration": 2.0} for "amplitude"
+    MAX_COMMAND_SECONDS = 10.0  # Recording always ends after this, even in a noisy room
+    MAX_UTTERANCE_SECONDS = 15.0  # Ring buffer capacity; older audio is overwritten
+    CAPTURE_MODE = "threaded"  # "threaded": detector thread, "inline": all work in the audio callback
+    FRAME_QUEUE_SIZE = 64  # Frames buffered between callback and detector thread (~2 s)
+    STREAMING = True  # Transcribe while the user is still speaking
+    STREAM_STEP_SECONDS = 1.0  # How often a growing-window pass is started
+    WARM_UP = True  # Run a dummy transcription at startup so the first command isn't slower
+
+    def __init__(self, callback, partial_callback=None, profile=None):
+        self.profile_name = profile or self.DECODING_PROFILE
+        if self.profile_name not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{self.profile_name}' (choose from {list(DECODING_PROFILES)})")
+        self.profile = DECODING_PROFILES[self.profile_name]
+        self.transcribe_options = transcribe_options(self.profile)
 
-    def __init__(self, callback):
-        # The callback is the function that puts the audio into the queue
+        # The callback is the function that puts the audio (and transcript, if streaming) into the queue
         self.callback = callback
+        # Optional: receives (committed_text, tentative_text) while the user is speaking
+        self.partial_callback = partial_callback
 
         # --- Find mic ---
         # ... (Mic finding logic remains the same) ...
@@ -34,26 +91,79 @@ class STT:
 
         print(f"🎧 Using microphone: {sd.query_devices(self.mic_index)['name']} (index {self.mic_index})")
 
-        # --- Load Whisper ---
-        print("🔄 Loading Whisper model...")
-        self.model = WhisperModel(self.MODEL_SIZE, device="cpu", compute_type="int8")
-        print("✅ Whisper model loaded.")
-
-        # --- Load Porcupine ---
-        print("🔄 Initializing Porcupine wake word...")
-        self.porcupine = pvporcupine.create(
-            access_key=self.ACCESS_KEY,
-            keyword_paths=[self.WAKE_WORD_PATH]
-        )
-        print("✅ Wake word model loaded.")
+        # --- Load Whisper and Porcupine in parallel, then warm Whisper up ---
+        self.startup_timings = {}
+        self.load_models()
+        self.wake_word = WakeWordFrontEnd(self.porcupine)
+        if self.WARM_UP:
+            self.warm_up()
 
         # --- State for continuous operation ---
         self.listening = True
         self.recording = False
-        self.audio_buffer = []
-        self.silence_counter = 0
+        self.audio_buffer = AudioRingBuffer(self.MAX_UTTERANCE_SECONDS, self.SAMPLE_RATE)
+        self.endpointer = make_endpointer(
+            self.ENDPOINTER, self.SAMPLE_RATE,
+            min(self.MAX_COMMAND_SECONDS, self.MAX_UTTERANCE_SECONDS), **self.ENDPOINTER_OPTIONS
+        )
+
+        # --- Threaded capture mode ---
+        self.frame_queue = FrameQueue(self.FRAME_QUEUE_SIZE, self.porcupine.frame_length)
+        self.stream_status = None
+        self.callback_count = 0
+        self.callback_time_total = 0.0
+        self.callback_time_max = 0.0
 
-    def normalize_audio(self, audio):
+        # --- Streaming transcription ---
+        self.streamer = None
+        self.last_snapshot_samples = 0
+        if self.STREAMING:
+            self.streamer = StreamingTranscriber(
+                self.model, self.SAMPLE_RATE, self.normalize_audio,
+                on_final=self.process_audio, on_partial=self.partial_callback,
+                options=self.transcribe_options
+            )
+
+    def _timed(self, name, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.startup_timings[name] = time.perf_counter() - start
+        return result
+
+    def load_models(self):
+        """Loads Whisper and Porcupine at the same time (both release the GIL while loading)."""
+        print("🔄 Loading Whisper model and Porcupine wake word...")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            whisper_future = pool.submit(
+                self._timed, "whisper_load",
+                lambda: load_whisper_model(self.profile)
+            )
+            porcupine_future = pool.submit(
+                self._timed, "porcupine_load",
+                lambda: pvporcupine.create(access_key=self.ACCESS_KEY, keyword_paths=[self.WAKE_WORD_PATH])
+            )
+            self.model = whisper_future.result()
+            self.porcupine = porcupine_future.result()
+        print(f"✅ Whisper model loaded ({self.profile['model_size']}, '{self.profile_name}' profile).")
+        print("✅ Wake word model loaded.")
+
+    def warm_up(self):
+        """
+        Runs one throwaway transcription so CTranslate2 allocates its buffers now,
+        not on the first real command.
+        """
+        rng = np.random.default_rng(0)
+        dummy = rng.normal(0, 200, self.SAMPLE_RATE).astype(np.int16)  # 1 s of quiet noise
+
+        def run():
+            segments, info = self.model.transcribe(self.normalize_audio(dummy), **self.transcribe_options)
+            list(segments)  # Decoding happens lazily while iterating
+
+        self._timed("whisper_warm_up", run)
+        print(f"🔥 Whisper warmed up in {self.startup_timings['whisper_warm_up']:.2f}s")
+
+    @staticmethod
+    def normalize_audio(audio):
         audio = audio.astype(np.float32) / 32768.0
         max_amp = np.max(np.abs(audio))
         if max_amp > 0:
@@ -66,61 +176,118 @@ class STT:
         """
         print("🎙️ Transcribing...")
         audio_float = self.normalize_audio(audio_data)
-        segments, info = self.model.transcribe(audio_float, beam_size=5)
+        segments, info = self.model.transcribe(audio_float, **self.transcribe_options)
         text = " ".join(segment.text for segment in segments)
         print(f"🧠 Transcription Result: {text}")
         return text
 
-    def process_audio(self, audio_data):
+    def process_audio(self, audio_data, transcript=None):
         """
         Called when a command is finished recording. 
         Passes the raw audio array to the callback (which queues it).
+        In streaming mode the transcript is already known; otherwise it is None
+        and the worker transcribes the audio itself.
         """
-        self.callback(audio_data)
+        self.callback(audio_data, transcript)
 
     def audio_callback(self, indata, frames, time_info, status):
-        # This function MUST be fast! It runs in the real-time audio thread.
-
+        """Inline capture mode: detection runs right here in the real-time audio thread."""
         if status:
-            # We still print the warning, but queuing should prevent it from happening often
             print(f"Audio Stream Status: {status}")
+        self.process_frame(indata[:, 0])
 
-        pcm = struct.unpack_from("h" * self.porcupine.frame_length, indata.tobytes())
-        keyword_index = self.porcupine.process(pcm)
+    def capture_callback(self, indata, frames, time_info, status):
+        """
+        "threaded" capture mode: only copy the frame into the SPSC queue.
+        Wake word and endpointing run on the detector thread.
+        """
+        start = time.perf_counter()
+        if status:
+            self.stream_status = status  # Printed by the detector thread, not here
+        self.frame_queue.put(indata)
+        elapsed = time.perf_counter() - start
+        self.callback_count += 1
+        self.callback_time_total += elapsed
+        if elapsed > self.callback_time_max:
+            self.callback_time_max = elapsed
+
+    def detector_loop(self):
+        """Consumes frames from the SPSC queue. Runs on its own thread in "threaded" mode."""
+        print("🔎 Detector thread started.")
+        while self.listening:
+            frame = self.frame_queue.get(timeout=0.1)
+            if self.stream_status is not None:
+                print(f"Audio Stream Status: {self.stream_status}")
+                self.stream_status = None
+            if frame is not None:
+                self.process_frame(frame)
+
+    def process_frame(self, frame):
+        """Wake-word detection and endpointing for one mono int16 frame."""
+        keyword_index = self.wake_word.process(frame)
 
         if keyword_index >= 0:
             print("\n🔊 Wake word detected! Start speaking...")
             self.recording = True
             self.audio_buffer.clear()
-            self.silence_counter = 0
+            self.endpointer.reset()
+            self.last_snapshot_samples = 0
+            if self.streamer:
+                self.streamer.begin()
 
         if self.recording:
-            # Append the whole frame data for transcription
-            self.audio_buffer.extend(indata[:, 0])
+            # Copy the frame into the preallocated ring buffer (no per-sample Python objects)
+            self.audio_buffer.write(frame)
 
-            if np.max(np.abs(indata)) < self.SILENCE_THRESHOLD:
-                self.silence_counter += frames / self.SAMPLE_RATE
-            else:
-                self.silence_counter = 0
+            if self.streamer and len(self.audio_buffer) - self.last_snapshot_samples \
+                    >= self.STREAM_STEP_SECONDS * self.SAMPLE_RATE:
+                self.last_snapshot_samples = len(self.audio_buffer)
+                self.streamer.submit(self.audio_buffer.copy())
 
-            if self.silence_counter >= self.SILENCE_DURATION:
+            if self.endpointer.process(frame):
                 self.recording = False
-                audio_array = np.array(self.audio_buffer, dtype=np.int16)
-                self.process_audio(audio_array)  # Calls the queueing function in main.py
+                print(f"🔚 End of command ({self.endpointer.end_reason}, {self.endpointer.duration:.1f}s recorded)")
+                # One contiguous copy: the ring buffer is reused for the next command
+                audio_array = self.audio_buffer.copy()
+                if self.audio_buffer.overrun_samples:
+                    print(f"⚠️ Command longer than {self.MAX_UTTERANCE_SECONDS}s, "
+                          f"dropped {self.audio_buffer.overrun_samples} oldest samples.")
+                if self.streamer:
+                    # Only the untranscribed tail is left; the streamer calls process_audio
+                    self.streamer.finish(audio_array, time.monotonic() - self.endpointer.trailing_silence)
+                else:
+                    self.process_audio(audio_array)  # Calls the queueing function in main.py
                 self.audio_buffer.clear()
-                self.silence_counter = 0
                 print("\n🎧 Listening for wake word...")
+        else:
+            # Learn the room's background level between commands
+            self.endpointer.track_noise(frame)
+
+    def capture_stats(self):
+        """Counters for the "threaded" capture mode."""
+        count = self.callback_count
+        return {
+            "queue_depth": self.frame_queue.depth,
+            "max_queue_depth": self.frame_queue.max_depth,
+            "dropped_frames": self.frame_queue.dropped,
+            "callbacks": count,
+            "callback_ms_avg": round(self.callback_time_total / count * 1000, 4) if count else 0.0,
+            "callback_ms_max": round(self.callback_time_max * 1000, 4),
+        }
 
     def start_listening(self):
         """Starts the blocking audio stream in a background thread."""
-        print("🎧 Starting continuous audio stream...")
+        print(f"🎧 Starting continuous audio stream ({self.CAPTURE_MODE} capture)...")
+        threaded = self.CAPTURE_MODE == "threaded"
+        if threaded:
+            threading.Thread(target=self.detector_loop, daemon=True).start()
         with sd.InputStream(
                 device=self.mic_index,
                 channels=1,
                 samplerate=self.SAMPLE_RATE,
                 blocksize=self.porcupine.frame_length,
                 dtype="int16",
-                callback=self.audio_callback
+                callback=self.capture_callback if threaded else self.audio_callback
         ):
             while self.listening:
-                sd.sleep(100)
\ No newline at end of file
+                sd.sleep(100)
@@ -0,0 +1,69 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("ollama")  # AI.py imports the client; no server is contacted here
+
+import AI  # noqa: E402
+
+
+class FakeClient:
+    """Streams a canned plan in small pieces, like Ollama's chat(stream=True)."""
+
+    def __init__(self, plan):
+        self.text = json.dumps({"plan": plan})
+
+    def chat(self, **kwargs):
+        pieces = [self.text[i:i + 7] for i in range(0, len(self.text), 7)]
+        for piece in pieces:
+            yield {"message": {"content": piece}, "done": False}
+        yield {"message": {"content": ""}, "done": True}
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    monkeypatch.setattr(AI.Config, "PLAN_CACHE_SIZE", 0)
+    return AI.AIPlanner()
+
+
+def run_stream(planner, command, distances=None, whole=True):
+    steps, plans = [], []
+    planner.generate_plan_stream(command, distances or {"front": 100.0}, steps.append,
+                                 publish_plan=plans.append if whole else None)
+    return steps, plans
+
+
+def test_fast_path_plan_is_published_whole(planner):
+    steps, plans = run_stream(planner, "turn left")
+    assert steps == []
+    assert [[step["action"] for step in plan] for plan in plans] == [["left", "stop"]]
+
+
+def test_safety_stop_is_published_whole(planner):
+    steps, plans = run_stream(planner, "do a dance", {"front": 0.0})
+    assert steps == [] and [plan[0]["action"] for plan in plans] == ["stop"]
+
+
+def test_llm_steps_stream_one_by_one(planner):
+    planner.client = FakeClient([{"action": "forward", "distance": 0.5}, {"action": "right", "angle": 90}])
+    steps, plans = run_stream(planner, "do a dance")
+    assert plans == []
+    assert [step["action"] for step in steps] == ["forward", "right", "stop"]  # Missing stop appended
+
+
+def test_without_publish_plan_local_steps_stream_too(planner):
+    steps, plans = run_stream(planner, "turn left", whole=False)
+    assert [step["action"] for step in steps] == ["left", "stop"]
+
+
+def test_fast_approach_triggers_the_safety_stop(planner):
+    from sensor_history import SensorStore
+    history = SensorStore()
+    now = time.time()
+    for i, cm in enumerate((80.0, 65.0, 50.0, 35.0, 20.0)):  # 60 cm in 0.8 s
+        history.record({"front": cm}, now - 0.8 + 0.2 * i)
+    plan = [AI.ActionDecision(action="forward", distance=1.0), AI.ActionDecision(action="stop")]
+    assert [step["action"] for step in planner.apply_safety(plan, {"front": 20.0})] == ["forward", "stop"]
+    assert [step["action"] for step in planner.apply_safety(plan, {"front": 20.0}, history)] == ["stop"]
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pydantic")  # plan_types models
+
+import intents  # noqa: E402
+
+
+def first_step(text):
+    plan = intents.parse_command(text)
+    assert plan is not None and plan[-1].action == "stop"
+    return plan[0]
+
+
+@pytest.mark.parametrize("text, meters", [
+    ("go forward one meter", 1.0),
+    ("move back 30 cm", 0.3),
+    ("drive forward 50 centimeters", 0.5),
+    ("forward 1.5 m", 1.5),
+    ("go forward", 0.5),
+])
+def test_move_with_a_unit(text, meters):
+    step = first_step(text)
+    assert step.distance == pytest.approx(meters)
+
+
+@pytest.mark.parametrize("text", ["go forward 30", "move back 2", "forward twenty"])
+def test_bare_number_falls_back_to_the_llm(text):
+    assert intents.parse_command(text) is None
+
+
+def test_moves_are_clamped():
+    assert first_step("go forward 30 meters").distance == intents.MAX_MOVE_DISTANCE
+    assert first_step("go forward for 90 seconds").duration == intents.MAX_MOVE_SECONDS
+    side = intents.parse_command("draw a square of 20 meters")[0]
+    assert side.distance == intents.MAX_MOVE_DISTANCE
+
+
+@pytest.mark.parametrize("text, degrees", [
+    ("turn left", 90.0),
+    ("turn right 45 degrees", 45.0),
+    ("turn left forty five degrees", 45.0),
+    ("rotate right one hundred and eighty degrees", 180.0),
+    ("turn left three sixty", 360.0),
+    ("turn right 0 degrees", 0.0),
+])
+def test_turn_angles(text, degrees):
+    assert first_step(text).angle == degrees
+
+
+def test_shapes():
+    plan = intents.parse_command("draw a hexagon counterclockwise")
+    assert [step.action for step in plan] == ["forward", "left"] * 6 + ["stop"]
+    assert intents.parse_command("shape with two sides") is None
+
+
+def test_split_target():
+    assert intents.split_target("robot two, stop", ["2"]) == ("2", "stop")
+    assert intents.split_target("all stop", []) == (intents.ALL_ROBOTS, "stop")
+    assert intents.split_target("all right turn left", []) == (None, "all right turn left")
@@ -0,0 +1,132 @@
+import importlib.util
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from pipeline import BoundedStage
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class Gate:
+    """Handler that blocks until released, recording what it was given."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.items = []
+
+    def __call__(self, item):
+        self.started.set()
+        self.release.wait(2.0)
+        self.items.append(item)
+
+
+def test_full_queue_drops_the_oldest_item():
+    gate = Gate()
+    stage = BoundedStage("test", gate, maxsize=2).start()
+    stage.submit(0)
+    assert gate.started.wait(2.0)  # The worker holds item 0; the queue is empty
+    for item in (1, 2, 3, 4):
+        assert stage.submit(item)
+    gate.release.set()
+    wait_for(lambda: len(gate.items) == 3)
+
+    assert gate.items == [0, 3, 4]
+    stats = stage.stats()
+    assert stats["dropped"] == 2 and stats["max_depth"] == 2 and stats["submitted"] == 5
+
+
+def test_full_queue_rejects_under_reject_policy():
+    stage = BoundedStage("test", lambda item: None, maxsize=1, policy="reject")  # Not started: nothing drains
+    assert stage.submit(1)
+    assert not stage.submit(2)
+    assert stage.stats()["rejected"] == 1 and stage.queue.qsize() == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        BoundedStage("test", lambda item: None, policy="block")
+
+
+def test_results_go_downstream_and_errors_are_counted():
+    gate = Gate()
+    gate.release.set()
+    downstream = BoundedStage("down", gate).start()
+    stage = BoundedStage("up", lambda item: None if item is None else 10 / item, downstream=downstream).start()
+    for item in (1, None, 0, 2):  # None is not passed on, 0 raises
+        stage.submit(item)
+    wait_for(lambda: stage.stats()["processed"] == 4 and len(gate.items) == 2)
+    assert gate.items == [10.0, 5.0]
+    assert stage.stats()["errors"] == 1
+
+
+# --- Stop lane (main.transcribe_command) ---
+
+def load_server_main():
+    """The server's main.py, loaded by path: scripts/main.py (the Pi's) may already be 'main' in this run."""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    spec = importlib.util.spec_from_file_location("server_main", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def server(monkeypatch):
+    pytest.importorskip("pydantic")
+    pytest.importorskip("ollama")
+    import AI
+    from robots import RobotRegistry
+    main = load_server_main()
+    monkeypatch.setattr(AI.Config, "PLAN_CACHE_SIZE", 0)
+    monkeypatch.setattr(main, "ai", AI.AIPlanner())
+    monkeypatch.setattr(main, "g_robots", RobotRegistry())
+    monkeypatch.setitem(main.g_partial_transcript, "stop_sent", False)
+    return main
+
+
+def test_stop_skips_queued_planning_work(server):
+    main = server
+    planner = Gate()
+    planning = BoundedStage("planning", planner, maxsize=2).start()
+    transcription = BoundedStage("transcription", lambda item: main.transcribe_command(item, None),
+                                 downstream=planning).start()
+    audio = np.zeros(1600, dtype=np.int16)
+
+    transcription.submit((audio, "turn left"))
+    assert planner.started.wait(2.0)
+    for command in ("go forward", "spin around"):
+        transcription.submit((audio, command))
+    wait_for(lambda: planning.queue.qsize() == 2)
+
+    channel = main.g_robots.active_channel()
+    channel.publish([{"action": "forward"}])  # A plan the robot hasn't fetched yet
+    transcription.submit((audio, "Stop."))
+    wait_for(lambda: transcription.stats()["processed"] == 4)
+
+    # Published while planning is still busy, and ahead of the unfetched plan
+    assert [step["action"] for step in channel.next_plan()] == ["stop"]
+    assert channel.plan_queue.empty()
+    assert planning.queue.qsize() == 2 and planning.stats()["submitted"] == 3
+    planner.release.set()
+    wait_for(lambda: len(planner.items) == 3)
+    assert all(robot_id == channel.robot_id for robot_id, _ in planner.items)
+    assert "stop" not in [command for _, command in planner.items]
+
+
+def test_stop_already_sent_from_partial_transcript_is_not_repeated(server):
+    main = server
+    main.g_partial_transcript["stop_sent"] = True
+    assert main.transcribe_command((None, "stop"), None) is None
+    assert main.g_robots.active_channel().plan_queue.empty()
+    assert main.g_partial_transcript["stop_sent"] is False
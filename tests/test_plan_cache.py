@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import plan_cache
+from plan_cache import PlanCache
+
+LEFT = [{"action": "left", "angle": 90}, {"action": "stop"}]
+RIGHT = [{"action": "right", "angle": 90}, {"action": "stop"}]
+NEAR, FAR = {"front": 30.0}, {"front": 180.0}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(plan_cache.time, "time", clock)
+    return clock
+
+
+def test_key_buckets_distances():
+    cache = PlanCache(bucket_size=25.0)
+    assert cache.make_key("go", {"front": 30.0}) == cache.make_key("go", {"front": 49.9})
+    assert cache.make_key("go", {"front": 30.0}) != cache.make_key("go", {"front": 50.0})
+    assert cache.make_key("go", {"front": 30.0, "status": "ok"}) == "go|front:1"
+
+
+def test_hit_returns_a_copy():
+    cache = PlanCache()
+    cache.put("turn", NEAR, LEFT)
+    steps = cache.get("turn", NEAR)
+    assert steps == LEFT
+    steps[0]["angle"] = 180
+    assert cache.get("turn", NEAR) == LEFT
+    assert cache.get("turn", FAR) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = PlanCache(capacity=2)
+    cache.put("a", NEAR, LEFT)
+    cache.put("b", NEAR, RIGHT)
+    cache.get("a", NEAR)  # "b" is now the oldest
+    cache.put("c", NEAR, LEFT)
+    assert cache.get("b", NEAR) is None
+    assert cache.get("a", NEAR) == LEFT and cache.get("c", NEAR) == LEFT
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = PlanCache(ttl=60.0)
+    cache.put("turn", NEAR, LEFT)
+    clock.now += 60.0
+    assert cache.get("turn", NEAR) == LEFT
+    clock.now += 0.1
+    assert cache.get("turn", NEAR) is None
+    assert cache.stats()["expirations"] == 1 and cache.stats()["size"] == 0
+
+
+def test_invalidate_with_new_fingerprint(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = PlanCache(path=path, fingerprint="v1")
+    cache.put("turn", NEAR, LEFT)
+    cache.invalidate("v2")
+    assert cache.get("turn", NEAR) is None
+    assert PlanCache(path=path, fingerprint="v2").stats()["size"] == 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = PlanCache(path=path, fingerprint="v1")
+    cache.put("turn", NEAR, LEFT)
+    cache.put("spin", FAR, RIGHT)
+    assert not os.path.exists(path + ".tmp")  # Written to a temp file, then renamed
+    with open(path) as f:
+        assert json.load(f)["fingerprint"] == "v1"
+
+    reloaded = PlanCache(path=path, fingerprint="v1")
+    assert reloaded.get("turn", NEAR) == LEFT and reloaded.get("spin", FAR) == RIGHT
+    # Plans from another model/prompt are ignored
+    assert PlanCache(path=path, fingerprint="v2").get("turn", NEAR) is None
+
+
+def test_load_drops_expired_and_overflowing_entries(tmp_path, clock):
+    path = str(tmp_path / "cache.json")
+    cache = PlanCache(path=path, ttl=60.0)
+    cache.put("old", NEAR, LEFT)
+    clock.now += 50.0
+    cache.put("a", NEAR, LEFT)
+    cache.put("b", NEAR, RIGHT)
+    clock.now += 20.0
+
+    reloaded = PlanCache(capacity=1, path=path, ttl=60.0)
+    assert reloaded.get("old", NEAR) is None and reloaded.get("a", NEAR) is None
+    assert reloaded.get("b", NEAR) == RIGHT
+
+
+def test_unreadable_file_starts_empty(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{not json")
+    assert PlanCache(path=str(path)).stats()["size"] == 0
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from plan_stream import PlanStreamParser
+
+STEPS = [
+    {"action": "forward", "distance": 0.5, "note": "say \"}]{[\" \\ then go"},
+    {"action": "left", "angle": 90, "extra": {"why": {"deep": ["}", "{"]}}},
+    {"action": "stop"},
+]
+TEXT = json.dumps({"plan": STEPS})
+
+
+def feed_in(parser, text, size):
+    steps = []
+    for i in range(0, len(text), size):
+        steps.extend(parser.feed(text[i:i + size]))
+    return steps
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, len(TEXT)])
+def test_any_chunking_gives_the_same_steps(size):
+    assert feed_in(PlanStreamParser(), TEXT, size) == STEPS
+
+
+def test_every_split_point_inside_strings_and_escapes():
+    for cut in range(1, len(TEXT)):
+        parser = PlanStreamParser()
+        assert parser.feed(TEXT[:cut]) + parser.feed(TEXT[cut:]) == STEPS, cut
+
+
+def test_steps_come_out_as_soon_as_they_close():
+    parser = PlanStreamParser()
+    first_end = TEXT.index('"}, {') + 2
+    assert parser.feed(TEXT[:first_end]) == STEPS[:1]
+    assert parser.feed(TEXT[first_end:]) == STEPS[1:]
+
+
+def test_only_the_top_level_plan_key_is_read():
+    text = json.dumps({
+        "thoughts": {"plan": [{"action": "backward"}]},
+        "notes": ["plan", {"plan": [{"action": "right"}]}],
+        "plan": [{"action": "left"}],
+        "after": [{"action": "forward"}],
+    })
+    assert feed_in(PlanStreamParser(), text, 4) == [{"action": "left"}]
+
+
+def test_invalid_step_is_skipped_and_counted():
+    parser = PlanStreamParser()
+    steps = parser.feed('{"plan": [{"action": "left", "angle": 9O}, {"action": "stop"}]}')
+    assert steps == [{"action": "stop"}]
+    assert parser.skipped == 1
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from sensor_history import SensorHistory, SensorStore
+
+
+def test_ring_wraps_around_oldest_first():
+    history = SensorHistory(capacity=4)
+    for i in range(6):
+        history.append(float(i), timestamp=100.0 + i)
+    times, values = history.window()
+    assert len(history) == 4
+    assert values.tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert times.tolist() == [102.0, 103.0, 104.0, 105.0]
+    assert history.latest() == 5.0
+
+
+def test_latest_right_after_a_full_lap():
+    history = SensorHistory(capacity=3)
+    for i in range(3):
+        history.append(float(i), timestamp=100.0 + i)
+    assert history.latest() == 2.0  # _next is back at slot 0
+    assert SensorHistory().latest() is None
+
+
+def test_window_selects_recent_readings():
+    history = SensorHistory(capacity=8)
+    for i in range(10):
+        history.append(float(i), timestamp=100.0 + i)
+    _, values = history.window(seconds=2.0, now=109.0)
+    assert values.tolist() == [7.0, 8.0, 9.0]
+    _, values = history.window(seconds=1.0, now=200.0)
+    assert values.size == 0
+
+
+def test_window_median_ignores_old_readings_and_spikes():
+    now = time.time()
+    history = SensorHistory()
+    history.append(10.0, now - 10.0)  # Outside the window
+    for offset, value in ((0.4, 50.0), (0.3, 52.0), (0.2, 400.0), (0.1, 51.0)):  # One echo spike
+        history.append(value, now - offset)
+    assert history.median(1.0) == 51.5
+    assert history.min(1.0) == 50.0
+    assert history.median() == 51.0  # Whole buffer, old reading included
+    assert history.median(0.05) is None
+
+
+def test_approach_rate_is_the_fitted_slope():
+    now = time.time()
+    history = SensorHistory()
+    for i in range(5):
+        history.append(100.0 - 20.0 * i + (1.0 if i % 2 else -1.0), now - 1.0 + 0.25 * i)  # 80 cm/s, noisy
+    assert history.approach_rate(2.0) == pytest.approx(80.0, abs=5.0)
+
+    receding = SensorHistory()
+    for i in range(3):
+        receding.append(10.0 * i, now - 1.0 + 0.5 * i)
+    assert receding.approach_rate(2.0) == pytest.approx(-20.0)
+
+
+def test_approach_rate_needs_three_readings_spread_in_time():
+    history = SensorHistory()
+    history.append(50.0, 100.0)
+    history.append(40.0, 101.0)
+    assert history.approach_rate() == 0.0
+    history.append(30.0, 101.0)
+    assert history.approach_rate() > 0.0
+
+    same_instant = SensorHistory()
+    for value in (50.0, 40.0, 30.0):
+        same_instant.append(value, 101.0)
+    assert same_instant.approach_rate() == 0.0
+
+
+def test_store_skips_non_numeric_readings():
+    store = SensorStore(capacity=4)
+    store.record({"front": 30.0, "left": float("nan"), "status": "ok", "rear": 12}, 100.0)
+    assert "front" in store and "rear" in store
+    assert "left" not in store and "status" not in store
+    assert store.get("rear").latest() == 12.0
+
+
+def test_smoothed_falls_back_to_latest():
+    now = time.time()
+    store = SensorStore()
+    store.record({"front": 40.0}, now - 60.0)
+    store.record({"rear": 20.0}, now - 0.2)
+    store.record({"rear": 24.0}, now - 0.1)
+    assert store.smoothed(1.0) == {"front": 40.0, "rear": 22.0}
+
+
+def test_projection_subtracts_the_approach_over_the_horizon():
+    now = time.time()
+    store = SensorStore()
+    for i, cm in enumerate((80.0, 70.0, 60.0, 50.0, 40.0)):  # 50 cm/s
+        store.record({"front": cm, "rear": 20.0 + 10.0 * i}, now - 0.8 + 0.2 * i)
+    # Median 60 cm, minus 50 cm/s over half a second
+    assert store.projected("front", 1.0, 0.5) == pytest.approx(35.0)
+    # Moving away never projects further than the median
+    assert store.projected("rear", 1.0, 0.5) == pytest.approx(40.0)
+    assert store.projected("left", 1.0, 0.5) is None
+
+
+def test_projection_without_recent_readings_uses_the_latest():
+    store = SensorStore()
+    store.record({"front": 33.0}, time.time() - 60.0)
+    assert store.projected("front", 1.0, 0.5) == 33.0
+
+
+def test_summary():
+    store = SensorStore()
+    now = time.time()
+    for i, cm in enumerate((30.0, 20.0, 10.0)):
+        store.record({"front": cm}, now - 0.2 + 0.1 * i)
+    summary = store.summary(1.0)["front"]
+    assert summary["readings"] == 3 and summary["latest"] == 10.0
+    assert summary["median"] == 20.0 and summary["min"] == 10.0
+    assert summary["approach_rate"] == pytest.approx(100.0)
@@ -0,0 +1,53 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from streaming_stt import StreamingTranscriber
+
+RATE = 16000
+PROFILE_OPTIONS = {"beam_size": 2, "vad_filter": True, "vad_parameters": {"min_silence_duration_ms": 300},
+                   "without_timestamps": True}
+
+
+class FakeModel:
+    """Records transcribe() keyword arguments and says one word per call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append(kwargs)
+        word = SimpleNamespace(word=" go", start=0.0, end=0.3)
+        return iter([SimpleNamespace(words=[word])]), None
+
+
+def make_streamer(model, finals):
+    done = threading.Event()
+
+    def on_final(audio, transcript):
+        finals.append(transcript)
+        done.set()
+
+    return StreamingTranscriber(model, RATE, lambda a: a, on_final, options=PROFILE_OPTIONS), done
+
+
+def test_decode_passes_use_the_profile_options():
+    model, finals = FakeModel(), []
+    streamer, done = make_streamer(model, finals)
+    audio = np.zeros(RATE, dtype=np.int16)
+
+    streamer._partial_pass(audio)
+    streamer.finish(audio, time.monotonic())
+    assert done.wait(2.0)
+
+    partial, final = model.calls
+    for call in (partial, final):
+        assert call["vad_filter"] is True
+        assert call["vad_parameters"] == {"min_silence_duration_ms": 300}
+        assert call["word_timestamps"] is True and "without_timestamps" not in call
+    assert partial["beam_size"] == 1
+    assert final["beam_size"] == 2
+    assert finals == ["go"]
+    assert PROFILE_OPTIONS["without_timestamps"] is True  # The caller's dict is left alone
@@ -0,0 +1,27 @@
+# wake_word.py
+import struct
+
+
+class WakeWordFrontEnd:
+    """
+    Feeds sounddevice int16 frames to Porcupine without per-frame allocations
+    beyond what Porcupine itself needs.
+
+    The old path did indata.tobytes() (a copy) and then built a fresh
+    "h" * frame_length format string on every frame. Here the unpacker is
+    compiled once and reads straight from the NumPy buffer.
+    """
+
+    def __init__(self, porcupine):
+        self.porcupine = porcupine
+        self.frame_length = porcupine.frame_length
+        # Native-endian int16, same as sounddevice's "int16" dtype
+        self._unpack_from = struct.Struct(f"{self.frame_length}h").unpack_from
+
+    def process(self, indata) -> int:
+        """
+        Run wake-word detection on one frame.
+        indata: C-contiguous int16 array with frame_length samples (mono).
+        Returns the keyword index, or -1 if no wake word was heard.
+        """
+        return self.porcupine.process(self._unpack_from(indata))